@@ -0,0 +1,274 @@
+"""
+Semantic answer cache for the SQL agent.
+Near-duplicate questions reuse the SQL of a previous successful query from the
+query history, with literals such as order numbers swapped in, so no LLM call is needed.
+"""
+
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+
+# Quoted strings or standalone numbers, e.g. '416328', "ABC-1", 2024
+_LITERAL_RE = re.compile(r"'([^']*)'|\"([^\"]*)\"|(?<![\w.])(\d+(?:\.\d+)?)(?![\w.])")
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+# Words and placeholders of a question; punctuation and spacing don't distinguish questions
+_WORD_RE = re.compile(r"\w+|\0")
+_TABLE_RE = re.compile(r"\b(?:FROM|JOIN)\s+`?(\w+)`?", re.IGNORECASE)
+_PREDICATE_RE = re.compile(r"\b(?:WHERE|HAVING|ON)\b", re.IGNORECASE)
+_LIMIT_TAIL_RE = re.compile(r"\b(?:LIMIT|OFFSET)\s+(?:\d+\s*,\s*)?$", re.IGNORECASE)
+
+# sqlglot module once imported, False if it isn't installed
+_sqlglot = None
+
+
+class AnswerCache:
+    """Finds a reusable SQL query for a question in the stored query history."""
+
+    def __init__(self, document_store, similarity_threshold: float = 0.97,
+                 ttl_seconds: float = 86400, max_candidates: int = 5):
+        """
+        Initialize the answer cache.
+
+        Args:
+            document_store: DocumentStore holding the query history
+            similarity_threshold: Minimum cosine similarity for a history entry to be reused
+            ttl_seconds: Maximum age of a history entry that may be reused
+            max_candidates: Number of nearest history entries to consider
+        """
+        self.document_store = document_store
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_candidates = max_candidates
+
+        self._invalidated_tables: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        Find a previous query whose SQL can answer this question.
+
+        Args:
+            question: Natural language question about the data
+
+        Returns:
+            Dict with "question", "sql_query" (literals substituted) and
+            "similarity_score", or None if nothing reusable was found
+        """
+        with self._lock:
+            self.lookups += 1
+
+        since = datetime.now() - timedelta(seconds=self.ttl_seconds)
+        candidates = self.document_store.search_similar_queries(
+            question, limit=self.max_candidates,
+            filter_expr=self.document_store.build_filter(success=True, since=since)
+        )
+        for candidate in candidates:
+            sql_query = self._reusable_sql(question, candidate)
+            if sql_query:
+                return {
+                    "question": candidate["query"],
+                    "sql_query": sql_query,
+                    "similarity_score": candidate["similarity_score"],
+                }
+
+        self.record_miss()
+        return None
+
+    def record_hit(self):
+        """Count a lookup whose SQL was executed successfully."""
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self):
+        """Count a lookup that fell through to the agent."""
+        with self._lock:
+            self.misses += 1
+
+    def invalidate_table(self, table_name: str):
+        """
+        Stop reusing cached SQL that reads a table, e.g. after its schema changes.
+
+        Args:
+            table_name: Table whose cached queries should be ignored
+        """
+        with self._lock:
+            self._invalidated_tables[table_name.lower()] = time.time()
+
+    def _reusable_sql(self, question: str, candidate: Dict[str, Any]) -> Optional[str]:
+        """Return the candidate's SQL adapted to this question, or None if it can't be reused."""
+        if candidate.get("doc_type") != "query_history" or not candidate.get("success"):
+            return None
+        if candidate.get("similarity_score", 0.0) < self.similarity_threshold:
+            return None
+
+        sql_query = (candidate.get("sql_query") or "").strip()
+        if not sql_query.upper().startswith(("SELECT", "WITH")):
+            return None
+
+        created_at = self._parse_timestamp(candidate.get("timestamp"))
+        if created_at is None or time.time() - created_at > self.ttl_seconds:
+            return None
+
+        with self._lock:
+            for table in self.referenced_tables(sql_query):
+                if self._invalidated_tables.get(table.lower(), 0) >= created_at:
+                    return None
+
+        return self.substitute_literals(candidate["query"], question, sql_query)
+
+    @staticmethod
+    def extract_literals(text: str) -> List[str]:
+        """Get quoted strings and numbers from a question, in order."""
+        return [next(group for group in match.groups() if group is not None)
+                for match in _LITERAL_RE.finditer(text)]
+
+    @staticmethod
+    def question_template(text: str) -> str:
+        """Normalize a question with its literals replaced by placeholders (NUL, which questions don't contain)."""
+        template = _LITERAL_RE.sub(" \0 ", text.lower())
+        return " ".join(_WORD_RE.findall(template))
+
+    @staticmethod
+    def referenced_tables(sql_query: str) -> List[str]:
+        """Get the table names a query reads from."""
+        return _TABLE_RE.findall(sql_query)
+
+    @classmethod
+    def substitute_literals(cls, cached_question: str, question: str, sql_query: str) -> Optional[str]:
+        """
+        Swap the cached question's literals for the new question's in the SQL.
+
+        Args:
+            cached_question: Question the SQL was written for
+            question: New question
+            sql_query: SQL written for the cached question
+
+        Returns:
+            SQL for the new question, or None if the questions differ in more than
+            their literals or the literals don't line up
+        """
+        # "customer Acme" and "customer Globex" have no literals to swap, so only
+        # questions that are the same apart from their literals may share SQL
+        if cls.question_template(cached_question) != cls.question_template(question):
+            return None
+
+        old_literals = cls.extract_literals(cached_question)
+        new_literals = cls.extract_literals(question)
+        if len(old_literals) != len(new_literals):
+            return None
+
+        replacements = {}
+        for old, new in zip(old_literals, new_literals):
+            if old == new:
+                continue
+            if replacements.get(old, new) != new:
+                return None
+            replacements[old] = new
+
+        if not replacements:
+            return sql_query
+
+        # A new value must have the same kind as the one it replaces so nothing
+        # but a literal is ever spliced into the SQL
+        for old, new in replacements.items():
+            if _NUMBER_RE.fullmatch(old) and not _NUMBER_RE.fullmatch(new):
+                return None
+
+        tree = cls._parse_sql(sql_query)
+        if tree is not None:
+            return cls._substitute_in_tree(tree, replacements)
+        return cls._substitute_with_regex(sql_query, replacements)
+
+    @staticmethod
+    def _parse_sql(sql_query: str):
+        """Parse a single statement with sqlglot, or None if it isn't installed or can't parse it."""
+        global _sqlglot
+        if _sqlglot is None:
+            try:
+                import sqlglot
+                _sqlglot = sqlglot
+            except ImportError:
+                _sqlglot = False
+        if not _sqlglot:
+            return None
+        try:
+            statements = _sqlglot.parse(sql_query, read="mysql")
+        except Exception:
+            return None
+        return statements[0] if len(statements) == 1 and statements[0] is not None else None
+
+    @staticmethod
+    def _substitute_in_tree(tree, replacements: Dict[str, str]) -> Optional[str]:
+        """
+        Replace literals in a parsed statement. Each changed value must occur exactly
+        once, as a WHERE, HAVING or JOIN ... ON operand; a value that also sets a LIMIT,
+        a selected constant or a second predicate can't be told apart, so the SQL isn't reused.
+        """
+        exp = _sqlglot.exp
+        targets = []
+        for old, new in replacements.items():
+            # Numbers may appear bare or quoted in the SQL; strings only inside quotes
+            matches = [literal for literal in tree.find_all(exp.Literal)
+                       if literal.name == old and (literal.is_string or _NUMBER_RE.fullmatch(old))]
+            if len(matches) != 1:
+                return None
+            clause = matches[0].find_ancestor(exp.Where, exp.Having, exp.Join, exp.Limit, exp.Offset, exp.Select)
+            if not isinstance(clause, (exp.Where, exp.Having, exp.Join)):
+                return None
+            targets.append((matches[0], new))
+
+        # Replaced only once all are found, so a swapped pair doesn't match its own replacement
+        for literal, new in targets:
+            literal.replace(exp.Literal.string(new) if literal.is_string else exp.Literal.number(new))
+        return tree.sql(dialect="mysql")
+
+    @staticmethod
+    def _substitute_with_regex(sql_query: str, replacements: Dict[str, str]) -> Optional[str]:
+        """Replace literals that occur once, after WHERE, HAVING or ON and outside a LIMIT or OFFSET."""
+        spans = []
+        for old, new in replacements.items():
+            if _NUMBER_RE.fullmatch(old):
+                pattern = rf"(?<![\w.]){re.escape(old)}(?![\w.])"
+                value = new
+            else:
+                pattern = rf"'{re.escape(old)}'"
+                value = "'" + new.replace("\\", "\\\\").replace("'", "''") + "'"
+            matches = list(re.finditer(pattern, sql_query))
+            if len(matches) != 1:
+                return None
+            match = matches[0]
+            before = sql_query[:match.start()]
+            if not _PREDICATE_RE.search(before) or _LIMIT_TAIL_RE.search(before):
+                return None
+            spans.append((match.start(), match.end(), value))
+
+        for start, end, value in sorted(spans, reverse=True):
+            sql_query = sql_query[:start] + value + sql_query[end:]
+        return sql_query
+
+    @staticmethod
+    def _parse_timestamp(timestamp: Any) -> Optional[float]:
+        """Convert a history timestamp (epoch seconds or ISO string) into epoch seconds."""
+        if isinstance(timestamp, (int, float)):
+            return float(timestamp)
+        try:
+            return datetime.fromisoformat(timestamp).timestamp()
+        except (TypeError, ValueError):
+            return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get lookup, hit and miss counters and the hit rate."""
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "invalidated_tables": len(self._invalidated_tables),
+            }
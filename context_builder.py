@@ -0,0 +1,99 @@
+"""
+Token-budgeted assembly of the context sent to the agent with each question.
+Candidate table schemas, SQL examples and documentation are ranked by
+retrieval score and added until the configured token budget is spent.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from token_counter import TokenCounter
+
+
+# Render order of the context sections, with their headings
+SECTIONS = (
+    ("joins", "Join path connecting these tables:"),
+    ("columns", "Relevant columns:"),
+    ("schema", "Relevant tables (current schema):"),
+    ("example", "SQL patterns from the documentation that may help:"),
+    ("documentation", "Documentation notes:"),
+)
+
+
+class ContextBuilder:
+    """Collects ranked context candidates and renders those that fit a token budget."""
+
+    def __init__(self, token_budget: int = 1500, counter: Optional[TokenCounter] = None):
+        """
+        Initialize the builder.
+
+        Args:
+            token_budget: Maximum tokens of context to add to a question
+            counter: Token counter (a new TokenCounter if not given)
+        """
+        self.token_budget = token_budget
+        self.counter = counter or TokenCounter()
+        self._candidates: Dict[tuple, Dict[str, Any]] = {}
+        self.used_tokens = 0
+        self.included: List[str] = []
+        self.compacted: List[str] = []
+        self.dropped: List[str] = []
+
+    def add(self, kind: str, key: str, text: str, score: float, compact: Optional[str] = None):
+        """
+        Offer a piece of context.
+
+        Args:
+            kind: Section it belongs to: "joins", "columns", "schema", "example" or "documentation"
+            key: Identity used to de-duplicate candidates (e.g. the table name)
+            text: Full text of the candidate
+            score: Retrieval score; higher is added first
+            compact: Shorter rendering used when the full text doesn't fit
+        """
+        if not text:
+            return
+        existing = self._candidates.get((kind, key))
+        if existing is None or score > existing["score"]:
+            self._candidates[(kind, key)] = {"kind": kind, "key": key, "text": text.strip(),
+                                            "score": score, "compact": compact}
+
+    def build(self) -> str:
+        """
+        Render the best candidates that fit the budget, grouped by section.
+
+        Returns:
+            Context text, or an empty string if nothing fits
+        """
+        chosen: Dict[str, List[str]] = {kind: [] for kind, _ in SECTIONS}
+        headings = dict(SECTIONS)
+        used = 0
+        self.included, self.compacted, self.dropped = [], [], []
+
+        for candidate in sorted(self._candidates.values(), key=lambda c: c["score"], reverse=True):
+            kind = candidate["kind"]
+            # The section heading is paid for by the first candidate in it
+            heading_cost = 0 if chosen[kind] else self.counter.count(headings[kind]) + 2
+            options = [candidate["text"]] + ([candidate["compact"]] if candidate["compact"] else [])
+
+            for i, text in enumerate(options):
+                cost = heading_cost + self.counter.count(text) + 1
+                if used + cost <= self.token_budget:
+                    chosen[kind].append(text)
+                    used += cost
+                    (self.included if i == 0 else self.compacted).append(f"{kind}:{candidate['key']}")
+                    break
+            else:
+                self.dropped.append(f"{kind}:{candidate['key']}")
+
+        self.used_tokens = used
+        parts = [f"{headings[kind]}\n" + "\n\n".join(chosen[kind]) for kind, _ in SECTIONS if chosen[kind]]
+        return "\n\n".join(parts)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the token use and what was included, shortened or dropped in the last build."""
+        return {
+            "token_budget": self.token_budget,
+            "used_tokens": self.used_tokens,
+            "included": list(self.included),
+            "compacted": list(self.compacted),
+            "dropped": list(self.dropped),
+        }
@@ -0,0 +1,133 @@
+"""
+Shared SQLAlchemy engine for the MySQL backend.
+Pool size, overflow, recycle, pre-ping and driver timeouts come from the
+environment (or explicit overrides), and the pool records how long each
+connection checkout waited so contention shows up in the agent's stats.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+# Pool options read from the environment, with their defaults
+POOL_ENV = {
+    "pool_size": ("MYSQL_POOL_SIZE", 10, int),
+    "max_overflow": ("MYSQL_MAX_OVERFLOW", 20, int),
+    "pool_timeout": ("MYSQL_POOL_TIMEOUT", 30.0, float),
+    "pool_recycle": ("MYSQL_POOL_RECYCLE", 1800, int),
+    "pool_pre_ping": ("MYSQL_POOL_PRE_PING", True, lambda value: str(value).lower() == "true"),
+    "connect_timeout": ("MYSQL_CONNECT_TIMEOUT", 10, int),
+    "read_timeout": ("MYSQL_READ_TIMEOUT", 0, int),
+}
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that measures the time callers wait to check out a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self._wait_stats = {"checkouts": 0, "timeouts": 0, "total_wait": 0.0, "max_wait": 0.0}
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self._record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self._record_wait(time.perf_counter() - started)
+        return connection
+
+    def _record_wait(self, seconds: float, timed_out: bool = False):
+        """Add one checkout (or pool timeout) to the wait statistics."""
+        with self._wait_lock:
+            if timed_out:
+                self._wait_stats["timeouts"] += 1
+                return
+            self._wait_stats["checkouts"] += 1
+            self._wait_stats["total_wait"] += seconds
+            self._wait_stats["max_wait"] = max(self._wait_stats["max_wait"], seconds)
+
+    def recreate(self) -> "TimedQueuePool":
+        # engine.dispose() swaps in a new pool; keep counting into the same statistics
+        pool = super().recreate()
+        pool._wait_lock, pool._wait_stats = self._wait_lock, self._wait_stats
+        return pool
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get checkout wait statistics and the pool's current occupancy."""
+        with self._wait_lock:
+            stats = dict(self._wait_stats)
+        checkouts = stats.pop("checkouts")
+        total_wait = stats.pop("total_wait")
+        return {
+            "checkouts": checkouts,
+            "timeouts": stats["timeouts"],
+            "avg_wait_ms": 1000 * total_wait / checkouts if checkouts else 0.0,
+            "max_wait_ms": 1000 * stats["max_wait"],
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "overflow": max(0, self.overflow()),
+        }
+
+
+def pool_options_from_env(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Read the pool options from the environment.
+
+    Args:
+        overrides: Options to use instead of the environment (keys of POOL_ENV)
+
+    Returns:
+        Dict with every key of POOL_ENV
+    """
+    overrides = overrides or {}
+    unknown = set(overrides) - set(POOL_ENV)
+    if unknown:
+        raise ValueError(f"Unknown pool options: {', '.join(sorted(unknown))}")
+
+    options = {}
+    for name, (env_var, default, convert) in POOL_ENV.items():
+        value = overrides[name] if name in overrides else os.getenv(env_var)
+        options[name] = default if value is None else convert(value)
+    return options
+
+
+def create_pooled_engine(database_url: str, overrides: Optional[Dict[str, Any]] = None) -> Engine:
+    """
+    Create an engine with a timed connection pool.
+
+    Args:
+        database_url: SQLAlchemy database URL
+        overrides: Pool options to use instead of the environment (see POOL_ENV)
+
+    Returns:
+        Engine whose pool is a TimedQueuePool
+    """
+    options = pool_options_from_env(overrides)
+
+    connect_args = {}
+    if database_url.startswith("mysql"):
+        # Driver-level timeouts (seconds); a read timeout of 0 means none
+        connect_args["connect_timeout"] = options["connect_timeout"]
+        if options["read_timeout"] > 0:
+            connect_args["read_timeout"] = options["read_timeout"]
+
+    return create_engine(
+        database_url,
+        poolclass=TimedQueuePool,
+        pool_size=options["pool_size"],
+        max_overflow=options["max_overflow"],
+        pool_timeout=options["pool_timeout"],
+        pool_recycle=options["pool_recycle"],
+        pool_pre_ping=options["pool_pre_ping"],
+        connect_args=connect_args,
+    )
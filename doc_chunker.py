@@ -0,0 +1,194 @@
+"""
+Section-level chunking of markdown documentation.
+Splits files on markdown headers and SQL comment banners such as
+"-- PATTERN 1: ..." so each section is embedded and retrieved on its own,
+without ever cutting through a fenced code block.
+"""
+
+import re
+from typing import Dict, List
+
+
+_HEADER_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_BANNER_RULE_RE = re.compile(r"^\s*--\s*[=\-#*]{8,}\s*$")
+_SQL_COMMENT_RE = re.compile(r"^\s*--\s?(.*)$")
+
+
+class DocChunker:
+    """Splits a markdown document into section chunks that fit the embedding budget."""
+
+    def __init__(self, max_chars: int = 6000, min_chars: int = 200):
+        """
+        Initialize the chunker.
+
+        Args:
+            max_chars: Largest chunk to emit; longer sections are split on blank lines
+            min_chars: Sections shorter than this are merged into the next one
+        """
+        self.max_chars = max_chars
+        self.min_chars = min_chars
+
+    def split(self, content: str, title: str = "") -> List[Dict[str, str]]:
+        """
+        Split a document into sections.
+
+        Args:
+            content: Markdown (or SQL-commented) document text
+            title: Document title, used as the section name of any preamble
+
+        Returns:
+            List of {"section", "content"} dicts in document order
+        """
+        sections = self._merge_small(self._split_sections(content, title))
+
+        chunks = []
+        for section in sections:
+            for part in self._split_oversized(section["content"]):
+                chunks.append({"section": section["section"], "content": part})
+        return chunks
+
+    def _split_sections(self, content: str, title: str) -> List[Dict[str, str]]:
+        """Cut the document at headers and comment banners outside code fences."""
+        sections: List[Dict[str, str]] = []
+        headers: List[str] = []
+        current_name = title
+        current_lines: List[str] = []
+        in_fence = False
+        in_banner = False
+        banner_named = False
+
+        def flush():
+            body = "\n".join(current_lines).strip()
+            if body:
+                sections.append({"section": current_name, "content": body})
+
+        for line in content.splitlines():
+            if _FENCE_RE.match(line):
+                in_fence = not in_fence
+                current_lines.append(line)
+                continue
+            if in_fence:
+                current_lines.append(line)
+                continue
+
+            if _BANNER_RULE_RE.match(line):
+                if in_banner:
+                    in_banner = False
+                else:
+                    # Opening rule of a "-- ===\n-- PATTERN n: ...\n-- ===" banner
+                    flush()
+                    current_lines = []
+                    in_banner = True
+                    banner_named = False
+                current_lines.append(line)
+                continue
+
+            if in_banner:
+                match = _SQL_COMMENT_RE.match(line)
+                banner_text = match.group(1).strip().rstrip(":") if match else ""
+                if banner_text and not banner_named:
+                    # First line of the banner names the section
+                    current_name = " > ".join(headers + [banner_text])
+                    banner_named = True
+                current_lines.append(line)
+                continue
+
+            header = _HEADER_RE.match(line)
+            if header:
+                flush()
+                level = len(header.group(1))
+                headers = headers[:level - 1] + [header.group(2)]
+                current_name = " > ".join(headers)
+                current_lines = [line]
+                continue
+
+            current_lines.append(line)
+
+        flush()
+        return sections
+
+    def _merge_small(self, sections: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Fold sections too short to stand alone (e.g. a lone title) into the next section."""
+        merged: List[Dict[str, str]] = []
+        pending = None
+        for section in sections:
+            if pending is not None:
+                section = {"section": self._merged_name(pending["section"], section["section"]),
+                           "content": f"{pending['content']}\n\n{section['content']}"}
+                pending = None
+            if len(section["content"]) < self.min_chars:
+                pending = section
+            else:
+                merged.append(section)
+
+        if pending is not None:
+            if merged:
+                merged[-1] = {"section": merged[-1]["section"],
+                              "content": f"{merged[-1]['content']}\n\n{pending['content']}"}
+            else:
+                merged.append(pending)
+        return merged
+
+    @staticmethod
+    def _merged_name(first: str, second: str) -> str:
+        """Name a merged section: a parent header covers its children, siblings are listed."""
+        if not first or second.startswith(first):
+            return first or second
+        return f"{first}; {second.rsplit(' > ', 1)[-1]}"
+
+    def _split_oversized(self, content: str) -> List[str]:
+        """Split a section longer than max_chars on blank lines outside code fences."""
+        if len(content) <= self.max_chars:
+            return [content]
+
+        blocks: List[str] = []
+        block: List[str] = []
+        in_fence = False
+        for line in content.splitlines():
+            if _FENCE_RE.match(line):
+                in_fence = not in_fence
+            if not line.strip() and not in_fence and block:
+                blocks.append("\n".join(block))
+                block = []
+            elif line.strip() or block:
+                block.append(line)
+        if block:
+            blocks.append("\n".join(block))
+
+        parts: List[str] = []
+        current = ""
+        for block in blocks:
+            # A single block over the limit is cut by lines as a last resort
+            for piece in self._split_lines(block):
+                if current and len(current) + len(piece) + 2 > self.max_chars:
+                    parts.append(current)
+                    current = piece
+                else:
+                    current = f"{current}\n\n{piece}" if current else piece
+        if current:
+            parts.append(current)
+        return parts
+
+    def _split_lines(self, block: str) -> List[str]:
+        """Cut one block into pieces of at most max_chars, on line boundaries where possible."""
+        if len(block) <= self.max_chars:
+            return [block]
+
+        pieces: List[str] = []
+        current = ""
+        for line in block.splitlines():
+            while len(line) > self.max_chars:
+                if current:
+                    pieces.append(current)
+                    current = ""
+                pieces.append(line[:self.max_chars])
+                line = line[self.max_chars:]
+            if current and len(current) + len(line) + 1 > self.max_chars:
+                pieces.append(current)
+                current = line
+            else:
+                current = f"{current}\n{line}" if current else line
+        if current:
+            pieces.append(current)
+        return pieces
@@ -0,0 +1,88 @@
+"""
+Manifest of documentation files loaded into the document store.
+Maps each file path to its content hash and the Milvus IDs of its chunks and
+SQL examples, so reloads only touch files that changed.
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+
+MANIFEST_VERSION = 3  # 2: files are stored as section chunks; 3: SQL examples are tracked
+
+
+class DocManifest:
+    """Tracks path -> content hash -> Milvus IDs for loaded documentation."""
+
+    def __init__(self, path: str, entries: Optional[Dict[str, Dict]] = None):
+        """
+        Initialize the manifest.
+
+        Args:
+            path: File the manifest is saved to
+            entries: Existing entries keyed by relative file path
+        """
+        self.path = path
+        self.entries: Dict[str, Dict] = entries or {}
+
+    @staticmethod
+    def content_hash(content: str) -> str:
+        """Hash file content for change detection."""
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def load(cls, path: str) -> "DocManifest":
+        """
+        Read the manifest from disk.
+
+        Returns:
+            The saved manifest, or an empty one if the file is missing or unreadable
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return cls(path)
+
+        if payload.get("version") != MANIFEST_VERSION:
+            return cls(path)
+        return cls(path, payload.get("entries", {}))
+
+    def save(self):
+        """Write the manifest to disk atomically."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "entries": self.entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def is_unchanged(self, source_path: str, content: str) -> bool:
+        """Check whether a file is already stored with this exact content."""
+        entry = self.entries.get(source_path)
+        return entry is not None and entry.get("hash") == self.content_hash(content)
+
+    def removed_paths(self, current_paths: List[str]) -> List[str]:
+        """Get manifest paths that no longer exist among the current files."""
+        current = set(current_paths)
+        return [path for path in self.entries if path not in current]
+
+    def ids_for(self, source_path: str, kind: str = "ids") -> List[int]:
+        """Get the Milvus IDs stored for a file ("ids" for chunks, "example_ids" for SQL examples)."""
+        return list(self.entries.get(source_path, {}).get(kind, []))
+
+    def all_ids(self, kind: str = "ids") -> List[int]:
+        """Get every Milvus ID of one kind the manifest knows about."""
+        return [doc_id for entry in self.entries.values() for doc_id in entry.get(kind, [])]
+
+    def record(self, source_path: str, content: str, ids: List[int], example_ids: Optional[List[int]] = None):
+        """Record that a file is stored under the given chunk and SQL example IDs."""
+        self.entries[source_path] = {
+            "hash": self.content_hash(content),
+            "ids": list(ids),
+            "example_ids": list(example_ids or []),
+        }
+
+    def forget(self, source_path: str):
+        """Remove a file from the manifest."""
+        self.entries.pop(source_path, None)
@@ -5,42 +5,459 @@ Based on the LangChain 13-minute example approach.
 
 import os
 import json
+import time
+import asyncio
 from typing import List, Dict, Any, Optional
-from pymilvus import MilvusClient
+from pymilvus import MilvusClient, DataType
 from datetime import datetime
+from doc_chunker import DocChunker
+from sql_examples import SQLExampleExtractor
+from embedding_cache import EmbeddingCache
+from token_counter import TokenCounter
+
+
+DOCUMENTATION = "documentation"
+QUERY_HISTORY = "query_history"
+SQL_EXAMPLES = "sql_examples"
+TABLE_SCHEMAS = "table_schemas"
+COLUMN_SCHEMAS = "column_schemas"
+LEGACY_COLLECTION = "documents"
+
+EMBEDDING_DIMENSION = 1536  # OpenAI text-embedding-ada-002
+
+# VARCHAR limits are in bytes; longer values are truncated on insert
+FIELD_MAX_LENGTHS = {
+    "title": 512,
+    "content": 65535,
+    "doc_type": 64,
+    "source_path": 1024,
+    "section": 512,
+    "query": 4096,
+    "sql_query": 16384,
+    "result": 65535,
+    "description": 2048,
+    "table_name": 256,
+    "column_name": 256,
+    "column_type": 256,
+    "schema_text": 65535,
+    "fingerprint": 128,
+}
+
+INDEX_TYPES = ("FLAT", "IVF_FLAT", "HNSW")
+
+
+class EmbeddingError(Exception):
+    """An embedding request failed where fallback vectors aren't acceptable."""
 
 
 class DocumentStore:
     """Manages document embeddings and query history in Milvus for semantic search."""
     
-    def __init__(self, milvus_db_path: str = "milvus_demo.db"):
+    def __init__(self, milvus_db_path: str = "milvus_demo.db", embedding_cache_path: Optional[str] = None,
+                 docs_index_type: Optional[str] = None, history_index_type: Optional[str] = None,
+                 metric_type: Optional[str] = None):
         """
         Initialize the document store with Milvus Lite.
         
         Args:
             milvus_db_path: Path to the Milvus Lite database file
+            embedding_cache_path: Path to the on-disk embedding cache.
+                Defaults to embedding_cache.db next to the Milvus database.
+            docs_index_type: ANN index for documentation (FLAT, IVF_FLAT or HNSW)
+            history_index_type: ANN index for query history (FLAT, IVF_FLAT or HNSW)
+            metric_type: Vector similarity metric (COSINE, IP or L2)
         """
         self.client = MilvusClient(milvus_db_path)
-        self.collection_name = "documents"
-        self._initialize_collection()
+        # Documentation and query history live in separate collections so
+        # documentation search never scans the ever-growing history
+        self.docs_collection = DOCUMENTATION
+        self.history_collection = QUERY_HISTORY
+        self.examples_collection = SQL_EXAMPLES
+        self.tables_collection = TABLE_SCHEMAS
+        self.columns_collection = COLUMN_SCHEMAS
+        # Documentation stays small enough for exact search; history grows without bound
+        self.index_types = {
+            DOCUMENTATION: (docs_index_type or os.getenv("MILVUS_DOCS_INDEX_TYPE", "FLAT")).upper(),
+            QUERY_HISTORY: (history_index_type or os.getenv("MILVUS_HISTORY_INDEX_TYPE", "HNSW")).upper(),
+            SQL_EXAMPLES: os.getenv("MILVUS_EXAMPLES_INDEX_TYPE", "FLAT").upper(),
+            TABLE_SCHEMAS: os.getenv("MILVUS_TABLES_INDEX_TYPE", "FLAT").upper(),
+            COLUMN_SCHEMAS: os.getenv("MILVUS_COLUMNS_INDEX_TYPE", "HNSW").upper(),
+        }
+        for index_type in self.index_types.values():
+            if index_type not in INDEX_TYPES:
+                raise ValueError(f"Unsupported index type {index_type}; use one of {', '.join(INDEX_TYPES)}")
+        self.metric_type = (metric_type or os.getenv("MILVUS_METRIC_TYPE", "COSINE")).upper()
+        # Build/search parameters per supported ANN index type
+        self.index_build_params = {
+            "FLAT": {},
+            "IVF_FLAT": {"nlist": int(os.getenv("MILVUS_IVF_NLIST", "128"))},
+            "HNSW": {"M": int(os.getenv("MILVUS_HNSW_M", "16")),
+                     "efConstruction": int(os.getenv("MILVUS_HNSW_EF_CONSTRUCTION", "200"))},
+        }
+        self.index_search_params = {
+            "FLAT": {},
+            "IVF_FLAT": {"nprobe": int(os.getenv("MILVUS_IVF_NPROBE", "16"))},
+            "HNSW": {"ef": int(os.getenv("MILVUS_HNSW_EF", "64"))},
+        }
+        self.embedding_model = "text-embedding-ada-002"
+        self.embedding_batch_tokens = int(os.getenv("EMBEDDING_BATCH_TOKENS", "100000"))
+        self.embedding_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "512"))
+        self._openai_client = None
+        self._async_openai_client = None
+        self._async_openai_loop = None
+        self.token_counter = TokenCounter()
+        self.chunker = DocChunker(
+            max_chars=int(os.getenv("DOC_CHUNK_MAX_CHARS", "6000")),
+            min_chars=int(os.getenv("DOC_CHUNK_MIN_CHARS", "200")),
+        )
+        self.example_extractor = SQLExampleExtractor()
+        
+        if embedding_cache_path is None:
+            embedding_cache_path = os.path.join(os.path.dirname(milvus_db_path), "embedding_cache.db")
+        self.embedding_cache = EmbeddingCache(
+            embedding_cache_path,
+            max_memory_entries=int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "1024")),
+            max_disk_entries=int(os.getenv("EMBEDDING_CACHE_DISK_ENTRIES", "50000")),
+        )
+        self._initialize_collections()
     
-    def _initialize_collection(self):
-        """Initialize the documents collection if it doesn't exist."""
-        try:
-            # Create collection for storing document embeddings
-            # Using dimension 1536 for OpenAI text-embedding-ada-002
-            self.client.create_collection(
-                collection_name=self.collection_name,
-                dimension=1536,  # OpenAI embedding dimension
-                metric_type="COSINE",  # Cosine similarity for text similarity
-                consistency_level="Strong"
+    def _initialize_collections(self):
+        """Create the documentation, query history, SQL example and schema index collections, migrating outdated schemas."""
+        for collection_name in (self.docs_collection, self.history_collection, self.examples_collection,
+                                self.tables_collection, self.columns_collection):
+            try:
+                rebuilt = self._rebuild_name(collection_name)
+                if not self.client.has_collection(collection_name) and self.client.has_collection(rebuilt):
+                    # A rebuild stopped between dropping the old collection and renaming the copy
+                    self.client.rename_collection(rebuilt, collection_name)
+                if self.client.has_collection(collection_name):
+                    if self._schema_matches(collection_name):
+                        print(f"📁 Milvus collection {collection_name} already exists")
+                        continue
+                    # Created before the explicit schema existed: copy rows into the new layout
+                    self._rebuild_collection(collection_name)
+                else:
+                    self._create_collection(collection_name)
+                    print(f"✅ Created Milvus collection: {collection_name}")
+            except Exception as e:
+                print(f"⚠️  Milvus collection creation warning: {e}")
+        
+        self._ensure_scalar_index(self.docs_collection, "doc_type")
+        self._ensure_scalar_index(self.docs_collection, "parent_id")
+        self._ensure_scalar_index(self.history_collection, "success")
+        self._ensure_scalar_index(self.examples_collection, "source_path")
+        
+        if self.client.has_collection(LEGACY_COLLECTION):
+            print(f"⚠️  Legacy Milvus collection '{LEGACY_COLLECTION}' found. "
+                  f"Run 'python document_store.py migrate' to move its records.")
+    
+    def _build_schema(self, collection_name: str):
+        """Build the explicit (non-dynamic) schema for a collection."""
+        schema = MilvusClient.create_schema(auto_id=False, enable_dynamic_field=False)
+        schema.add_field(field_name="id", datatype=DataType.INT64, is_primary=True)
+        schema.add_field(field_name="vector", datatype=DataType.FLOAT_VECTOR, dim=EMBEDDING_DIMENSION)
+        
+        if collection_name == self.docs_collection:
+            text_fields = ["title", "content", "doc_type", "source_path", "section"]
+        elif collection_name == self.examples_collection:
+            text_fields = ["description", "sql_query", "source_path", "section"]
+        elif collection_name == self.tables_collection:
+            text_fields = ["table_name", "schema_text", "fingerprint"]
+        elif collection_name == self.columns_collection:
+            text_fields = ["table_name", "column_name", "column_type", "schema_text", "fingerprint"]
+        else:
+            text_fields = ["query", "sql_query", "result"]
+        for field_name in text_fields:
+            schema.add_field(field_name=field_name, datatype=DataType.VARCHAR,
+                             max_length=FIELD_MAX_LENGTHS[field_name])
+        
+        if collection_name == self.docs_collection:
+            # Chunks of one file share a parent_id and are ordered by chunk_index
+            schema.add_field(field_name="parent_id", datatype=DataType.INT64)
+            schema.add_field(field_name="chunk_index", datatype=DataType.INT64)
+        elif collection_name == self.examples_collection:
+            # Filterable with array_contains(tables, "ordhdr")
+            schema.add_field(field_name="tables", datatype=DataType.ARRAY, element_type=DataType.VARCHAR,
+                             max_capacity=64, max_length=FIELD_MAX_LENGTHS["table_name"])
+        elif collection_name == self.history_collection:
+            schema.add_field(field_name="success", datatype=DataType.BOOL)
+        schema.add_field(field_name="timestamp", datatype=DataType.INT64)
+        return schema
+    
+    def _create_collection(self, collection_name: str, physical_name: Optional[str] = None):
+        """Create a collection (under physical_name, if given) with its explicit schema and configured vector index."""
+        index_type = self.index_types[collection_name]
+        index_params = self.client.prepare_index_params()
+        index_params.add_index(
+            field_name="vector",
+            index_type=index_type,
+            metric_type=self.metric_type,
+            params=self.index_build_params[index_type]
+        )
+        self.client.create_collection(
+            collection_name=physical_name or collection_name,
+            schema=self._build_schema(collection_name),
+            index_params=index_params,
+            consistency_level="Strong"
+        )
+    
+    def _schema_matches(self, collection_name: str) -> bool:
+        """Check whether an existing collection already has the explicit schema."""
+        description = self.client.describe_collection(collection_name)
+        if description.get("enable_dynamic_field"):
+            return False
+        existing = {field["name"] for field in description.get("fields", [])}
+        expected = {field.name for field in self._build_schema(collection_name).fields}
+        return existing == expected
+    
+    @staticmethod
+    def _rebuild_name(collection_name: str) -> str:
+        """Temporary name a collection is rebuilt under before it replaces the original."""
+        return f"{collection_name}_rebuild"
+    
+    def _rebuild_collection(self, collection_name: str):
+        """
+        Recreate a collection with the explicit schema, keeping its rows and vectors.
+        The rows are copied into a new collection first, so the original is only
+        dropped once the copy is complete.
+        """
+        rows = self._read_all_rows(collection_name)
+        rebuilt = self._rebuild_name(collection_name)
+        if self.client.has_collection(rebuilt):
+            self.client.drop_collection(rebuilt)  # Left over from a failed rebuild
+        self._create_collection(collection_name, physical_name=rebuilt)
+        
+        if collection_name == self.docs_collection:
+            data = [self._to_documentation_row(row) for row in rows]
+        elif collection_name == self.examples_collection:
+            data = [self._to_example_row(row) for row in rows]
+        elif collection_name in (self.tables_collection, self.columns_collection):
+            data = [self._to_schema_index_row(collection_name, row) for row in rows]
+        else:
+            data = [self._to_history_row(row) for row in rows]
+        if data:
+            self.client.insert(collection_name=rebuilt, data=data)
+        self.client.drop_collection(collection_name)
+        self.client.rename_collection(rebuilt, collection_name)
+        print(f"🔁 Migrated Milvus collection {collection_name} to the explicit schema ({len(data)} records)")
+    
+    def migrate_legacy_collection(self, drop_legacy: bool = False) -> Dict[str, int]:
+        """
+        Copy records from the old combined 'documents' collection into the
+        documentation and query history collections, reusing stored vectors.
+        
+        Args:
+            drop_legacy: Drop the legacy collection once its records are copied
+            
+        Returns:
+            Number of records migrated into each collection
+        """
+        migrated = {self.docs_collection: 0, self.history_collection: 0}
+        if not self.client.has_collection(LEGACY_COLLECTION):
+            print(f"📁 No legacy collection '{LEGACY_COLLECTION}' to migrate")
+            return migrated
+        
+        documents, history = [], []
+        for row in self._read_all_rows(LEGACY_COLLECTION):
+            if row.get("doc_type") == QUERY_HISTORY:
+                history.append(self._to_history_row(row))
+            else:
+                # Legacy documentation kept its title in "query" and content in "result"
+                documents.append(self._to_documentation_row({
+                    **row, "title": row.get("query", ""), "content": row.get("result", "")
+                }))
+        
+        # Upsert keeps the migration idempotent if it is run twice
+        if documents:
+            self.client.upsert(collection_name=self.docs_collection, data=documents)
+        if history:
+            self.client.upsert(collection_name=self.history_collection, data=history)
+        migrated = {self.docs_collection: len(documents), self.history_collection: len(history)}
+        print(f"✅ Migrated {len(documents)} documents and {len(history)} query history records "
+              f"from '{LEGACY_COLLECTION}'")
+        
+        if drop_legacy:
+            self.client.drop_collection(LEGACY_COLLECTION)
+            print(f"🗑️  Dropped legacy collection '{LEGACY_COLLECTION}'")
+        return migrated
+    
+    def reembed_query_history(self) -> int:
+        """
+        Re-embed stored query history by question alone. History written by older
+        versions embedded the question, SQL and result together, which a bare
+        question never matches closely enough for the answer cache.
+        
+        Returns:
+            Number of history records re-embedded
+        """
+        rows = self._read_all_rows(self.history_collection)
+        if not rows:
+            return 0
+        embeddings = self.embed_many([row.get("query", "") for row in rows])
+        data = [self._to_history_row({**row, "vector": embedding}) for row, embedding in zip(rows, embeddings)]
+        self.client.upsert(collection_name=self.history_collection, data=data)
+        print(f"✅ Re-embedded {len(data)} query history records")
+        return len(data)
+    
+    def _read_all_rows(self, collection_name: str, batch_size: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Read every row (including vectors) from a collection.
+        
+        Raises:
+            RuntimeError: Fewer rows could be read than the collection holds
+        """
+        rows = []
+        if hasattr(self.client, "query_iterator"):
+            iterator = self.client.query_iterator(
+                collection_name=collection_name, batch_size=batch_size, filter="", output_fields=["*"]
+            )
+            while True:
+                batch = iterator.next()
+                if not batch:
+                    iterator.close()
+                    break
+                rows.extend(batch)
+            return rows
+        
+        # Older clients: page with offsets (Milvus caps offset + limit at 16384)
+        offset = 0
+        while offset < 16384:
+            batch = self.client.query(
+                collection_name=collection_name, filter="", output_fields=["*"],
+                limit=min(batch_size, 16384 - offset), offset=offset
             )
-            print(f"✅ Created Milvus collection: {self.collection_name}")
+            if not batch:
+                return rows
+            rows.extend(batch)
+            offset += len(batch)
+        
+        total = self.client.query(collection_name=collection_name, filter="", output_fields=["count(*)"])
+        row_count = int(total[0]["count(*)"]) if total else 0
+        if row_count > len(rows):
+            raise RuntimeError(f"Read {len(rows)} of {row_count} rows from {collection_name} (the offset limit); "
+                               f"upgrade pymilvus for query_iterator to copy the whole collection")
+        return rows
+    
+    def _to_documentation_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a stored row into the documentation schema."""
+        return {
+            "id": row["id"],
+            "vector": list(row["vector"]),
+            "title": self._fit(row.get("title", ""), "title"),
+            "content": self._fit(row.get("content", ""), "content"),
+            "doc_type": self._fit(row.get("doc_type") or "document", "doc_type"),
+            "source_path": self._fit(row.get("source_path", ""), "source_path"),
+            "section": self._fit(row.get("section", ""), "section"),
+            "parent_id": int(row.get("parent_id") or row["id"]),
+            "chunk_index": int(row.get("chunk_index") or 0),
+            "timestamp": self._to_epoch(row.get("timestamp")),
+        }
+    
+    def _to_history_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a stored row into the query history schema."""
+        return {
+            "id": row["id"],
+            "vector": list(row["vector"]),
+            "query": self._fit(row.get("query", ""), "query"),
+            "sql_query": self._fit(row.get("sql_query", ""), "sql_query"),
+            "result": self._fit(row.get("result", ""), "result"),
+            "success": bool(row.get("success", True)),
+            "timestamp": self._to_epoch(row.get("timestamp")),
+        }
+    
+    def _to_example_row(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a stored row into the SQL example schema."""
+        return {
+            "id": row["id"],
+            "vector": list(row["vector"]),
+            "description": self._fit(row.get("description", ""), "description"),
+            "sql_query": self._fit(row.get("sql_query", ""), "sql_query"),
+            "source_path": self._fit(row.get("source_path", ""), "source_path"),
+            "section": self._fit(row.get("section", ""), "section"),
+            "tables": [self._fit(table, "table_name") for table in (row.get("tables") or [])[:64]],
+            "timestamp": self._to_epoch(row.get("timestamp")),
+        }
+    
+    def _to_schema_index_row(self, collection_name: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a stored row into the table or column schema collection's schema."""
+        data = {
+            "id": row["id"],
+            "vector": list(row["vector"]),
+            "table_name": self._fit(row.get("table_name", ""), "table_name"),
+            "schema_text": self._fit(row.get("schema_text", ""), "schema_text"),
+            "fingerprint": self._fit(row.get("fingerprint", ""), "fingerprint"),
+            "timestamp": self._to_epoch(row.get("timestamp")),
+        }
+        if collection_name == self.columns_collection:
+            data["column_name"] = self._fit(row.get("column_name", ""), "column_name")
+            data["column_type"] = self._fit(row.get("column_type", ""), "column_type")
+        return data
+    
+    @staticmethod
+    def _fit(value: Any, field_name: str) -> str:
+        """Truncate a value to its VARCHAR field's byte limit without splitting a character."""
+        encoded = str(value or "").encode("utf-8")
+        max_length = FIELD_MAX_LENGTHS[field_name]
+        if len(encoded) <= max_length:
+            return str(value or "")
+        return encoded[:max_length].decode("utf-8", errors="ignore")
+    
+    @staticmethod
+    def _to_epoch(timestamp: Any) -> int:
+        """Convert an ISO string or numeric timestamp to epoch seconds."""
+        if isinstance(timestamp, (int, float)):
+            return int(timestamp)
+        try:
+            return int(datetime.fromisoformat(timestamp).timestamp())
+        except (TypeError, ValueError):
+            return int(time.time())
+    
+    def _search_params(self, collection_name: str) -> Dict[str, Any]:
+        """Search parameters matching a collection's index type."""
+        return {"metric_type": self.metric_type, "params": self.index_search_params[self.index_types[collection_name]]}
+    
+    def _ensure_scalar_index(self, collection_name: str, field_name: str):
+        """Create an inverted index on a scalar field used in search filters."""
+        try:
+            if any(field_name in name for name in self.client.list_indexes(collection_name=collection_name)):
+                return
+            index_params = self.client.prepare_index_params()
+            index_params.add_index(field_name=field_name, index_type="INVERTED", index_name=f"{field_name}_index")
+            self.client.create_index(collection_name=collection_name, index_params=index_params)
         except Exception as e:
-            if "already exists" in str(e):
-                print(f"📁 Milvus collection {self.collection_name} already exists")
-            else:
-                print(f"⚠️  Milvus collection creation warning: {e}")
+            print(f"⚠️  Scalar index on {collection_name}.{field_name} unavailable: {e}")
+    
+    @staticmethod
+    def build_filter(doc_types: Optional[List[str]] = None, exclude_doc_types: Optional[List[str]] = None,
+                     success: Optional[bool] = None, since: Optional[datetime] = None,
+                     until: Optional[datetime] = None) -> str:
+        """
+        Build a Milvus scalar filter expression for search calls.
+        doc_type filters apply to documentation, success filters to query history.
+        
+        Args:
+            doc_types: Only include these document types
+            exclude_doc_types: Exclude these document types
+            success: Only include records with this success flag
+            since: Only include records stored at or after this time
+            until: Only include records stored before this time
+            
+        Returns:
+            Filter expression, or an empty string when no filter applies
+        """
+        clauses = []
+        if doc_types:
+            clauses.append(f"doc_type in {json.dumps(list(doc_types))}")
+        if exclude_doc_types:
+            clauses.append(f"doc_type not in {json.dumps(list(exclude_doc_types))}")
+        if success is not None:
+            clauses.append(f"success == {'true' if success else 'false'}")
+        # Timestamps are stored as epoch seconds
+        if since is not None:
+            clauses.append(f"timestamp >= {int(since.timestamp())}")
+        if until is not None:
+            clauses.append(f"timestamp < {int(until.timestamp())}")
+        return " and ".join(clauses)
     
     def store_query_history(self, query: str, sql_query: str, result: str, success: bool = True) -> bool:
         """
@@ -55,39 +472,55 @@ class DocumentStore:
         Returns:
             True if successful, False otherwise
         """
-        try:
-            # Create a document text for embedding
-            doc_text = f"Query: {query}\nSQL: {sql_query}\nResult: {result[:500]}..."  # Truncate long results
-            
-            # Generate embedding using OpenAI (you'll need to implement this)
-            embedding = self._get_embedding(doc_text)
+        stored = self.store_query_history_many(
+            [{"query": query, "sql_query": sql_query, "result": result, "success": success}]
+        )
+        if stored:
+            print(f"✅ Stored query history: {query[:50]}...")
+        return stored == 1
+    
+    def store_query_history_many(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Store many query history records with one batched embedding pass and a single upsert.
+        A question asked again with the same SQL replaces its earlier record.
+        
+        Args:
+            records: List of dicts with "query", "sql_query", "result" and "success"
             
-            # Create document data
-            doc_id = self._generate_doc_id(query, sql_query)
-            timestamp = datetime.now().isoformat()
+        Returns:
+            Number of records stored
+        """
+        if not records:
+            return 0
+        
+        try:
+            # Only the question is embedded: history is searched with a bare question
+            # (answer cache, suggestions), and SQL or result text would pull the vectors apart
+            embeddings = self.embed_many([r["query"] for r in records])
+            timestamp = int(time.time())
             
-            data = {
-                "id": doc_id,
-                "vector": embedding,
-                "query": query,
-                "sql_query": sql_query,
-                "result": result,
-                "success": success,
-                "timestamp": timestamp,
-                "doc_type": "query_history"
-            }
+            # Keyed by ID, so a question repeated within the batch keeps only its latest record
+            data = {}
+            for record, embedding in zip(records, embeddings):
+                row = self._to_history_row({
+                    **record,
+                    "id": self.history_id(record["query"], record["sql_query"]),
+                    "vector": embedding,
+                    "timestamp": timestamp
+                })
+                data[row["id"]] = row
             
-            self.client.insert(
-                collection_name=self.collection_name,
-                data=[data]
+            # Upsert, so an ID already in the collection can't fail the whole batch
+            self.client.upsert(
+                collection_name=self.history_collection,
+                data=list(data.values())
             )
             
-            print(f"✅ Stored query history: {query[:50]}...")
-            return True
+            return len(records)
             
         except Exception as e:
             print(f"❌ Error storing query history: {e}")
-            return False
+            return 0
     
     def store_document(self, title: str, content: str, doc_type: str = "document") -> bool:
         """
@@ -101,44 +534,389 @@ class DocumentStore:
         Returns:
             True if successful, False otherwise
         """
+        stored = self.store_documents([{"title": title, "content": content, "doc_type": doc_type}])
+        return stored == 1
+    
+    def store_documents(self, documents: List[Dict[str, str]]) -> int:
+        """
+        Store many documents, split into section chunks, with one batched
+        embedding pass and a single insert. SQL examples found in the
+        documents are stored alongside (see extract_sql_examples).
+        
+        Args:
+            documents: List of dicts with "title", "content" and optional "doc_type"
+            
+        Returns:
+            Number of documents stored
+        """
+        if not documents:
+            return 0
+        
         try:
-            # Generate embedding
-            embedding = self._get_embedding(content)
+            data = self._embed_documentation_rows(self.chunk_documents(documents))
             
-            # Create document data
-            doc_id = self._generate_doc_id(title, content)
-            timestamp = datetime.now().isoformat()
+            self.client.insert(
+                collection_name=self.docs_collection,
+                data=data
+            )
+            examples = self.upsert_sql_examples(self.extract_sql_examples(documents))
             
-            data = {
-                "id": doc_id,
-                "vector": embedding,
-                "query": title,
-                "sql_query": "",
-                "result": content,
-                "success": True,
-                "timestamp": timestamp,
-                "doc_type": doc_type
-            }
+            print(f"✅ Stored {len(documents)} documents ({len(data)} chunks, {examples} SQL examples)")
+            return len(documents)
             
-            self.client.insert(
-                collection_name=self.collection_name,
-                data=[data]
+        except Exception as e:
+            print(f"❌ Error storing documents: {e}")
+            return 0
+    
+    def chunk_documents(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Split documents into section chunks that reference their parent document.
+        Chunks of a document with a "source_path" get IDs stable across edits
+        (see source_doc_id), so re-chunking an edited file overwrites its old chunks.
+        
+        Args:
+            documents: List of dicts with "title", "content" and optional
+                "doc_type" and "source_path"
+            
+        Returns:
+            List of chunk records with "id", "parent_id", "chunk_index" and "section"
+        """
+        chunks = []
+        for doc in documents:
+            source_path = doc.get("source_path", "")
+            if source_path:
+                parent_id = self.parent_doc_id(source_path)
+            else:
+                parent_id = self._generate_doc_id(doc["title"], doc["content"])
+            
+            for chunk_index, chunk in enumerate(self.chunker.split(doc["content"], doc["title"])):
+                if source_path:
+                    chunk_id = self.source_doc_id(source_path, chunk_index)
+                else:
+                    chunk_id = self._generate_doc_id(doc["title"], f"{chunk_index}:{chunk['content']}")
+                chunks.append({
+                    **doc,
+                    "id": chunk_id,
+                    "parent_id": parent_id,
+                    "chunk_index": chunk_index,
+                    "section": chunk["section"],
+                    "content": chunk["content"],
+                })
+        return chunks
+    
+    def upsert_documents(self, documents: List[Dict[str, Any]], strict: bool = False) -> int:
+        """
+        Insert or replace documents by ID, so an edited document overwrites its old version.
+        
+        Args:
+            documents: List of dicts with "id", "title", "content" and optional
+                "doc_type", "source_path", "parent_id", "chunk_index" and "section"
+                (see chunk_documents)
+            strict: Write nothing if any embedding request fails, instead of storing fallback vectors
+            
+        Returns:
+            Number of records written
+        """
+        if not documents:
+            return 0
+        
+        try:
+            data = self._embed_documentation_rows(documents, strict=strict)
+            self.client.upsert(
+                collection_name=self.docs_collection,
+                data=data
             )
+            return len(data)
+            
+        except Exception as e:
+            print(f"❌ Error upserting documents: {e}")
+            return 0
+    
+    def delete_documents(self, ids: Optional[List[int]] = None, filter_expr: str = "") -> bool:
+        """
+        Delete documentation records by ID or by filter expression.
+        
+        Args:
+            ids: Primary keys to delete
+            filter_expr: Milvus filter expression selecting records to delete
             
-            print(f"✅ Stored document: {title}")
+        Returns:
+            True if successful, False otherwise
+        """
+        return self._delete(self.docs_collection, ids, filter_expr)
+    
+    def _delete(self, collection_name: str, ids: Optional[List[int]], filter_expr: str) -> bool:
+        """Delete records from a collection by ID and/or filter expression."""
+        if not ids and not filter_expr:
+            return True
+        
+        try:
+            if ids:
+                self.client.delete(collection_name=collection_name, ids=list(ids))
+            if filter_expr:
+                self.client.delete(collection_name=collection_name, filter=filter_expr)
             return True
             
         except Exception as e:
-            print(f"❌ Error storing document: {e}")
+            print(f"❌ Error deleting from {collection_name}: {e}")
             return False
     
-    def search_similar_queries(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+    def existing_document_ids(self, ids: List[int]) -> List[int]:
+        """
+        Get which of the given IDs are present in the documentation collection.
+        
+        Args:
+            ids: Primary keys to check
+            
+        Returns:
+            The IDs that exist
+        """
+        return self._existing_ids(self.docs_collection, ids)
+    
+    def _existing_ids(self, collection_name: str, ids: List[int]) -> List[int]:
+        """Get which of the given IDs are present in a collection."""
+        if not ids:
+            return []
+        rows = self.client.get(collection_name=collection_name, ids=list(ids), output_fields=["id"])
+        return [row["id"] for row in rows]
+    
+    def get_document_chunks(self, parent_id: int) -> List[Dict[str, Any]]:
+        """
+        Get every chunk of one source document, in order.
+        
+        Args:
+            parent_id: Parent document ID shared by the chunks (see parent_doc_id)
+            
+        Returns:
+            List of chunks with "title", "section", "content" and "chunk_index"
+        """
+        try:
+            rows = self.client.query(
+                collection_name=self.docs_collection,
+                filter=f"parent_id == {int(parent_id)}",
+                output_fields=["title", "section", "content", "chunk_index"]
+            )
+            return sorted(rows, key=lambda row: row.get("chunk_index", 0))
+            
+        except Exception as e:
+            print(f"❌ Error reading document chunks: {e}")
+            return []
+    
+    def extract_sql_examples(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Pull SQL example statements out of documents as separate records.
+        Examples from a document with a "source_path" get IDs stable across edits.
+        
+        Args:
+            documents: List of dicts with "title", "content" and optional "source_path"
+            
+        Returns:
+            List of example records with "id", "description", "sql_query", "tables",
+            "source_path" and "section"
+        """
+        examples = []
+        for doc in documents:
+            source_path = doc.get("source_path", "")
+            for index, example in enumerate(self.example_extractor.extract(doc["content"], doc["title"])):
+                if source_path:
+                    example_id = self.source_doc_id(f"{source_path}#sql", index)
+                else:
+                    example_id = self._generate_doc_id(example["description"], example["sql_query"])
+                examples.append({
+                    **example,
+                    "id": example_id,
+                    "source_path": source_path,
+                    "section": doc["title"],
+                })
+        return examples
+    
+    def upsert_sql_examples(self, examples: List[Dict[str, Any]], strict: bool = False) -> int:
+        """
+        Embed SQL examples by their description and insert or replace them by ID.
+        
+        Args:
+            examples: Records from extract_sql_examples
+            strict: Write nothing if any embedding request fails, instead of storing fallback vectors
+            
+        Returns:
+            Number of examples written
+        """
+        if not examples:
+            return 0
+        
+        try:
+            embeddings = self.embed_many([self._example_embedding_text(example) for example in examples],
+                                         strict=strict)
+            timestamp = int(time.time())
+            data = [
+                self._to_example_row({**example, "vector": embedding, "timestamp": timestamp})
+                for example, embedding in zip(examples, embeddings)
+            ]
+            self.client.upsert(
+                collection_name=self.examples_collection,
+                data=data
+            )
+            return len(data)
+            
+        except Exception as e:
+            print(f"❌ Error storing SQL examples: {e}")
+            return 0
+    
+    def delete_sql_examples(self, ids: Optional[List[int]] = None, filter_expr: str = "") -> bool:
+        """
+        Delete SQL examples by ID or by filter expression.
+        
+        Args:
+            ids: Primary keys to delete
+            filter_expr: Milvus filter expression selecting examples to delete
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        return self._delete(self.examples_collection, ids, filter_expr)
+    
+    def existing_sql_example_ids(self, ids: List[int]) -> List[int]:
+        """Get which of the given IDs are present in the SQL example collection."""
+        return self._existing_ids(self.examples_collection, ids)
+    
+    def sync_table_schemas(self, descriptions: Dict[str, str], fingerprint: str) -> int:
+        """
+        Index one description per database table for retrieval-driven table selection.
+        
+        Args:
+            descriptions: Embedding text keyed by table name (see SchemaSnapshot.describe_table)
+            fingerprint: Schema checksum the descriptions were built from
+            
+        Returns:
+            Number of tables written (0 if the index was already current)
+        """
+        records = [{"key": name, "table_name": name, "schema_text": text} for name, text in descriptions.items()]
+        return self._sync_schema_index(self.tables_collection, records, fingerprint, "table schemas")
+    
+    def sync_column_schemas(self, columns: List[Dict[str, str]], fingerprint: str) -> int:
+        """
+        Index one description per database column for column-level retrieval.
+        
+        Args:
+            columns: Dicts with "table_name", "column_name", "column_type" and
+                "schema_text" (see SchemaSnapshot.describe_column)
+            fingerprint: Schema checksum the descriptions were built from
+            
+        Returns:
+            Number of columns written (0 if the index was already current)
+        """
+        records = [{**column, "key": f"{column['table_name']}.{column['column_name']}"} for column in columns]
+        return self._sync_schema_index(self.columns_collection, records, fingerprint, "column schemas")
+    
+    def schema_index_is_current(self, collection_name: str, fingerprint: str, expected_count: int) -> bool:
+        """
+        Check whether a schema index holds exactly the records built from this schema fingerprint.
+        
+        Args:
+            collection_name: TABLE_SCHEMAS or COLUMN_SCHEMAS
+            fingerprint: Current schema checksum
+            expected_count: Number of tables or columns in the schema
+        """
+        existing = self._schema_index_rows(collection_name)
+        return len(existing) == expected_count and all(row["fingerprint"] == fingerprint for row in existing)
+    
+    def _schema_index_rows(self, collection_name: str) -> List[Dict[str, Any]]:
+        """Read the IDs and fingerprints of every record in a schema index."""
+        return self.client.query(
+            collection_name=collection_name,
+            filter="",
+            output_fields=["id", "fingerprint"],
+            limit=16384
+        )
+    
+    def _sync_schema_index(self, collection_name: str, records: List[Dict[str, Any]], fingerprint: str,
+                           label: str) -> int:
+        """
+        Bring a schema index in line with the current schema.
+        Does nothing if it already matches the fingerprint; otherwise re-embeds every
+        record (unchanged ones hit the embedding cache) and removes dropped ones.
+        """
+        try:
+            existing = self._schema_index_rows(collection_name)
+            if len(existing) == len(records) and all(row["fingerprint"] == fingerprint for row in existing):
+                return 0
+            
+            print(f"🗂️  Indexing {len(records)} {label}...")
+            prefix = "table" if collection_name == self.tables_collection else "column"
+            embeddings = self.embed_many([record["schema_text"] for record in records])
+            timestamp = int(time.time())
+            data = [
+                self._to_schema_index_row(collection_name, {
+                    **record,
+                    "id": self.source_doc_id(f"{prefix}:{record['key']}"),
+                    "vector": embedding,
+                    "fingerprint": fingerprint,
+                    "timestamp": timestamp,
+                })
+                for record, embedding in zip(records, embeddings)
+            ]
+            if data:
+                self.client.upsert(collection_name=collection_name, data=data)
+            
+            current_ids = {row["id"] for row in data}
+            dropped = [row["id"] for row in existing if row["id"] not in current_ids]
+            self._delete(collection_name, dropped, "")
+            return len(data)
+            
+        except Exception as e:
+            print(f"❌ Error indexing {label}: {e}")
+            return 0
+    
+    def list_sql_examples(self, limit: int = 16384) -> List[Dict[str, Any]]:
+        """
+        Read every stored SQL example (without vectors), e.g. to mine join conditions.
+        
+        Returns:
+            List of {"sql_query", "tables"}
+        """
+        try:
+            return self.client.query(
+                collection_name=self.examples_collection,
+                filter="",
+                output_fields=["sql_query", "tables"],
+                limit=limit
+            )
+        except Exception as e:
+            print(f"❌ Error reading SQL examples: {e}")
+            return []
+    
+    @staticmethod
+    def _example_embedding_text(example: Dict[str, Any]) -> str:
+        """Text embedded for an example: its description (matched against questions) and tables."""
+        tables = ", ".join(example.get("tables") or [])
+        description = example.get("description") or example["sql_query"]
+        return f"{description}\nTables: {tables}" if tables else description
+    
+    def _embed_documentation_rows(self, documents: List[Dict[str, Any]], strict: bool = False) -> List[Dict[str, Any]]:
+        """Embed documents in batches and build documentation rows, keeping any given IDs."""
+        embeddings = self.embed_many([doc["content"] for doc in documents], strict=strict)
+        timestamp = int(time.time())
+        
+        return [
+            self._to_documentation_row({
+                **doc,
+                "id": doc.get("id") or self._generate_doc_id(doc["title"], doc["content"]),
+                "vector": embedding,
+                "timestamp": timestamp
+            })
+            for doc, embedding in zip(documents, embeddings)
+        ]
+    
+    def search_similar_queries(self, query: str, limit: int = 5, filter_expr: str = "",
+                               include_documentation: bool = False) -> List[Dict[str, Any]]:
         """
         Search for similar queries based on the input query.
         
         Args:
             query: Natural language query to search for
             limit: Maximum number of results
+            filter_expr: Milvus filter expression (see build_filter) applied server-side
+            include_documentation: Also search documentation and merge results by score
             
         Returns:
             List of similar queries with their SQL and results
@@ -147,47 +925,25 @@ class DocumentStore:
             # Generate embedding for the query
             query_embedding = self._get_embedding(query)
             
-            # Search in Milvus
-            results = self.client.search(
-                collection_name=self.collection_name,
-                data=[query_embedding],
-                limit=limit,
-                output_fields=["query", "sql_query", "result", "success", "timestamp", "doc_type"]
-            )
+            formatted_results = [
+                self._format_history_hit(hit)
+                for hit in self._search_collection(self.history_collection, query_embedding, limit, filter_expr)
+            ]
             
-            # Format results
-            formatted_results = []
-            if not results or len(results) == 0:
-                return []
-            
-            for result in results[0]:  # results is a list of lists
-                try:
-                    # Handle different Milvus result structures
-                    # Score might be in result["distance"] or result["score"]
-                    similarity_score = 0.0
-                    if "distance" in result:
-                        similarity_score = result["distance"]
-                    elif "score" in result:
-                        similarity_score = result["score"]
-                    
-                    # Handle entity data - might be nested or flat
-                    entity_data = result.get("entity", result)
-                    if not isinstance(entity_data, dict):
-                        entity_data = result
-                    
+            if include_documentation:
+                for doc in self._search_documentation_by_vector(query_embedding, limit):
+                    # Present documentation in the same shape as history rows
                     formatted_results.append({
-                        "query": entity_data.get("query", ""),
-                        "sql_query": entity_data.get("sql_query", ""),
-                        "result": entity_data.get("result", ""),
-                        "success": entity_data.get("success", True),
-                        "timestamp": entity_data.get("timestamp", ""),
-                        "doc_type": entity_data.get("doc_type", "query_history"),
-                        "similarity_score": similarity_score
+                        "query": doc["title"],
+                        "sql_query": "",
+                        "result": doc["content"],
+                        "success": True,
+                        "timestamp": doc["timestamp"],
+                        "doc_type": doc["doc_type"],
+                        "similarity_score": doc["similarity_score"]
                     })
-                except (KeyError, TypeError) as e:
-                    # Skip malformed results
-                    print(f"⚠️  Skipping malformed search result: {e}")
-                    continue
+                formatted_results.sort(key=lambda r: r["similarity_score"], reverse=True)
+                formatted_results = formatted_results[:limit]
             
             return formatted_results
             
@@ -195,13 +951,14 @@ class DocumentStore:
             print(f"❌ Error searching similar queries: {e}")
             return []
     
-    def search_documentation(self, query: str, limit: int = 2) -> List[Dict[str, Any]]:
+    def search_documentation(self, query: str, limit: int = 2, filter_expr: str = "") -> List[Dict[str, Any]]:
         """
         Search for relevant documentation (not query history).
         
         Args:
             query: Natural language query to search for
             limit: Maximum number of results
+            filter_expr: Milvus filter expression (see build_filter)
             
         Returns:
             List of relevant documentation with SQL examples
@@ -209,59 +966,246 @@ class DocumentStore:
         try:
             # Generate embedding for the query
             query_embedding = self._get_embedding(query)
+            return self._search_documentation_by_vector(query_embedding, limit, filter_expr)
             
-            # Search in Milvus (get more results to filter manually)
-            results = self.client.search(
-                collection_name=self.collection_name,
-                data=[query_embedding],
-                limit=limit * 3,  # Get more to filter
-                output_fields=["query", "sql_query", "result", "success", "timestamp", "doc_type"]
-            )
+        except Exception as e:
+            print(f"❌ Error searching documentation: {e}")
+            return []
+    
+    async def asearch_documentation(self, query: str, limit: int = 2, filter_expr: str = "") -> List[Dict[str, Any]]:
+        """
+        Async variant of search_documentation.
+        The embedding request is awaited; the Milvus search runs in a worker thread.
+        
+        Args:
+            query: Natural language query to search for
+            limit: Maximum number of results
+            filter_expr: Milvus filter expression (see build_filter)
             
-            # Format results
-            formatted_results = []
-            if not results or len(results) == 0:
-                return []
-            
-            for result in results[0]:  # results is a list of lists
-                try:
-                    entity_data = result.get("entity", result)
-                    if not isinstance(entity_data, dict):
-                        entity_data = result
-                    
-                    # Only include documentation, not query history
-                    doc_type = entity_data.get("doc_type", "")
-                    if doc_type == "query_history":
-                        continue
-                    
-                    similarity_score = 0.0
-                    if "distance" in result:
-                        similarity_score = result["distance"]
-                    elif "score" in result:
-                        similarity_score = result["score"]
-                    
-                    formatted_results.append({
-                        "title": entity_data.get("query", ""),  # Title is stored in "query" field for docs
-                        "content": entity_data.get("result", ""),  # Content is stored in "result" field for docs
-                        "doc_type": doc_type,
-                        "similarity_score": similarity_score
-                    })
-                    
-                    if len(formatted_results) >= limit:
-                        break
-                        
-                except (KeyError, TypeError) as e:
-                    continue
+        Returns:
+            List of relevant documentation with SQL examples
+        """
+        try:
+            query_embedding = await self.aget_embedding(query)
+            return await asyncio.to_thread(self._search_documentation_by_vector, query_embedding, limit, filter_expr)
+        except Exception as e:
+            print(f"❌ Error searching documentation: {e}")
+            return []
+    
+    def search_sql_examples(self, query: str, limit: int = 1, filter_expr: str = "") -> List[Dict[str, Any]]:
+        """
+        Find the stored SQL examples whose descriptions best match a question.
+        
+        Args:
+            query: Natural language question
+            limit: Maximum number of examples
+            filter_expr: Milvus filter expression, e.g. 'array_contains(tables, "ordhdr")'
             
-            return formatted_results
+        Returns:
+            List of examples with "description", "sql_query", "tables",
+            "source_path", "section" and "similarity_score"
+        """
+        try:
+            query_embedding = self._get_embedding(query)
+            return self._search_sql_examples_by_vector(query_embedding, limit, filter_expr)
+            
+        except Exception as e:
+            print(f"❌ Error searching SQL examples: {e}")
+            return []
+    
+    async def asearch_sql_examples(self, query: str, limit: int = 1, filter_expr: str = "") -> List[Dict[str, Any]]:
+        """
+        Async variant of search_sql_examples.
+        
+        Args:
+            query: Natural language question
+            limit: Maximum number of examples
+            filter_expr: Milvus filter expression
+            
+        Returns:
+            List of examples, best match first
+        """
+        try:
+            query_embedding = await self.aget_embedding(query)
+            return await asyncio.to_thread(self._search_sql_examples_by_vector, query_embedding, limit, filter_expr)
+        except Exception as e:
+            print(f"❌ Error searching SQL examples: {e}")
+            return []
+    
+    def _search_sql_examples_by_vector(self, query_embedding: List[float], limit: int,
+                                       filter_expr: str = "") -> List[Dict[str, Any]]:
+        """Search SQL examples nearest to an embedding."""
+        return [
+            {
+                "description": hit["entity"].get("description", ""),
+                "sql_query": hit["entity"].get("sql_query", ""),
+                "tables": list(hit["entity"].get("tables") or []),
+                "source_path": hit["entity"].get("source_path", ""),
+                "section": hit["entity"].get("section", ""),
+                "similarity_score": hit["similarity_score"]
+            }
+            for hit in self._search_collection(self.examples_collection, query_embedding, limit, filter_expr)
+        ]
+    
+    def search_table_schemas(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Find the tables whose schema descriptions best match a question.
+        
+        Args:
+            query: Natural language question
+            limit: Maximum number of tables
+            
+        Returns:
+            List of {"table_name", "similarity_score"}, best match first
+        """
+        try:
+            query_embedding = self._get_embedding(query)
+            return self._search_table_schemas_by_vector(query_embedding, limit)
+            
+        except Exception as e:
+            print(f"❌ Error searching table schemas: {e}")
+            return []
+    
+    async def asearch_table_schemas(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Async variant of search_table_schemas."""
+        try:
+            query_embedding = await self.aget_embedding(query)
+            return await asyncio.to_thread(self._search_table_schemas_by_vector, query_embedding, limit)
+        except Exception as e:
+            print(f"❌ Error searching table schemas: {e}")
+            return []
+    
+    def _search_table_schemas_by_vector(self, query_embedding: List[float], limit: int) -> List[Dict[str, Any]]:
+        """Search table descriptions nearest to an embedding."""
+        return [
+            {"table_name": hit["entity"].get("table_name", ""), "similarity_score": hit["similarity_score"]}
+            for hit in self._search_collection(self.tables_collection, query_embedding, limit)
+        ]
+    
+    def search_column_schemas(self, query: str, limit: int = 8) -> List[Dict[str, Any]]:
+        """
+        Find the columns whose descriptions best match a question.
+        
+        Args:
+            query: Natural language question
+            limit: Maximum number of columns
             
+        Returns:
+            List of {"table_name", "column_name", "column_type", "description",
+            "similarity_score"}, best match first
+        """
+        try:
+            query_embedding = self._get_embedding(query)
+            return self._search_column_schemas_by_vector(query_embedding, limit)
+            
+        except Exception as e:
+            print(f"❌ Error searching column schemas: {e}")
+            return []
+    
+    async def asearch_column_schemas(self, query: str, limit: int = 8) -> List[Dict[str, Any]]:
+        """Async variant of search_column_schemas."""
+        try:
+            query_embedding = await self.aget_embedding(query)
+            return await asyncio.to_thread(self._search_column_schemas_by_vector, query_embedding, limit)
         except Exception as e:
-            # If filter doesn't work, fall back to regular search and filter manually
+            print(f"❌ Error searching column schemas: {e}")
+            return []
+    
+    def _search_column_schemas_by_vector(self, query_embedding: List[float], limit: int) -> List[Dict[str, Any]]:
+        """Search column descriptions nearest to an embedding."""
+        return [
+            {
+                "table_name": hit["entity"].get("table_name", ""),
+                "column_name": hit["entity"].get("column_name", ""),
+                "column_type": hit["entity"].get("column_type", ""),
+                "description": hit["entity"].get("schema_text", ""),
+                "similarity_score": hit["similarity_score"]
+            }
+            for hit in self._search_collection(self.columns_collection, query_embedding, limit)
+        ]
+    
+    def _search_documentation_by_vector(self, query_embedding: List[float], limit: int,
+                                        filter_expr: str = "") -> List[Dict[str, Any]]:
+        """Search documentation nearest to an embedding."""
+        return [
+            {
+                "title": hit["entity"].get("title", ""),
+                "content": hit["entity"].get("content", ""),
+                "doc_type": hit["entity"].get("doc_type", ""),
+                "section": hit["entity"].get("section", ""),
+                "source_path": hit["entity"].get("source_path", ""),
+                "parent_id": hit["entity"].get("parent_id", 0),
+                "chunk_index": hit["entity"].get("chunk_index", 0),
+                "timestamp": hit["entity"].get("timestamp", 0),
+                "similarity_score": hit["similarity_score"]
+            }
+            for hit in self._search_collection(self.docs_collection, query_embedding, limit, filter_expr)
+        ]
+    
+    def _search_collection(self, collection_name: str, query_embedding: List[float], limit: int,
+                           filter_expr: str = "") -> List[Dict[str, Any]]:
+        """
+        Run a vector search on one collection and normalize the hits.
+        
+        Returns:
+            List of {"entity": dict, "similarity_score": float}
+        """
+        output_fields = {
+            self.docs_collection: ["title", "content", "doc_type", "section", "source_path", "parent_id",
+                                   "chunk_index", "timestamp"],
+            self.history_collection: ["query", "sql_query", "result", "success", "timestamp"],
+            self.examples_collection: ["description", "sql_query", "tables", "source_path", "section"],
+            self.tables_collection: ["table_name"],
+            self.columns_collection: ["table_name", "column_name", "column_type", "schema_text"],
+        }[collection_name]
+        results = self.client.search(
+            collection_name=collection_name,
+            data=[query_embedding],
+            limit=limit,
+            filter=filter_expr,
+            output_fields=output_fields,
+            search_params=self._search_params(collection_name)
+        )
+        
+        hits = []
+        if not results or len(results) == 0:
+            return hits
+        
+        for result in results[0]:  # results is a list of lists
             try:
-                all_results = self.search_similar_queries(query, limit=limit * 2)
-                return [r for r in all_results if r.get("doc_type") != "query_history"][:limit]
-            except Exception:
-                return []
+                # Handle different Milvus result structures
+                # Score might be in result["distance"] or result["score"]
+                similarity_score = 0.0
+                if "distance" in result:
+                    similarity_score = result["distance"]
+                elif "score" in result:
+                    similarity_score = result["score"]
+                
+                # Handle entity data - might be nested or flat
+                entity_data = result.get("entity", result)
+                if not isinstance(entity_data, dict):
+                    entity_data = result
+                
+                hits.append({"entity": entity_data, "similarity_score": similarity_score})
+            except (KeyError, TypeError) as e:
+                # Skip malformed results
+                print(f"⚠️  Skipping malformed search result: {e}")
+                continue
+        
+        return hits
+    
+    def _format_history_hit(self, hit: Dict[str, Any]) -> Dict[str, Any]:
+        """Shape a query history search hit for callers."""
+        entity_data = hit["entity"]
+        return {
+            "query": entity_data.get("query", ""),
+            "sql_query": entity_data.get("sql_query", ""),
+            "result": entity_data.get("result", ""),
+            "success": entity_data.get("success", True),
+            "timestamp": entity_data.get("timestamp", 0),
+            "doc_type": QUERY_HISTORY,
+            "similarity_score": hit["similarity_score"]
+        }
     
     def get_query_suggestions(self, partial_query: str) -> List[str]:
         """
@@ -274,11 +1218,13 @@ class DocumentStore:
             List of suggested query completions
         """
         try:
-            similar_queries = self.search_similar_queries(partial_query, limit=10)
+            similar_queries = self.search_similar_queries(
+                partial_query, limit=10, filter_expr=self.build_filter(success=True)
+            )
             suggestions = []
             
             for result in similar_queries:
-                if result["success"] and result["doc_type"] == "query_history":
+                if result["success"]:
                     suggestions.append(result["query"])
             
             # Remove duplicates and return top suggestions
@@ -291,6 +1237,7 @@ class DocumentStore:
     def _get_embedding(self, text: str) -> List[float]:
         """
         Generate embedding for text using OpenAI.
+        Cached embeddings are returned without calling the API.
         
         Args:
             text: Text to embed
@@ -298,25 +1245,147 @@ class DocumentStore:
         Returns:
             List of floats representing the embedding
         """
+        cached = self.embedding_cache.get(self.embedding_model, text)
+        if cached is not None:
+            return cached
+        
         try:
-            from openai import OpenAI
-            
-            # Initialize OpenAI client
-            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+            client = self._get_openai_client()
             
             # Generate embedding
             response = client.embeddings.create(
-                model="text-embedding-ada-002",
+                model=self.embedding_model,
                 input=text
             )
             
-            return response.data[0].embedding
+            embedding = response.data[0].embedding
+            self.embedding_cache.put(self.embedding_model, text, embedding)
+            return embedding
             
         except Exception as e:
             print(f"❌ Error generating embedding: {e}")
             # Fallback to simple hash-based embedding
             return self._simple_text_embedding(text)
     
+    async def aget_embedding(self, text: str) -> List[float]:
+        """
+        Async variant of _get_embedding using the async OpenAI client.
+        
+        Args:
+            text: Text to embed
+            
+        Returns:
+            List of floats representing the embedding
+        """
+        cached = self.embedding_cache.get(self.embedding_model, text)
+        if cached is not None:
+            return cached
+        
+        try:
+            response = await self._get_async_openai_client().embeddings.create(
+                model=self.embedding_model,
+                input=text
+            )
+            
+            embedding = response.data[0].embedding
+            self.embedding_cache.put(self.embedding_model, text, embedding)
+            return embedding
+            
+        except Exception as e:
+            print(f"❌ Error generating embedding: {e}")
+            return self._simple_text_embedding(text)
+    
+    def embed_many(self, texts: List[str], strict: bool = False) -> List[List[float]]:
+        """
+        Generate embeddings for many texts using token-budgeted batch requests.
+        Cached texts are served locally; only misses are sent to the API.
+        
+        Args:
+            texts: Texts to embed
+            strict: Raise if a batch fails instead of substituting hash-based fallback vectors
+            
+        Returns:
+            Embeddings in the same order as the input texts
+            
+        Raises:
+            EmbeddingError: A batch request failed and strict is set
+        """
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        pending: Dict[str, List[int]] = {}
+        
+        for i, text in enumerate(texts):
+            cached = self.embedding_cache.get(self.embedding_model, text)
+            if cached is not None:
+                embeddings[i] = cached
+            else:
+                # Identical texts are only sent once
+                pending.setdefault(text, []).append(i)
+        
+        batches = self._make_embedding_batches(list(pending))
+        for batch_number, batch in enumerate(batches, 1):
+            if len(batches) > 1:
+                print(f"   🧠 Embedding batch {batch_number}/{len(batches)} ({len(batch)} texts)")
+            try:
+                response = self._get_openai_client().embeddings.create(
+                    model=self.embedding_model,
+                    input=batch
+                )
+                vectors = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+                self.embedding_cache.put_many(self.embedding_model, batch, vectors)
+                for text, embedding in zip(batch, vectors):
+                    for i in pending[text]:
+                        embeddings[i] = embedding
+            except Exception as e:
+                if strict:
+                    raise EmbeddingError(f"embedding batch {batch_number}/{len(batches)} failed: {e}") from e
+                print(f"❌ Error generating batch embeddings: {e}")
+                for text in batch:
+                    fallback = self._simple_text_embedding(text)
+                    for i in pending[text]:
+                        embeddings[i] = fallback
+        
+        return embeddings
+    
+    def _make_embedding_batches(self, texts: List[str]) -> List[List[str]]:
+        """Pack texts into batches bounded by the token budget and input count."""
+        batches = []
+        current: List[str] = []
+        current_tokens = 0
+        
+        for text in texts:
+            tokens = self._count_tokens(text)
+            if current and (current_tokens + tokens > self.embedding_batch_tokens
+                            or len(current) >= self.embedding_batch_size):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += tokens
+        
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _count_tokens(self, text: str) -> int:
+        """Count tokens with tiktoken when available, otherwise estimate conservatively."""
+        return self.token_counter.count(text)
+    
+    def _get_openai_client(self):
+        """Get the shared OpenAI client, creating it on first use so its connection pool is reused."""
+        if self._openai_client is None:
+            from openai import OpenAI
+            self._openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return self._openai_client
+    
+    def _get_async_openai_client(self):
+        """Get the async OpenAI client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        # The client's connection pool is bound to the loop it was created on
+        if self._async_openai_client is None or self._async_openai_loop is not loop:
+            from openai import AsyncOpenAI
+            self._async_openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+            self._async_openai_loop = loop
+        return self._async_openai_client
+    
     def _simple_text_embedding(self, text: str) -> List[float]:
         """
         Fallback simple text embedding (hash-based).
@@ -367,60 +1436,130 @@ class DocumentStore:
         # Convert to integer (using first 8 characters)
         return int(doc_hash[:8], 16)
     
-    def get_stats(self) -> Dict[str, int]:
-        """Get statistics about stored documents."""
-        try:
-            # Query all documents to get stats
-            # Milvus requires a filter with limit, so we'll use a filter that matches everything
-            # Try to get all documents by using a filter that's always true
-            try:
-                results = self.client.query(
-                    collection_name=self.collection_name,
-                    filter='doc_type in ["query_history", "document", "table_documentation", "database_documentation"]',
-                    output_fields=["doc_type", "success"],
-                    limit=10000
-                )
-            except Exception:
-                # If filter doesn't work, try without filter but with limit
-                try:
-                    results = self.client.query(
-                        collection_name=self.collection_name,
-                        output_fields=["doc_type", "success"],
-                        limit=10000
-                    )
-                except Exception:
-                    # If that fails, return empty stats
-                    return {"total_documents": 0, "query_history": 0, "documents": 0, "successful_queries": 0, "failed_queries": 0}
-            
-            stats = {
-                "total_documents": len(results),
-                "query_history": 0,
-                "documents": 0,
-                "successful_queries": 0,
-                "failed_queries": 0
-            }
+    @staticmethod
+    def history_id(query: str, sql_query: str) -> int:
+        """
+        Generate the ID of a query history record from its question and SQL.
+        60 bits, like source_doc_id, so distinct records practically never collide.
+        
+        Args:
+            query: Natural language question
+            sql_query: SQL that answered it
             
-            for result in results:
-                if result["doc_type"] == "query_history":
-                    stats["query_history"] += 1
-                    if result["success"]:
-                        stats["successful_queries"] += 1
-                    else:
-                        stats["failed_queries"] += 1
-                elif result["doc_type"] == "document":
-                    stats["documents"] += 1
+        Returns:
+            Integer ID that fits in INT64
+        """
+        import hashlib
+        
+        doc_hash = hashlib.sha256(f"{query}\x00{sql_query}".encode()).hexdigest()
+        return int(doc_hash[:15], 16)
+    
+    @staticmethod
+    def source_doc_id(source_path: str, chunk_index: int = 0) -> int:
+        """
+        Generate a stable integer ID for a document loaded from a file.
+        The ID depends only on the path (and chunk), so re-loading an edited file replaces it.
+        
+        Args:
+            source_path: Path of the source file, relative to the documentation directory
+            chunk_index: Position of the record within the file
             
-            return stats
+        Returns:
+            Integer ID that fits in INT64
+        """
+        import hashlib
+        
+        doc_hash = hashlib.sha256(f"{source_path}#{chunk_index}".encode()).hexdigest()
+        return int(doc_hash[:15], 16)
+    
+    @staticmethod
+    def parent_doc_id(source_path: str) -> int:
+        """
+        Generate the parent ID shared by all chunks of a file.
+        
+        Args:
+            source_path: Path of the source file, relative to the documentation directory
             
+        Returns:
+            Integer ID that fits in INT64
+        """
+        import hashlib
+        
+        doc_hash = hashlib.sha256(source_path.encode()).hexdigest()
+        return int(doc_hash[:15], 16)
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get statistics about stored documents."""
+        stats = {
+            "total_documents": 0,
+            "query_history": 0,
+            "documents": 0,
+            "successful_queries": 0,
+            "failed_queries": 0,
+            "sql_examples": 0,
+            **self._embedding_cache_stats()
+        }
+        
+        try:
+            # Milvus requires a limit on queries without a primary-key filter
+            documents = self.client.query(
+                collection_name=self.docs_collection,
+                filter="",
+                output_fields=["doc_type"],
+                limit=10000
+            )
+            history = self.client.query(
+                collection_name=self.history_collection,
+                filter="",
+                output_fields=["success"],
+                limit=10000
+            )
+            examples = self.client.query(
+                collection_name=self.examples_collection,
+                filter="",
+                output_fields=["id"],
+                limit=10000
+            )
         except Exception as e:
             print(f"❌ Error getting stats: {e}")
-            return {"total_documents": 0}
+            return stats
+        
+        stats["documents"] = len(documents)
+        stats["query_history"] = len(history)
+        stats["sql_examples"] = len(examples)
+        stats["total_documents"] = len(documents) + len(history)
+        for result in history:
+            if result["success"]:
+                stats["successful_queries"] += 1
+            else:
+                stats["failed_queries"] += 1
+        
+        return stats
+    
+    def _embedding_cache_stats(self) -> Dict[str, int]:
+        """Get embedding cache counters prefixed for inclusion in get_stats."""
+        try:
+            return {f"embedding_cache_{key}": value for key, value in self.embedding_cache.get_stats().items()}
+        except Exception:
+            return {}
 
 
 if __name__ == "__main__":
-    # Test the document store
+    import sys
+    
     store = DocumentStore()
     
+    if sys.argv[1:2] == ["migrate"]:
+        # python document_store.py migrate [--drop]
+        store.migrate_legacy_collection(drop_legacy="--drop" in sys.argv)
+        sys.exit(0)
+    if sys.argv[1:2] == ["reembed-history"]:
+        # python document_store.py reembed-history
+        store.reembed_query_history()
+        sys.exit(0)
+    
+    # Test the document store
+    
     # Test storing a query history
     test_query = "Show me recent orders"
     test_sql = "SELECT * FROM ordhdr ORDER BY order_date DESC LIMIT 10"
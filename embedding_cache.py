@@ -0,0 +1,204 @@
+"""
+Persistent, content-addressed cache for text embeddings.
+An in-memory LRU sits in front of a SQLite file so text we have already
+embedded never goes back to the embeddings endpoint.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+# last_used only orders evictions, so a disk hit refreshes it at most this often (seconds)
+TOUCH_INTERVAL = 3600.0
+# Refreshed last_used values are written together once this many are pending
+TOUCH_BATCH_SIZE = 64
+
+
+class EmbeddingCache:
+    """Two-level (memory LRU + SQLite) embedding cache keyed by model and text hash."""
+
+    def __init__(self, cache_path: str = "embedding_cache.db",
+                 max_memory_entries: int = 1024, max_disk_entries: int = 50000):
+        """
+        Initialize the embedding cache.
+
+        Args:
+            cache_path: Path to the SQLite file holding cached vectors
+            max_memory_entries: Number of vectors kept in the in-memory LRU
+            max_disk_entries: Number of vectors kept on disk before the least
+                recently used ones are evicted
+        """
+        self.cache_path = cache_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._pending_touches: Dict[str, float] = {}
+
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        # Upper bound on the rows on disk (replacing a row counts as adding one), so
+        # puts only run COUNT(*) once the bound passes max_disk_entries
+        self._disk_entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Collapse whitespace so trivially different copies of a text share a key."""
+        return " ".join(text.split())
+
+    def make_key(self, model: str, text: str) -> str:
+        """Build the content-addressed key for a (model, text) pair."""
+        normalized = self.normalize(text)
+        return hashlib.sha256(f"{model}\x00{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """
+        Look up a cached embedding.
+
+        Args:
+            model: Embedding model name
+            text: Text that was embedded
+
+        Returns:
+            The cached embedding, or None on a miss
+        """
+        key = self.make_key(model, text)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+            row = self._conn.execute("SELECT vector, last_used FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            now = time.time()
+            if now - row[1] > TOUCH_INTERVAL:
+                self._pending_touches[key] = now
+                if len(self._pending_touches) >= TOUCH_BATCH_SIZE:
+                    self._write_touches()
+                    self._conn.commit()
+            embedding = array("f", row[0]).tolist()
+            self._remember(key, embedding)
+            self.hits += 1
+            return embedding
+
+    def put(self, model: str, text: str, embedding: List[float]):
+        """
+        Store an embedding in both cache levels.
+
+        Args:
+            model: Embedding model name
+            text: Text that was embedded
+            embedding: The embedding vector
+        """
+        key = self.make_key(model, text)
+        with self._lock:
+            self._remember(key, embedding)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)",
+                (key, model, array("f", embedding).tobytes(), time.time())
+            )
+            self._pending_touches.pop(key, None)
+            self._disk_entries += 1
+            self._write_touches()
+            self._conn.commit()
+            self._evict_disk()
+
+    def put_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        """
+        Store many embeddings with one write and one commit, e.g. a whole API batch.
+
+        Args:
+            model: Embedding model name
+            texts: Texts that were embedded
+            embeddings: Their embedding vectors, in the same order
+        """
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                key = self.make_key(model, text)
+                self._remember(key, embedding)
+                self._pending_touches.pop(key, None)
+                rows.append((key, model, array("f", embedding).tobytes(), now))
+            if not rows:
+                return
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            self._disk_entries += len(rows)
+            self._write_touches()
+            self._conn.commit()
+            self._evict_disk()
+
+    def _remember(self, key: str, embedding: List[float]):
+        """Insert into the memory LRU, dropping the oldest entry when full."""
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _write_touches(self):
+        """Write pending last_used refreshes (committed by the caller)."""
+        if self._pending_touches:
+            self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                   [(used, key) for key, used in self._pending_touches.items()])
+            self._pending_touches.clear()
+
+    def _evict_disk(self):
+        """Trim the on-disk cache to 90% of its bound once it overflows."""
+        if self._disk_entries <= self.max_disk_entries:
+            return
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self._disk_entries = count
+        if count <= self.max_disk_entries:
+            return
+
+        to_remove = count - int(self.max_disk_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (to_remove,)
+        )
+        self._conn.commit()
+        self._disk_entries -= to_remove
+        self.evictions += to_remove
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get hit/miss counters and cache sizes."""
+        with self._lock:
+            disk_entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+            }
+
+    def close(self):
+        """Write pending last_used refreshes and close the underlying SQLite connection."""
+        with self._lock:
+            self._write_touches()
+            self._conn.commit()
+            self._conn.close()
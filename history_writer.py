@@ -0,0 +1,140 @@
+"""
+Background writer that persists query history off the request path.
+Records are queued, embedded in batches and upserted with one Milvus call.
+"""
+
+import queue
+import threading
+import time
+from typing import Any, Dict, List
+
+
+class HistoryWriter:
+    """Bounded queue plus worker thread that batches query-history writes."""
+
+    _STOP = object()
+
+    def __init__(self, document_store, max_queue_size: int = 1000,
+                 batch_size: int = 32, flush_interval: float = 2.0):
+        """
+        Initialize the writer and start its worker thread.
+
+        Args:
+            document_store: DocumentStore that receives the batched records
+            max_queue_size: Records held before new submissions are dropped
+            batch_size: Records written per batch once this many are pending
+            flush_interval: Seconds a partial batch may wait before it is written
+        """
+        self.document_store = document_store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.submitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, query: str, sql_query: str, result: str, success: bool = True) -> bool:
+        """
+        Queue a query-history record without blocking.
+
+        Args:
+            query: Natural language query from user
+            sql_query: Generated SQL query
+            result: Query result or error message
+            success: Whether the query was successful
+
+        Returns:
+            True if queued, False if the writer is closed or the queue is full
+        """
+        record = {"query": query, "sql_query": sql_query, "result": result, "success": success}
+        with self._lock:
+            if self._closed:
+                self.dropped += 1
+                return False
+            try:
+                self._queue.put_nowait(record)
+                self.submitted += 1
+                return True
+            except queue.Full:
+                self.dropped += 1
+                return False
+
+    def flush(self):
+        """Block until every queued record has been written."""
+        self._queue.join()
+
+    def close(self, timeout: float = 10.0):
+        """
+        Write any pending records and stop the worker thread.
+
+        Args:
+            timeout: Seconds to wait for the final flush
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(self._STOP)
+        self._thread.join(timeout)
+
+    def _run(self):
+        """Worker loop: collect records and write them on size/time thresholds."""
+        pending: List[Dict[str, Any]] = []
+        deadline = None
+
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is self._STOP:
+                self._write(pending)
+                self._queue.task_done()
+                return
+
+            if item is not None:
+                pending.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if pending and (len(pending) >= self.batch_size or time.monotonic() >= deadline):
+                self._write(pending)
+                pending = []
+                deadline = None
+
+    def _write(self, records: List[Dict[str, Any]]):
+        """Write one batch and mark its queue items done."""
+        if not records:
+            return
+        try:
+            stored = self.document_store.store_query_history_many(records)
+            self.written += stored
+            self.failed += len(records) - stored
+            self.batches += 1
+        except Exception as e:
+            print(f"❌ Error writing query history batch: {e}")
+            self.failed += len(records)
+        finally:
+            for _ in records:
+                self._queue.task_done()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get queue depth and write/drop counters."""
+        return {
+            "queue_depth": self._queue.qsize(),
+            "submitted": self.submitted,
+            "written": self.written,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "batches": self.batches,
+        }
@@ -0,0 +1,193 @@
+"""
+Join graph over the database tables for join planning.
+Edges come from foreign keys in the schema snapshot and from the join
+conditions used in the documentation's SQL examples; a question's tables are
+connected with the fewest joins so the agent doesn't have to discover them.
+"""
+
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+
+_TABLE_ALIAS_RE = re.compile(r"\b(?:FROM|JOIN)\s+`?(\w+)`?(?:\s+(?:AS\s+)?`?(\w+)`?)?", re.IGNORECASE)
+_EQUALITY_RE = re.compile(r"`?(\w+)`?\.`?(\w+)`?\s*=\s*`?(\w+)`?\.`?(\w+)`?")
+_NOT_ALIASES = {
+    "where", "left", "right", "inner", "outer", "cross", "full", "join", "on", "using", "group",
+    "order", "limit", "having", "union", "natural", "straight_join", "set", "window",
+}
+
+
+class JoinGraph:
+    """Undirected graph of tables connected by foreign keys and documented join conditions."""
+
+    def __init__(self, tables: Optional[Iterable[str]] = None):
+        """
+        Initialize an empty graph.
+
+        Args:
+            tables: Known table names; joins on other names are ignored
+        """
+        self.tables = set(tables or [])
+        self._edges: Dict[str, Dict[str, Dict[str, str]]] = {}
+        # How often each documented join condition was seen, to keep the most common one
+        self._seen: Dict[str, int] = {}
+
+    @classmethod
+    def from_snapshot(cls, snapshot) -> "JoinGraph":
+        """Build a graph from the foreign keys in a SchemaSnapshot."""
+        graph = cls(snapshot.table_names())
+        for table_name, table in snapshot.tables.items():
+            for fk in table["foreign_keys"]:
+                graph.add_edge(table_name, fk["column"], fk["ref_table"], fk["ref_column"], source="foreign_key")
+        return graph
+
+    def add_edge(self, left_table: str, left_column: str, right_table: str, right_column: str,
+                 source: str = "foreign_key"):
+        """
+        Record that two tables join on a pair of columns.
+        A declared foreign key wins over joins seen in the documentation, and among
+        documented joins of the same two tables the most frequent one is kept.
+        """
+        if left_table == right_table:
+            return
+        if self.tables and (left_table not in self.tables or right_table not in self.tables):
+            return
+
+        condition = f"{left_table}.{left_column} = {right_table}.{right_column}"
+        existing = self._edges.get(left_table, {}).get(right_table)
+        if source != "foreign_key":
+            pair = "|".join(sorted([f"{left_table}.{left_column}", f"{right_table}.{right_column}"]))
+            self._seen[pair] = self._seen.get(pair, 0) + 1
+            if existing and (existing["source"] == "foreign_key"
+                             or self._seen.get(existing["pair"], 0) >= self._seen[pair]):
+                return
+        else:
+            pair = ""
+
+        edge = {"condition": condition, "source": source, "pair": pair}
+        self._edges.setdefault(left_table, {})[right_table] = edge
+        self._edges.setdefault(right_table, {})[left_table] = edge
+
+    def add_sql_joins(self, sql_query: str) -> int:
+        """
+        Add the equality join conditions of a SQL statement, resolving table aliases.
+
+        Args:
+            sql_query: Example query, e.g. from the documentation
+
+        Returns:
+            Number of join conditions found between two different known tables
+        """
+        aliases = {}
+        for table_name, alias in _TABLE_ALIAS_RE.findall(sql_query):
+            aliases[table_name.lower()] = table_name
+            if alias and alias.lower() not in _NOT_ALIASES:
+                aliases[alias.lower()] = table_name
+
+        added = 0
+        for left_alias, left_column, right_alias, right_column in _EQUALITY_RE.findall(sql_query):
+            left_table = aliases.get(left_alias.lower())
+            right_table = aliases.get(right_alias.lower())
+            if left_table and right_table and left_table != right_table:
+                self.add_edge(left_table, left_column, right_table, right_column, source="documentation")
+                added += 1
+        return added
+
+    def neighbours(self, table_name: str) -> List[str]:
+        """Get the tables directly joined to a table."""
+        return sorted(self._edges.get(table_name, {}))
+
+    def shortest_path(self, start: str, goal: str, max_hops: int = 4) -> Optional[List[str]]:
+        """
+        Find the shortest chain of tables joining two tables.
+
+        Returns:
+            Tables from start to goal, or None if they aren't connected within max_hops
+        """
+        if start == goal:
+            return [start]
+        previous = {start: None}
+        queue = deque([(start, 0)])
+        while queue:
+            table_name, hops = queue.popleft()
+            if hops >= max_hops:
+                continue
+            for neighbour in sorted(self._edges.get(table_name, {})):
+                if neighbour in previous:
+                    continue
+                previous[neighbour] = table_name
+                if neighbour == goal:
+                    path = [goal]
+                    while previous[path[-1]] is not None:
+                        path.append(previous[path[-1]])
+                    return list(reversed(path))
+                queue.append((neighbour, hops + 1))
+        return None
+
+    def join_path(self, tables: List[str], max_hops: int = 4) -> List[Dict[str, str]]:
+        """
+        Connect tables with as few joins as possible.
+
+        Tables are added in order (most relevant first); each is connected to the
+        nearest table already joined, which may bring in intermediate tables.
+
+        Args:
+            tables: Tables the question needs, most relevant first
+            max_hops: Longest chain allowed to reach one table
+
+        Returns:
+            Join edges ({"left", "right", "condition", "source"}); tables that can't
+            be connected are left out
+        """
+        joined: List[str] = []
+        edges: List[Dict[str, str]] = []
+        for table_name in tables:
+            if table_name not in self._edges and table_name not in self.tables:
+                continue
+            if not joined:
+                joined.append(table_name)
+                continue
+            if table_name in joined:
+                continue
+
+            best = None
+            for start in joined:
+                path = self.shortest_path(start, table_name, max_hops)
+                if path and (best is None or len(path) < len(best)):
+                    best = path
+            if best is None:
+                continue
+
+            for left, right in zip(best, best[1:]):
+                if right in joined:
+                    continue
+                edge = self._edges[left][right]
+                edges.append({"left": left, "right": right, "condition": edge["condition"], "source": edge["source"]})
+                joined.append(right)
+        return edges
+
+    @staticmethod
+    def tables_in(edges: List[Dict[str, str]]) -> List[str]:
+        """Get the tables a join path touches, in order."""
+        tables: List[str] = []
+        for edge in edges:
+            for table_name in (edge["left"], edge["right"]):
+                if table_name not in tables:
+                    tables.append(table_name)
+        return tables
+
+    @staticmethod
+    def render(edges: List[Dict[str, str]]) -> str:
+        """Render a join path as a FROM line followed by one JOIN per edge."""
+        if not edges:
+            return ""
+        lines = [f"FROM {edges[0]['left']}"]
+        for edge in edges:
+            note = "  -- as in documented queries" if edge["source"] == "documentation" else ""
+            lines.append(f"JOIN {edge['right']} ON {edge['condition']}{note}")
+        return "\n".join(lines)
+
+    def edge_count(self) -> int:
+        """Number of distinct table pairs in the graph."""
+        return sum(len(neighbours) for neighbours in self._edges.values()) // 2
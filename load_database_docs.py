@@ -1,127 +1,258 @@
 """
 Script to load database documentation into the document store for semantic search.
+
+Works directly on DocumentStore, so it needs an OpenAI key for embeddings but
+no database credentials; safe to run in CI or on every deploy. Each file is
+split into section chunks (markdown headers, "-- PATTERN n" SQL banners) that
+are embedded separately, and SQL examples are extracted into their own
+index for direct retrieval. A manifest of file hashes makes reruns incremental:
+only new or edited files are embedded and upserted, and records of deleted
+files are removed.
 """
 
 import os
-import glob
+import sys
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Dict, Optional
 from dotenv import load_dotenv
-from sql_agent import SQLAgent
+from doc_manifest import DocManifest
+from document_store import DocumentStore
 
 # Load environment variables
 load_dotenv()
 
 
-def load_database_docs():
-    """Load all database documentation files into the document store."""
+# Every record this loader writes; cleared when there is no manifest to match them to files
+_LOADER_DOCS_FILTER = 'doc_type in ["table_documentation", "database_documentation"]'
+_LOADER_EXAMPLES_FILTER = 'source_path != ""'
+
+
+def read_doc_file(file_path: Path, docs_path: Path) -> Dict[str, str]:
+    """
+    Read one documentation file into a document record.
+
+    Args:
+        file_path: Path to a markdown file
+        docs_path: Documentation directory the file belongs to
+
+    Returns:
+        Dict with "title", "content", "doc_type" and "source_path"
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    # Extract title from filename
+    title = file_path.stem.replace('_', ' ').title()
+
+    # Determine document type
+    doc_type = "table_documentation" if "table" in file_path.name else "database_documentation"
+
+    source_path = file_path.relative_to(docs_path).as_posix()
+
+    return {"title": title, "content": content, "doc_type": doc_type, "source_path": source_path}
+
+
+def default_manifest_path(milvus_db_path: str) -> str:
+    """Keep the manifest next to the Milvus database it describes."""
+    return os.path.join(os.path.dirname(os.path.abspath(milvus_db_path)), "doc_manifest.json")
+
+
+def load_database_docs(docs_dir: str = "database_docs", milvus_db_path: str = "milvus_demo.db",
+                       workers: int = 8, store: Optional[DocumentStore] = None,
+                       manifest_path: Optional[str] = None, full: bool = False) -> bool:
+    """
+    Sync the database documentation files into the document store.
+
+    Args:
+        docs_dir: Directory containing the markdown documentation
+        milvus_db_path: Path to the Milvus Lite database file
+        workers: Number of threads used to read files
+        store: Existing document store to load into (created if not given)
+        manifest_path: Manifest file (defaults to doc_manifest.json next to the database)
+        full: Re-embed every file even if the manifest says it is unchanged
+
+    Returns:
+        True if the store is in sync with the documentation directory
+    """
     try:
         print("🚀 Loading Database Documentation into Document Store")
         print("=" * 60)
-        
-        # Initialize the agent
-        agent = SQLAgent()
-        
-        # Find all markdown files in the database_docs directory
-        docs_dir = Path("database_docs")
-        if not docs_dir.exists():
-            print(f"❌ Documentation directory {docs_dir} not found!")
+
+        # Find all markdown files in the documentation directory
+        docs_path = Path(docs_dir)
+        if not docs_path.exists():
+            print(f"❌ Documentation directory {docs_path} not found!")
             return False
-        
-        markdown_files = list(docs_dir.glob("*.md"))
-        
+
+        markdown_files = sorted(docs_path.glob("*.md"))
+
         if not markdown_files:
-            print(f"❌ No markdown files found in {docs_dir}")
+            print(f"❌ No markdown files found in {docs_path}")
             return False
-        
-        print(f"📁 Found {len(markdown_files)} documentation files:")
-        
-        success_count = 0
-        for file_path in markdown_files:
-            print(f"\n📄 Loading: {file_path.name}")
-            
-            try:
-                # Read the file content
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # Extract title from filename or first line
-                title = file_path.stem.replace('_', ' ').title()
-                
-                # Determine document type
-                doc_type = "table_documentation" if "table" in file_path.name else "database_documentation"
-                
-                # Store in document store
-                success = agent.add_document(title, content, doc_type)
-                
-                if success:
-                    print(f"   ✅ Successfully loaded: {title}")
-                    success_count += 1
-                else:
-                    print(f"   ❌ Failed to load: {title}")
-                    
-            except Exception as e:
-                print(f"   ❌ Error loading {file_path.name}: {e}")
-        
-        print(f"\n📊 Loading Summary:")
+
+        print(f"📁 Found {len(markdown_files)} documentation files")
+
+        # Read files in parallel
+        documents = []
+        read_errors = 0
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {executor.submit(read_doc_file, file_path, docs_path): file_path
+                       for file_path in markdown_files}
+            for done, future in enumerate(as_completed(futures), 1):
+                file_path = futures[future]
+                try:
+                    documents.append(future.result())
+                    print(f"   📄 [{done}/{len(markdown_files)}] Read {file_path.name}")
+                except Exception as e:
+                    read_errors += 1
+                    print(f"   ❌ [{done}/{len(markdown_files)}] Error reading {file_path.name}: {e}")
+
+        store = store or DocumentStore(milvus_db_path)
+        manifest = DocManifest.load(manifest_path or default_manifest_path(milvus_db_path))
+
+        if not manifest.entries:
+            # No manifest (or an outdated one): existing records can't be matched to files
+            store.delete_documents(filter_expr=_LOADER_DOCS_FILTER)
+            store.delete_sql_examples(filter_expr=_LOADER_EXAMPLES_FILTER)
+        elif not full:
+            # The store may have been rebuilt or deleted since the manifest was written
+            known_ids = manifest.all_ids()
+            known_example_ids = manifest.all_ids("example_ids")
+            if len(store.existing_document_ids(known_ids)) < len(set(known_ids)) or \
+                    len(store.existing_sql_example_ids(known_example_ids)) < len(set(known_example_ids)):
+                print("⚠️  Document store is missing records listed in the manifest; doing a full sync")
+                full = True
+
+        # Decide what to re-embed; unreadable files keep their existing records
+        changed = []
+        unchanged = 0
+        for doc in documents:
+            if not full and manifest.is_unchanged(doc["source_path"], doc["content"]):
+                unchanged += 1
+            else:
+                changed.append(doc)
+
+        read_paths = [doc["source_path"] for doc in documents]
+        present_paths = [file_path.relative_to(docs_path).as_posix() for file_path in markdown_files]
+        removed = manifest.removed_paths(present_paths)
+        added = sum(1 for doc in changed if doc["source_path"] not in manifest.entries)
+
+        # Chunk, embed in token-budgeted batches and upsert so edited files replace their old chunks
+        chunks = store.chunk_documents(changed)
+        examples = store.extract_sql_examples(changed)
+        written = examples_written = 0
+        if chunks:
+            print(f"\n🧠 Embedding and upserting {len(chunks)} chunks and {len(examples)} SQL examples "
+                  f"from {len(changed)} changed documents...")
+            # Strict: a file embedded with fallback vectors must not be recorded as synced
+            written = store.upsert_documents(chunks, strict=True)
+            examples_written = store.upsert_sql_examples(examples, strict=True)
+            if written == len(chunks) and examples_written == len(examples):
+                for doc in changed:
+                    path = doc["source_path"]
+                    chunk_ids = [chunk["id"] for chunk in chunks if chunk["source_path"] == path]
+                    example_ids = [example["id"] for example in examples if example["source_path"] == path]
+                    # A file that shrank leaves chunks and examples past its new end
+                    stale_ids = set(manifest.ids_for(path)) - set(chunk_ids)
+                    if stale_ids:
+                        store.delete_documents(ids=list(stale_ids))
+                    stale_example_ids = set(manifest.ids_for(path, "example_ids")) - set(example_ids)
+                    if stale_example_ids:
+                        store.delete_sql_examples(ids=list(stale_example_ids))
+                    manifest.record(path, doc["content"], chunk_ids, example_ids)
+
+        if removed:
+            print(f"\n🗑️  Removing {len(removed)} deleted documents...")
+            removed_ids = [doc_id for path in removed for doc_id in manifest.ids_for(path)]
+            removed_example_ids = [doc_id for path in removed for doc_id in manifest.ids_for(path, "example_ids")]
+            if store.delete_documents(ids=removed_ids) and store.delete_sql_examples(ids=removed_example_ids):
+                for path in removed:
+                    manifest.forget(path)
+
+        synced = written == len(chunks) and examples_written == len(examples)
+        if synced:
+            manifest.save()
+
+        print(f"\n📊 Sync Summary:")
         print(f"   Total files: {len(markdown_files)}")
-        print(f"   Successfully loaded: {success_count}")
-        print(f"   Failed: {len(markdown_files) - success_count}")
-        
-        if success_count > 0:
-            print(f"\n🎉 Database documentation loaded successfully!")
+        print(f"   Added: {added}")
+        print(f"   Changed: {len(changed) - added}")
+        print(f"   Removed: {len(removed)}")
+        print(f"   Unchanged: {unchanged}")
+        print(f"   Chunks written: {written}")
+        print(f"   SQL examples written: {examples_written}")
+        if not synced:
+            print(f"   Failed to store: {len(chunks) - written} chunks, {len(examples) - examples_written} SQL examples")
+        if read_errors:
+            print(f"   Unreadable files: {read_errors}")
+
+        if synced and read_paths:
+            print(f"\n🎉 Database documentation is up to date!")
             print(f"   The agent can now use this information to better understand your database.")
-            
+
             # Show stats
-            stats = agent.get_document_stats()
+            stats = store.get_stats()
             if stats:
                 print(f"\n📈 Document Store Statistics:")
                 print(f"   Total documents: {stats.get('total_documents', 0)}")
-                print(f"   Documentation files: {stats.get('documents', 0)}")
-        
-        return success_count > 0
-        
+                print(f"   Documentation chunks: {stats.get('documents', 0)}")
+                print(f"   SQL examples: {stats.get('sql_examples', 0)}")
+
+        return synced and bool(read_paths)
+
     except Exception as e:
         print(f"❌ Error loading database documentation: {e}")
         return False
 
 
-def create_sample_docs():
+def create_sample_docs(docs_dir: str = "database_docs"):
     """Create sample documentation files if they don't exist."""
-    docs_dir = Path("database_docs")
-    docs_dir.mkdir(exist_ok=True)
-    
-    print("📁 Creating database_docs directory...")
-    print("   Please add your database documentation files to the 'database_docs' directory.")
+    docs_path = Path(docs_dir)
+    docs_path.mkdir(exist_ok=True)
+
+    print(f"📁 Creating {docs_path} directory...")
+    print(f"   Please add your database documentation files to the '{docs_path}' directory.")
     print("   Supported formats: .md (Markdown)")
     print("   The script will automatically load all .md files from this directory.")
 
 
 def main():
     """Main function to load database documentation."""
+    parser = argparse.ArgumentParser(description="Load database documentation into the document store.")
+    parser.add_argument("--docs-dir", default="database_docs", help="Directory containing .md documentation")
+    parser.add_argument("--db-path", default="milvus_demo.db", help="Milvus Lite database file")
+    parser.add_argument("--workers", type=int, default=8, help="Threads used to read documentation files")
+    parser.add_argument("--manifest", default=None, help="Manifest file (default: doc_manifest.json next to the database)")
+    parser.add_argument("--full", action="store_true", help="Re-embed every file, ignoring the manifest")
+    args = parser.parse_args()
+
     print("🤖 Reports Extension Agent - Database Documentation Loader")
     print("=" * 60)
-    
+
     # Check if OpenAI API key is set
     if not os.getenv("OPENAI_API_KEY"):
         print("❌ Error: OPENAI_API_KEY not found in environment variables.")
         print("Please set your OpenAI API key in the .env file or environment.")
+        sys.exit(1)
+
+    # Check if the documentation directory exists
+    if not Path(args.docs_dir).exists():
+        create_sample_docs(args.docs_dir)
         return
-    
-    # Check if database_docs directory exists
-    docs_dir = Path("database_docs")
-    if not docs_dir.exists():
-        create_sample_docs()
-        return
-    
+
     # Load documentation
-    success = load_database_docs()
-    
+    success = load_database_docs(args.docs_dir, args.db_path, workers=args.workers,
+                                 manifest_path=args.manifest, full=args.full)
+
     if success:
         print(f"\n✅ Setup complete!")
         print(f"   You can now run 'python main.py' to start using the agent.")
         print(f"   The agent will have access to your database documentation for better query generation.")
     else:
         print(f"\n⚠️  Setup incomplete. Please check the errors above.")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -14,6 +14,31 @@ load_dotenv()
 from sql_agent import SQLAgent
 
 
+def render_stream(events):
+    """Print agent events as they arrive: tool activity, then the answer token by token."""
+    answer_started = False
+    for event in events:
+        if event["type"] == "tool_call":
+            if answer_started:
+                # Text the model wrote before deciding to call a tool
+                print()
+                answer_started = False
+            args = ", ".join(str(value) for value in event["args"].values())
+            print(f"   🛠️  {event['name']}({args[:80]}{'...' if len(args) > 80 else ''})")
+        elif event["type"] == "token":
+            if not answer_started:
+                print("\n📊 Answer: ", end="", flush=True)
+                answer_started = True
+            print(event["content"], end="", flush=True)
+        elif event["type"] == "final":
+            if answer_started:
+                print("\n")
+            else:
+                print(f"\n📊 Answer: {event['content']}\n")
+        elif event["type"] == "error":
+            print(f"\n❌ {event['content']}\n")
+
+
 def main():
     """Main entry point for the Reports Extension Agent."""
     print("🤖 Reports Extension Agent")
@@ -46,6 +71,7 @@ def main():
                 
                 if question.lower() in ['quit', 'exit', 'q']:
                     print("👋 Goodbye!")
+                    agent.close()
                     break
                 
                 if question.lower() == 'help':
@@ -54,6 +80,9 @@ def main():
                     print("   - 'tables' - List available tables")
                     print("   - 'stats' - Show document store statistics")
                     print("   - 'suggestions <partial_query>' - Get query suggestions")
+                    print("   - 'invalidate <table>' - Stop reusing cached answers that read a table")
+                    print("   - 'refresh-schema' - Rebuild the cached schema snapshot from the database")
+                    print("   - 'mode <standard|fast>' - Let the agent explore schemas, or answer from the given schemas")
                     print("   - 'quit' or 'exit' - Stop the agent")
                     print()
                     continue
@@ -71,13 +100,76 @@ def main():
                         print(f"   Total documents: {stats.get('total_documents', 0)}")
                         print(f"   Query history: {stats.get('query_history', 0)}")
                         print(f"   Documents: {stats.get('documents', 0)}")
+                        print(f"   SQL examples: {stats.get('sql_examples', 0)}")
                         print(f"   Successful queries: {stats.get('successful_queries', 0)}")
                         print(f"   Failed queries: {stats.get('failed_queries', 0)}")
+                        print(f"   Embedding cache: {stats.get('embedding_cache_hits', 0)} hits, "
+                              f"{stats.get('embedding_cache_misses', 0)} misses, "
+                              f"{stats.get('embedding_cache_disk_entries', 0)} cached")
+                        print(f"   History writer: {stats.get('history_queue_depth', 0)} queued, "
+                              f"{stats.get('history_written', 0)} written, "
+                              f"{stats.get('history_dropped', 0)} dropped")
+                        print(f"   Answer cache: {stats.get('answer_cache_hits', 0)} hits, "
+                              f"{stats.get('answer_cache_misses', 0)} misses "
+                              f"({stats.get('answer_cache_hit_rate', 0.0):.0%} hit rate)")
+                        if "pool_checkouts" in stats:
+                            print(f"   Connection pool: {stats['pool_checked_out']}/{stats['pool_size']} in use "
+                                  f"(+{stats['pool_overflow']} overflow), {stats['pool_checkouts']} checkouts, "
+                                  f"{stats['pool_avg_wait_ms']:.1f} ms avg / {stats['pool_max_wait_ms']:.1f} ms max wait, "
+                                  f"{stats['pool_timeouts']} timeouts")
+                        if "replicas_total" in stats:
+                            print(f"   Read replicas: {stats['replicas_healthy']}/{stats['replicas_total']} healthy, "
+                                  f"{stats['replicas_replica_reads']} reads on replicas, "
+                                  f"{stats['replicas_primary_reads']} on the primary")
+                        if "query_guarded" in stats:
+                            print(f"   Query time limit ({stats['query_limit_seconds']:g}s): "
+                                  f"{stats['query_guarded']} statements, {stats['query_timeouts']} timed out, "
+                                  f"{stats['query_kills']} killed")
+                        if "cost_gate_checked" in stats:
+                            print(f"   Cost check ({stats['cost_gate_mode']}): {stats['cost_gate_checked']} checked, "
+                                  f"{stats['cost_gate_rejected']} rejected, {stats['cost_gate_warned']} warned")
+                        if "row_limit_max_rows" in stats:
+                            print(f"   Row limit ({stats['row_limit_max_rows']}): {stats['row_limit_injected']} added, "
+                                  f"{stats['row_limit_clamped']} clamped, {stats['row_limit_truncated']} results truncated")
+                        for mode in ("standard", "fast"):
+                            if stats.get(f"agent_{mode}_questions"):
+                                print(f"   Agent ({mode}): {stats[f'agent_{mode}_questions']} questions, "
+                                      f"{stats[f'agent_{mode}_avg_model_calls']:.1f} model calls, "
+                                      f"{stats[f'agent_{mode}_avg_tool_calls']:.1f} tool calls, "
+                                      f"{stats[f'agent_{mode}_avg_seconds']:.1f}s per question")
                     else:
                         print("\n📊 No statistics available")
                     print()
                     continue
                 
+                if question.lower() == 'refresh-schema':
+                    agent.refresh_schema_snapshot()
+                    print("\n📸 Schema snapshot refreshed")
+                    print()
+                    continue
+                
+                # Commands are matched on their first word, so "model numbers shipped" stays a question
+                words = question.split()
+                command = words[0].lower() if words else ""
+                
+                if command == 'mode' and len(words) <= 2:
+                    if len(words) == 2 and words[1].lower() in ("standard", "fast"):
+                        agent.agent_mode = words[1].lower()
+                        print(f"\n⚡ Agent mode: {agent.agent_mode}")
+                    else:
+                        print(f"\n💡 Usage: mode <standard|fast> (current: {agent.agent_mode})")
+                    print()
+                    continue
+                
+                if command == 'invalidate' and len(words) <= 2:
+                    if len(words) == 2 and words[1].isidentifier():
+                        agent.invalidate_cached_answers(words[1])
+                        print(f"\n🧹 Cached answers for '{words[1]}' invalidated")
+                    else:
+                        print("\n💡 Usage: invalidate <table>")
+                    print()
+                    continue
+                
                 if question.lower().startswith('suggestions'):
                     parts = question.split(' ', 1)
                     if len(parts) > 1:
@@ -98,11 +190,11 @@ def main():
                     continue
                 
                 print("\n🔄 Processing your question...")
-                response = agent.query(question)
-                print(f"\n📊 Answer: {response}\n")
+                render_stream(agent.stream(question))
                 
             except KeyboardInterrupt:
                 print("\n👋 Goodbye!")
+                agent.close()
                 break
             except Exception as e:
                 print(f"\n❌ Error: {str(e)}\n")
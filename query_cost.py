@@ -0,0 +1,222 @@
+"""
+EXPLAIN-based cost check for the SQL the agent generates.
+Before a SELECT runs, EXPLAIN FORMAT=JSON gives the optimizer's estimate of
+rows examined and the access type of every table; queries that would scan a
+large table in full or examine too many rows are sent back to the agent with
+a structured verdict telling it what to fix.
+"""
+
+import json
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+
+
+_GATED_RE = re.compile(r"^\s*(?:\(\s*)*(SELECT|WITH)\b", re.IGNORECASE)
+_LIMIT_RE = re.compile(r"\bLIMIT\s+\d+\s*(?:(?:,|OFFSET)\s*\d+\s*)?;?\s*$", re.IGNORECASE)
+# An aggregate without GROUP BY reads every row into one, and its plan shows no grouping step
+_AGGREGATE_RE = re.compile(r"\b(?:COUNT|SUM|AVG|MIN|MAX|GROUP_CONCAT|STD|STDDEV(?:_POP|_SAMP)?|VARIANCE|"
+                           r"VAR_POP|VAR_SAMP|BIT_AND|BIT_OR|BIT_XOR|JSON_ARRAYAGG|JSON_OBJECTAGG)\s*\(",
+                           re.IGNORECASE)
+
+# Access types that read every row (ALL) or every index entry (index) of a table
+FULL_SCAN_ACCESS = {"ALL": "full table scan", "index": "full index scan"}
+
+# Plan steps that need every row before the first one is returned, so a LIMIT doesn't end a scan early
+_BLOCKING_STEPS = ("ordering_operation", "grouping_operation", "duplicates_removal", "windowing")
+
+
+class QueryRejectedError(SQLAlchemyError):
+    """A query's estimated cost is over the configured limits."""
+
+    def __init__(self, verdict: Dict[str, Any]):
+        self.verdict = verdict
+        super().__init__("Query rejected by the cost check, rewrite it and try again: " + json.dumps(verdict))
+
+
+class CostGate:
+    """Judges SELECTs by their EXPLAIN plan against row-count and cost limits."""
+
+    def __init__(self, max_rows_examined: int = 1000000, full_scan_rows: int = 100000,
+                 max_query_cost: float = 0.0, mode: str = "reject",
+                 key_columns: Optional[Callable[[str], List[str]]] = None):
+        """
+        Initialize the gate.
+
+        Args:
+            max_rows_examined: Largest estimated number of rows examined a query may have
+            full_scan_rows: Tables with at least this many rows may not be scanned in full
+            max_query_cost: Largest optimizer query_cost allowed (0 for no limit)
+            mode: "reject" to stop expensive queries, "warn" to only log them
+            key_columns: Gives a table's indexed columns, used to suggest predicates
+        """
+        self.max_rows_examined = max_rows_examined
+        self.full_scan_rows = full_scan_rows
+        self.max_query_cost = max_query_cost
+        self.mode = mode
+        self.key_columns = key_columns
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.rejected = 0
+        self.warned = 0
+        self.unexplained = 0
+
+    @staticmethod
+    def applies_to(command: str) -> bool:
+        """Check whether a statement is a SELECT (or WITH ... SELECT) the gate judges."""
+        return bool(_GATED_RE.match(command))
+
+    def check(self, command: str, explain: Callable[[str], Optional[Dict[str, Any]]]):
+        """
+        Judge a statement and raise if it is too expensive.
+
+        Args:
+            command: SQL about to run
+            explain: Runs EXPLAIN FORMAT=JSON for a statement and returns the parsed plan,
+                or None if it can't (the statement then runs and reports its own error)
+
+        Raises:
+            QueryRejectedError: The statement is over a limit and mode is "reject"
+        """
+        if not self.applies_to(command):
+            return
+        plan = explain(command)
+        if plan is None:
+            with self._lock:
+                self.unexplained += 1
+            return
+
+        verdict = self.judge(command, plan)
+        with self._lock:
+            self.checked += 1
+            if verdict["verdict"] == "ok":
+                return
+            if self.mode != "reject":
+                self.warned += 1
+            else:
+                self.rejected += 1
+        if self.mode != "reject":
+            print(f"💸 Expensive query allowed (QUERY_COST_GATE={self.mode}): {json.dumps(verdict['problems'])}")
+            return
+        print(f"💸 Query rejected by the cost check: {json.dumps(verdict['problems'])}")
+        raise QueryRejectedError(verdict)
+
+    def judge(self, command: str, plan: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Compare an EXPLAIN FORMAT=JSON plan with the limits.
+
+        Returns:
+            {"verdict": "ok" | "rejected", "estimated_rows_examined", "query_cost",
+            "problems": [{"issue", "table", "rows", "suggestion"}]}
+        """
+        tables: List[Dict[str, Any]] = []
+        self._collect_tables(plan, tables, 1.0)
+        rows_examined = int(sum(table["examined"] for table in tables))
+        query_cost = float(plan.get("query_block", {}).get("cost_info", {}).get("query_cost", 0) or 0)
+
+        # A LIMIT on an unfiltered single-table scan with no sort, grouping or aggregate stops
+        # reading early, so the optimizer's row estimates overstate what the query will read
+        stops_early = (len(tables) == 1 and not tables[0]["filtered"] and _LIMIT_RE.search(command.strip())
+                       and not _AGGREGATE_RE.search(command)
+                       and not any(step in json.dumps(plan) for step in _BLOCKING_STEPS))
+
+        problems = []
+        if not stops_early:
+            for table in tables:
+                issue = FULL_SCAN_ACCESS.get(table["access_type"])
+                if issue and table["rows"] >= self.full_scan_rows:
+                    problems.append({
+                        "issue": issue,
+                        "table": table["name"],
+                        "rows": table["rows"],
+                        "suggestion": self._suggestion(table["name"]),
+                    })
+            if rows_examined > self.max_rows_examined:
+                problems.append({
+                    "issue": "too many rows examined",
+                    "rows": rows_examined,
+                    "limit": self.max_rows_examined,
+                    "suggestion": "add selective WHERE predicates or join on indexed keys",
+                })
+        if self.max_query_cost > 0 and query_cost > self.max_query_cost:
+            problems.append({
+                "issue": "query cost over limit",
+                "cost": query_cost,
+                "limit": self.max_query_cost,
+                "suggestion": "narrow the query with predicates on indexed columns",
+            })
+
+        return {
+            "verdict": "rejected" if problems else "ok",
+            "estimated_rows_examined": rows_examined,
+            "query_cost": query_cost,
+            "problems": problems,
+        }
+
+    def _suggestion(self, table_name: str) -> str:
+        """Suggest indexed columns to filter a scanned table on."""
+        columns = self.key_columns(table_name)[:3] if self.key_columns else []
+        if columns:
+            return f"add a predicate on {' or '.join(columns)}"
+        return "add a predicate on an indexed column"
+
+    def _collect_tables(self, node: Any, tables: List[Dict[str, Any]], loops: float):
+        """
+        Find every table access in a plan with its estimated rows examined.
+        In a nested loop each table is read once per row produced by the tables before it.
+        """
+        if isinstance(node, list):
+            for item in node:
+                self._collect_tables(item, tables, loops)
+            return
+        if not isinstance(node, dict):
+            return
+
+        if "nested_loop" in node:
+            produced = loops
+            for item in node["nested_loop"]:
+                table = item.get("table") if isinstance(item, dict) else None
+                if table is None:
+                    self._collect_tables(item, tables, produced)
+                    continue
+                self._add_table(table, tables, produced)
+                self._collect_tables({k: v for k, v in table.items() if isinstance(v, (dict, list))}, tables, 1.0)
+                produced = float(table.get("rows_produced_per_join", produced) or produced)
+            rest = {k: v for k, v in node.items() if k != "nested_loop"}
+            self._collect_tables(list(rest.values()), tables, loops)
+            return
+
+        if "table_name" in node and "access_type" in node:
+            self._add_table(node, tables, loops)
+            self._collect_tables({k: v for k, v in node.items() if isinstance(v, (dict, list))}, tables, 1.0)
+            return
+
+        self._collect_tables(list(node.values()), tables, loops)
+
+    @staticmethod
+    def _add_table(table: Dict[str, Any], tables: List[Dict[str, Any]], loops: float):
+        """Record one table access; derived tables (<derivedN>) are covered by their own plan."""
+        name = table.get("table_name", "")
+        if not name or name.startswith("<"):
+            return
+        rows = float(table.get("rows_examined_per_scan", 0) or 0)
+        tables.append({
+            "name": name,
+            "access_type": table.get("access_type", ""),
+            "rows": int(rows),
+            "examined": rows * max(loops, 1.0),
+            "filtered": "attached_condition" in table,
+        })
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get how many queries were checked, rejected, allowed with a warning or couldn't be explained."""
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "checked": self.checked,
+                "rejected": self.rejected,
+                "warned": self.warned,
+                "unexplained": self.unexplained,
+            }
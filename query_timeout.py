@@ -0,0 +1,146 @@
+"""
+Per-statement time limit for the SQL the agent runs.
+SELECTs get a MySQL MAX_EXECUTION_TIME hint so the server stops them itself;
+every guarded statement is also watched by a timer that sends KILL QUERY from
+a separate connection if it runs past the limit plus a grace period.
+"""
+
+import re
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+
+_SELECT_RE = re.compile(r"^(\s*SELECT\b)(?!\s*/\*\+)", re.IGNORECASE)
+
+# ER_QUERY_TIMEOUT (MAX_EXECUTION_TIME exceeded) and ER_QUERY_INTERRUPTED (KILL QUERY)
+TIMEOUT_ERROR_CODES = (3024, 1317)
+
+
+class QueryTimeoutError(SQLAlchemyError):
+    """A statement was stopped for running past the time limit."""
+
+
+class QueryTimeoutGuard:
+    """Enforces a time limit on statements run inside active(), on every engine it is installed on."""
+
+    def __init__(self, timeout: float = 30.0, kill_grace: float = 2.0):
+        """
+        Initialize the guard.
+
+        Args:
+            timeout: Seconds a statement may run
+            kill_grace: Extra seconds before the watchdog kills a statement the server didn't stop
+        """
+        self.timeout = timeout
+        self.kill_grace = kill_grace
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.guarded = 0
+        self.timeouts = 0
+        self.kills = 0
+
+    def install(self, engine: Engine):
+        """Hook the guard into an engine's statement execution."""
+        event.listen(engine, "before_cursor_execute", self._before_execute, retval=True)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+
+    @contextmanager
+    def active(self) -> Iterator[None]:
+        """Apply the time limit to the statements executed by this thread in the block."""
+        self._local.active = True
+        try:
+            yield
+        finally:
+            self._local.active = False
+            self._cancel_watchdog()
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        """Add the execution time hint and start the watchdog for a guarded statement."""
+        if not getattr(self._local, "active", False):
+            return statement, parameters
+
+        with self._lock:
+            self.guarded += 1
+        statement = _SELECT_RE.sub(lambda m: f"{m.group(1)} /*+ MAX_EXECUTION_TIME({int(self.timeout * 1000)}) */",
+                                   statement, count=1)
+
+        thread_id = self._thread_id(cursor)
+        if thread_id is not None:
+            state = {"killed": False, "done": False}
+            timer = threading.Timer(self.timeout + self.kill_grace, self._kill, (conn.engine, thread_id, state))
+            timer.daemon = True
+            self._local.watchdog = (timer, state)
+            timer.start()
+        return statement, parameters
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self._cancel_watchdog()
+
+    def _handle_error(self, exception_context):
+        """Turn a server-side timeout or watchdog kill into a QueryTimeoutError the agent can act on."""
+        watchdog = getattr(self._local, "watchdog", None)
+        killed = bool(watchdog and watchdog[1]["killed"])
+        self._cancel_watchdog()
+        if not getattr(self._local, "active", False):
+            return None
+
+        original = exception_context.original_exception
+        code = original.args[0] if getattr(original, "args", None) else None
+        if code not in TIMEOUT_ERROR_CODES and not killed:
+            return None
+
+        with self._lock:
+            self.timeouts += 1
+        raise QueryTimeoutError(
+            f"Query cancelled: it ran longer than the {self.timeout:g}s limit. Add selective "
+            f"predicates (ideally on indexed key columns), aggregate, or narrow the joins, then try again."
+        ) from original
+
+    def _cancel_watchdog(self):
+        watchdog = getattr(self._local, "watchdog", None)
+        if watchdog is not None:
+            watchdog[0].cancel()
+            watchdog[1]["done"] = True
+            self._local.watchdog = None
+
+    def _kill(self, engine: Engine, thread_id: int, state: Dict[str, Any]):
+        """Stop a statement from a fresh connection, so a full pool can't block the kill."""
+        if state["done"]:
+            return  # Finished just as the timer fired; the connection may be running something else
+        state["killed"] = True
+        try:
+            cargs, cparams = engine.dialect.create_connect_args(engine.url)
+            connection = engine.dialect.connect(*cargs, **cparams)
+            try:
+                connection.cursor().execute(f"KILL QUERY {int(thread_id)}")
+            finally:
+                connection.close()
+            with self._lock:
+                self.kills += 1
+            print(f"⏱️  Killed query on connection {thread_id} after {self.timeout + self.kill_grace:g}s")
+        except Exception as e:
+            print(f"⚠️  Could not kill query on connection {thread_id}: {e}")
+
+    @staticmethod
+    def _thread_id(cursor):
+        """Get the MySQL connection ID of a cursor's connection (PyMySQL and mysqlclient)."""
+        try:
+            return cursor.connection.thread_id()
+        except Exception:
+            return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the time limit and how many statements were guarded, timed out and killed."""
+        with self._lock:
+            return {
+                "limit_seconds": self.timeout,
+                "guarded": self.guarded,
+                "timeouts": self.timeouts,
+                "kills": self.kills,
+            }
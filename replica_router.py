@@ -0,0 +1,213 @@
+"""
+Routing of read-only SQL to MySQL read replicas.
+Replicas are used in turn, skipping any whose replication lag (from
+SHOW REPLICA STATUS) is over the limit or that can't be reached; the primary
+serves reads only when no replica is usable and fallback is allowed.
+"""
+
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import SQLAlchemyError
+
+from db_engine import create_pooled_engine
+
+
+_READ_RE = re.compile(r"^\s*(?:\(\s*)*(SELECT|WITH|SHOW|EXPLAIN|DESC|DESCRIBE)\b", re.IGNORECASE)
+_LEADING_COMMENTS_RE = re.compile(r"^\s*(?:(?:--[^\n]*|#[^\n]*)(?:\n|$)\s*|/\*.*?\*/\s*)*", re.DOTALL)
+# Quoted strings and identifiers, comments, parentheses and words, to find what a WITH clause leads into
+_TOKEN_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|`(?:[^`]|``)*`|"
+                       r"--[^\n]*|#[^\n]*|/\*.*?\*/|([()])|([A-Za-z_]+)", re.DOTALL)
+# Statements a CTE list can lead into; anything unrecognized is sent to the primary
+_CTE_BODY_KEYWORDS = {"SELECT", "UPDATE", "DELETE", "INSERT", "REPLACE", "TABLE", "VALUES"}
+
+# MySQL client errors meaning the server couldn't be reached or dropped the connection
+CONNECTION_ERROR_CODES = (2003, 2006, 2013)
+
+# Replication status statements, newest first, with the column holding the lag in seconds
+_LAG_QUERIES = (
+    ("SHOW REPLICA STATUS", "Seconds_Behind_Source"),
+    ("SHOW SLAVE STATUS", "Seconds_Behind_Master"),
+)
+
+
+class ReplicaUnavailableError(SQLAlchemyError):
+    """No read replica is usable and falling back to the primary is disabled."""
+
+
+class ReplicaRouter:
+    """Chooses the engine a read statement runs on: a healthy replica, else the primary."""
+
+    def __init__(self, primary_url: str, replicas: List[str], max_lag: float = 30.0,
+                 check_interval: float = 5.0, fallback_to_primary: bool = False,
+                 pool_options: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the router and one connection pool per replica.
+
+        Args:
+            primary_url: Primary database URL; its user, password and database are reused
+            replicas: Replica URLs, or "host" / "host:port" entries
+            max_lag: Seconds a replica may be behind; negative to skip lag checks
+            check_interval: Seconds between lag checks of a replica
+            fallback_to_primary: Run reads on the primary when no replica is usable
+            pool_options: Pool settings for the replica engines (see db_engine.POOL_ENV)
+        """
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.fallback_to_primary = fallback_to_primary
+
+        self._lock = threading.Lock()
+        self._next = 0
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.replicas = []
+        for entry in replicas:
+            url = self.replica_url(primary_url, entry)
+            parsed = make_url(url)
+            self.replicas.append({
+                "name": f"{parsed.host}:{parsed.port}" if parsed.port else (parsed.host or entry),
+                "engine": create_pooled_engine(url, pool_options),
+                "healthy": True,
+                "lag": None,
+                "checked_at": float("-inf"),
+                "reads": 0,
+            })
+
+    @staticmethod
+    def replica_url(primary_url: str, entry: str) -> str:
+        """Build a replica URL from a full URL or a host[:port] entry and the primary's URL."""
+        if "://" in entry:
+            return entry
+        host, _, port = entry.partition(":")
+        url = make_url(primary_url).set(host=host, port=int(port) if port else None)
+        return url.render_as_string(hide_password=False)
+
+    @staticmethod
+    def is_read(command: str) -> bool:
+        """Check whether a statement only reads (SELECT, WITH ... SELECT, SHOW, EXPLAIN, DESCRIBE)."""
+        match = _READ_RE.match(_LEADING_COMMENTS_RE.sub("", command, count=1))
+        if match is None:
+            return False
+        if match.group(1).upper() != "WITH":
+            return True
+        # MySQL 8 allows WITH ... UPDATE / DELETE, which must run on the primary
+        return ReplicaRouter._cte_body_keyword(command) in ("SELECT", "TABLE", "VALUES")
+
+    @staticmethod
+    def _cte_body_keyword(command: str) -> Optional[str]:
+        """Get the first statement keyword outside parentheses after WITH, i.e. what the CTE list leads into."""
+        depth = 0
+        seen_with = False
+        for token in _TOKEN_RE.finditer(command):
+            paren, word = token.group(1), token.group(2)
+            if paren:
+                depth += 1 if paren == "(" else -1
+            elif word and depth <= 0:
+                word = word.upper()
+                if not seen_with:
+                    seen_with = word == "WITH"
+                elif word in _CTE_BODY_KEYWORDS:
+                    return word
+        return None
+
+    def choose(self) -> Optional[Dict[str, Any]]:
+        """
+        Pick the next usable replica in turn.
+
+        Returns:
+            Replica entry ("name", "engine", ...), or None to use the primary
+
+        Raises:
+            ReplicaUnavailableError: No replica is usable and fallback is disabled
+        """
+        for replica in self.replicas:
+            self._refresh(replica)
+
+        with self._lock:
+            healthy = [replica for replica in self.replicas if replica["healthy"]]
+            if healthy:
+                replica = healthy[self._next % len(healthy)]
+                self._next += 1
+                replica["reads"] += 1
+                self.replica_reads += 1
+                return replica
+            if not self.fallback_to_primary:
+                raise ReplicaUnavailableError(
+                    "No read replica is available (all are unreachable or lagging), "
+                    "and reads may not run on the primary. Try again shortly."
+                )
+            self.primary_reads += 1
+            return None
+
+    def mark_failed(self, replica: Dict[str, Any]):
+        """Take a replica out of rotation until its next lag check."""
+        with self._lock:
+            replica["healthy"] = False
+            replica["checked_at"] = time.monotonic()
+        print(f"⚠️  Read replica {replica['name']} is unreachable; skipping it for {self.check_interval:.0f}s")
+
+    def _refresh(self, replica: Dict[str, Any]):
+        """Re-check a replica's lag if its last check is older than check_interval."""
+        now = time.monotonic()
+        with self._lock:
+            if now - replica["checked_at"] < self.check_interval:
+                return
+            replica["checked_at"] = now  # Claim the check so concurrent callers don't repeat it
+
+        if self.max_lag < 0:
+            lag, healthy = None, self._reachable(replica["engine"])
+        else:
+            lag = self._replication_lag(replica["engine"])
+            healthy = lag is not None and lag <= self.max_lag
+        with self._lock:
+            if healthy != replica["healthy"]:
+                state = "back in rotation" if healthy else f"out of rotation (lag: {lag if lag is not None else 'unknown'})"
+                print(f"🔀 Read replica {replica['name']} {state}")
+            replica["lag"], replica["healthy"] = lag, healthy
+
+    @staticmethod
+    def _replication_lag(engine: Engine) -> Optional[float]:
+        """Get a replica's lag in seconds, or None if it is unreachable or not replicating."""
+        try:
+            with engine.connect() as connection:
+                for statement, column in _LAG_QUERIES:
+                    try:
+                        row = connection.execute(text(statement)).mappings().first()
+                    except Exception:
+                        continue  # Older servers only know SHOW SLAVE STATUS
+                    if row is None or row.get(column) is None:
+                        return None
+                    return float(row[column])
+        except Exception:
+            return None
+        return None
+
+    @staticmethod
+    def _reachable(engine: Engine) -> bool:
+        """Check that a replica accepts connections."""
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        """Close every replica connection pool."""
+        for replica in self.replicas:
+            replica["engine"].dispose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get read counts and the state of each replica."""
+        with self._lock:
+            return {
+                "replica_reads": self.replica_reads,
+                "primary_reads": self.primary_reads,
+                "healthy": sum(1 for replica in self.replicas if replica["healthy"]),
+                "total": len(self.replicas),
+                "lag": {replica["name"]: replica["lag"] for replica in self.replicas},
+            }
@@ -0,0 +1,302 @@
+"""
+On-disk snapshot of the MySQL schema metadata the agent needs at startup.
+Built from information_schema, saved as JSON and validated with a cheap
+server-side checksum so processes can skip SQLAlchemy reflection.
+"""
+
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+
+SNAPSHOT_VERSION = 1
+
+# Order-independent checksum of every column and foreign key in the current database
+_FINGERPRINT_SQL = """
+SELECT
+    DATABASE(),
+    (SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()),
+    (SELECT COALESCE(SUM(CRC32(CONCAT_WS(':', TABLE_NAME, COLUMN_NAME, COLUMN_TYPE,
+                                         IS_NULLABLE, COLUMN_KEY, COLUMN_COMMENT))), 0)
+     FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()),
+    (SELECT COALESCE(SUM(CRC32(CONCAT_WS(':', TABLE_NAME, COLUMN_NAME,
+                                         REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME))), 0)
+     FROM information_schema.KEY_COLUMN_USAGE
+     WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL)
+"""
+
+_TABLES_SQL = """
+SELECT TABLE_NAME, TABLE_COMMENT
+FROM information_schema.TABLES
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'
+ORDER BY TABLE_NAME
+"""
+
+_COLUMNS_SQL = """
+SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_COMMENT
+FROM information_schema.COLUMNS
+WHERE TABLE_SCHEMA = DATABASE()
+ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+
+_FOREIGN_KEYS_SQL = """
+SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+FROM information_schema.KEY_COLUMN_USAGE
+WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL
+ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+
+
+class SchemaSnapshot:
+    """Table list, columns, keys and rendered table info for one database."""
+
+    def __init__(self, database: str, fingerprint: str, tables: Dict[str, Dict[str, Any]],
+                 created_at: Optional[float] = None):
+        """
+        Initialize a snapshot.
+
+        Args:
+            database: Name of the database the snapshot describes
+            fingerprint: Schema checksum the snapshot was built against
+            tables: Per-table metadata keyed by table name
+            created_at: Epoch seconds when the snapshot was built
+        """
+        self.database = database
+        self.fingerprint = fingerprint
+        self.tables = tables
+        self.created_at = created_at or time.time()
+        self._referenced_by: Optional[Dict[str, set]] = None
+
+    @staticmethod
+    def compute_fingerprint(engine) -> Dict[str, str]:
+        """
+        Compute the current database name and schema checksum in one query.
+
+        Returns:
+            Dict with "database" and "fingerprint"
+        """
+        with engine.connect() as connection:
+            database, column_count, column_crc, fk_crc = connection.execute(text(_FINGERPRINT_SQL)).one()
+        return {"database": database, "fingerprint": f"{column_count}:{column_crc}:{fk_crc}"}
+
+    @classmethod
+    def build(cls, engine) -> "SchemaSnapshot":
+        """
+        Build a snapshot from information_schema (no SQLAlchemy reflection).
+
+        Args:
+            engine: SQLAlchemy engine for the MySQL database
+
+        Returns:
+            A new snapshot
+        """
+        current = cls.compute_fingerprint(engine)
+        tables: Dict[str, Dict[str, Any]] = {}
+
+        with engine.connect() as connection:
+            for table_name, comment in connection.execute(text(_TABLES_SQL)):
+                tables[table_name] = {"comment": comment or "", "columns": [], "primary_key": [], "foreign_keys": []}
+
+            for table_name, column, column_type, nullable, key, comment in connection.execute(text(_COLUMNS_SQL)):
+                if table_name not in tables:
+                    continue  # Views
+                tables[table_name]["columns"].append({
+                    "name": column,
+                    "type": column_type,
+                    "nullable": nullable == "YES",
+                    "key": key or "",
+                    "comment": comment or "",
+                })
+                if key == "PRI":
+                    tables[table_name]["primary_key"].append(column)
+
+            for table_name, column, ref_table, ref_column in connection.execute(text(_FOREIGN_KEYS_SQL)):
+                if table_name in tables:
+                    tables[table_name]["foreign_keys"].append({
+                        "column": column, "ref_table": ref_table, "ref_column": ref_column
+                    })
+
+        for table_name, table in tables.items():
+            table["table_info"] = cls.render_table_info(table_name, table)
+
+        return cls(current["database"], current["fingerprint"], tables)
+
+    @staticmethod
+    def render_table_info(table_name: str, table: Dict[str, Any]) -> str:
+        """Render a CREATE TABLE description in the style of SQLDatabase.get_table_info."""
+        lines = []
+        for column in table["columns"]:
+            line = f"\t{column['name']} {column['type'].upper()}"
+            if not column["nullable"]:
+                line += " NOT NULL"
+            if column["comment"]:
+                line += f" COMMENT {json.dumps(column['comment'])}"
+            lines.append(line)
+        if table["primary_key"]:
+            lines.append(f"\tPRIMARY KEY ({', '.join(table['primary_key'])})")
+        for fk in table["foreign_keys"]:
+            lines.append(f"\tFOREIGN KEY({fk['column']}) REFERENCES {fk['ref_table']} ({fk['ref_column']})")
+
+        info = f"\nCREATE TABLE {table_name} (\n" + ",\n".join(lines) + "\n)"
+        if table.get("comment"):
+            info += f" COMMENT={json.dumps(table['comment'])}"
+        return info + "\n"
+
+    def compact_table_info(self, table_name: str) -> str:
+        """Render a table as a one-line column list, for when the full description doesn't fit."""
+        columns = ", ".join(column["name"] for column in self.tables[table_name]["columns"])
+        return f"{table_name}({columns})"
+
+    def describe_table(self, table_name: str, max_chars: int = 6000) -> str:
+        """
+        Describe a table in prose for embedding: its comment, columns and relationships.
+
+        Args:
+            table_name: Table to describe
+            max_chars: Longest description returned
+
+        Returns:
+            Text matching how questions talk about the table
+        """
+        table = self.tables[table_name]
+        references = {fk["column"]: f"{fk['ref_table']}.{fk['ref_column']}" for fk in table["foreign_keys"]}
+        columns = []
+        for column in table["columns"]:
+            notes = [column["type"]]
+            if column["name"] in table["primary_key"]:
+                notes.append("primary key")
+            if column["name"] in references:
+                notes.append(f"references {references[column['name']]}")
+            text = f"{column['name']} ({', '.join(notes)})"
+            if column["comment"]:
+                text += f" - {column['comment']}"
+            columns.append(text)
+
+        lines = [f"Table {table_name}" + (f": {table['comment']}" if table.get("comment") else "")]
+        lines.append("Columns: " + "; ".join(columns))
+        related = sorted(self.neighbours(table_name))
+        if related:
+            lines.append("Related tables: " + ", ".join(related))
+        return "\n".join(lines)[:max_chars]
+
+    def describe_column(self, table_name: str, column: Dict[str, Any], samples: Optional[List[Any]] = None) -> str:
+        """
+        Describe one column in prose for embedding.
+
+        Args:
+            table_name: Table the column belongs to
+            column: Column entry from the snapshot
+            samples: A few distinct values, if known
+
+        Returns:
+            Text with the column's type, comment, key role, table and sample values
+        """
+        table = self.tables[table_name]
+        text = f"Column {table_name}.{column['name']} ({column['type']})"
+        if column["comment"]:
+            text += f": {column['comment']}"
+        if column["name"] in table["primary_key"]:
+            text += ". Primary key"
+        for fk in table["foreign_keys"]:
+            if fk["column"] == column["name"]:
+                text += f". References {fk['ref_table']}.{fk['ref_column']}"
+        if table.get("comment"):
+            text += f". Table {table_name}: {table['comment']}"
+        if samples:
+            text += ". Example values: " + ", ".join(str(value) for value in samples)
+        return text
+
+    def neighbours(self, table_name: str) -> set:
+        """Get the tables joined to a table by a foreign key, in either direction."""
+        if self._referenced_by is None:
+            referenced_by: Dict[str, set] = {}
+            for other_name, other in self.tables.items():
+                for fk in other["foreign_keys"]:
+                    referenced_by.setdefault(fk["ref_table"], set()).add(other_name)
+            self._referenced_by = referenced_by
+
+        related = {fk["ref_table"] for fk in self.tables.get(table_name, {}).get("foreign_keys", [])}
+        related |= self._referenced_by.get(table_name, set())
+        related.discard(table_name)
+        return {name for name in related if name in self.tables}
+
+    def is_current(self, engine) -> bool:
+        """Check the snapshot against the live schema with one cheap checksum query."""
+        current = self.compute_fingerprint(engine)
+        return current["database"] == self.database and current["fingerprint"] == self.fingerprint
+
+    def indexed_columns(self, table_name: str) -> List[str]:
+        """Get the columns that lead an index (COLUMN_KEY PRI, UNI or MUL), primary key first."""
+        columns = self.tables.get(table_name, {}).get("columns", [])
+        order = {"PRI": 0, "UNI": 1, "MUL": 2}
+        keyed = [column for column in columns if column.get("key") in order]
+        return [column["name"] for column in sorted(keyed, key=lambda column: order[column["key"]])]
+
+    def table_names(self) -> List[str]:
+        """Get every table in the snapshot."""
+        return list(self.tables)
+
+    def table_info_map(self) -> Dict[str, str]:
+        """Get rendered table info keyed by table name, for SQLDatabase(custom_table_info=...)."""
+        return {name: table["table_info"] for name, table in self.tables.items()}
+
+    def save(self, path: str):
+        """Write the snapshot to disk atomically."""
+        payload = {
+            "version": SNAPSHOT_VERSION,
+            "database": self.database,
+            "fingerprint": self.fingerprint,
+            "created_at": self.created_at,
+            "tables": self.tables,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["SchemaSnapshot"]:
+        """
+        Read a snapshot from disk.
+
+        Returns:
+            The snapshot, or None if the file is missing, unreadable or from another version
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if payload.get("version") != SNAPSHOT_VERSION:
+            return None
+        return cls(payload["database"], payload["fingerprint"], payload["tables"], payload.get("created_at"))
+
+    @classmethod
+    def load_or_build(cls, engine, path: str, refresh: bool = False) -> "SchemaSnapshot":
+        """
+        Load the snapshot if it still matches the live schema, otherwise rebuild and save it.
+
+        Args:
+            engine: SQLAlchemy engine for the MySQL database
+            path: Snapshot file path
+            refresh: Rebuild even if the saved snapshot is current
+
+        Returns:
+            A snapshot matching the live schema
+        """
+        snapshot = None if refresh else cls.load(path)
+        if snapshot is not None and snapshot.is_current(engine):
+            print(f"⚡ Loaded schema snapshot ({len(snapshot.tables)} tables) from {path}")
+            return snapshot
+
+        print("📸 Building schema snapshot from information_schema...")
+        snapshot = cls.build(engine)
+        try:
+            snapshot.save(path)
+        except OSError as e:
+            print(f"⚠️  Could not save schema snapshot: {e}")
+        return snapshot
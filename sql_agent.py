@@ -5,16 +5,76 @@ Based on the LangChain SQL agent tutorial.
 
 import os
 import re
-from typing import Optional
+import copy
+import json
+import time
+import atexit
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
 from langchain.chat_models import init_chat_model
 from langchain_community.utilities import SQLDatabase
 from langchain_community.agent_toolkits import SQLDatabaseToolkit
 from langchain.agents import create_agent
 from document_store import DocumentStore
+from history_writer import HistoryWriter
+from db_engine import create_pooled_engine
+from replica_router import CONNECTION_ERROR_CODES, ReplicaRouter, ReplicaUnavailableError
+from query_timeout import QueryTimeoutGuard
+from query_cost import CostGate
+from sql_limits import RowLimiter
+from schema_snapshot import SchemaSnapshot
+from answer_cache import AnswerCache
+from context_builder import ContextBuilder
+from join_graph import JoinGraph
+from token_counter import TokenCounter
+
+
+# "standard": the agent has every SQL tool and may explore the database;
+# "fast": the relevant schemas are given with the question and only these tools are exposed
+AGENT_MODES = ("standard", "fast")
+FAST_MODE_TOOLS = ("sql_db_query", "sql_db_query_checker")
 
 
 class LoggingSQLDatabase(SQLDatabase):
-    """Wrapper around SQLDatabase that logs all SQL queries."""
+    """Wrapper around SQLDatabase that logs all SQL queries and routes reads to replicas."""
+    
+    # Set by SQLAgent when read replicas, a time limit, a cost check or a row limit are configured;
+    # shared by every table view
+    read_router: Optional[ReplicaRouter] = None
+    query_guard: Optional[QueryTimeoutGuard] = None
+    cost_gate: Optional[CostGate] = None
+    row_limiter: Optional[RowLimiter] = None
+    
+    # Whether this thread's last full fetch stopped at the row limit
+    _fetch_state = threading.local()
+    
+    def get_table_info(self, table_names: Optional[list] = None, get_col_comments: bool = False) -> str:
+        """
+        Get table info, serving it from the schema snapshot when possible.
+        
+        SQLDatabase reflects requested tables even when custom_table_info covers
+        them; this skips that whenever every requested table is in the snapshot.
+        """
+        names = table_names if table_names is not None else self.get_usable_table_names()
+        custom_info = self._custom_table_info or {}
+        if not get_col_comments and names and all(name in custom_info for name in names):
+            return "\n\n".join(custom_info[name] for name in names)
+        return super().get_table_info(table_names, get_col_comments=get_col_comments)
+    
+    def with_tables(self, table_names: list) -> "LoggingSQLDatabase":
+        """
+        Get a view of this database limited to some tables.
+        
+        The view shares the engine, metadata and custom table info, so creating
+        one costs no SHOW TABLES query or reflection.
+        """
+        view = copy.copy(self)
+        view._include_tables = set(table_names)
+        return view
     
     def _log_query(self, command: str):
         """Helper method to log SQL queries."""
@@ -32,10 +92,28 @@ class LoggingSQLDatabase(SQLDatabase):
             **kwargs: Additional arguments passed to parent run method
             
         Returns:
-            Query results
+            Query results, with a note if they were cut off at the row limit
+            
+        Raises:
+            QueryRejectedError: The cost check found the query too expensive to run
+            QueryTimeoutError: The query ran past the time limit
+            ReplicaUnavailableError: No read replica is usable and fallback is disabled
+            
+        These errors subclass SQLAlchemyError, so run_no_throw (used by the agent's
+        query tool) returns their message to the agent as a tool error to act on.
         """
+        if self.row_limiter is not None and isinstance(command, str):
+            command = self.row_limiter.limit_sql(command)
         self._log_query(command)
-        return super().run(command, fetch=fetch, **kwargs)
+        if self.cost_gate is not None and isinstance(command, str):
+            self.cost_gate.check(command, self._explain)
+        
+        self._fetch_state.truncated = False
+        result = super().run(command, fetch=fetch, **kwargs)
+        if self._fetch_state.truncated and isinstance(result, str):
+            result += (f"\n\n(Result truncated: only the first {self.row_limiter.max_rows} rows are shown. "
+                       f"Aggregate, filter or order and limit the query if the remaining rows matter.)")
+        return result
     
     def run_no_throw(self, command: str, fetch: str = "all", **kwargs) -> str:
         """
@@ -51,17 +129,98 @@ class LoggingSQLDatabase(SQLDatabase):
         """
         self._log_query(command)
         return super().run_no_throw(command, fetch=fetch, **kwargs)
+    
+    def _explain(self, command: str) -> Optional[Dict[str, Any]]:
+        """Get the EXPLAIN FORMAT=JSON plan of a statement, or None if it can't be explained."""
+        try:
+            rows = self._execute(f"EXPLAIN FORMAT=JSON {command.strip().rstrip(';')}", "one")
+            return json.loads(next(iter(rows[0].values()))) if rows else None
+        except Exception:
+            return None
+    
+    def _execute(self, command, *args, **kwargs):
+        """Execute a statement under the per-statement time limit, if one is configured."""
+        if self.query_guard is None:
+            return self._execute_routed(command, *args, **kwargs)
+        with self.query_guard.active():
+            return self._execute_routed(command, *args, **kwargs)
+    
+    def _execute_routed(self, command, *args, **kwargs):
+        """
+        Execute a statement, sending reads to a read replica when a router is configured.
+        
+        A replica that can't be reached is taken out of rotation and the statement is
+        retried on the next replica (or the primary, if fallback is enabled).
+        """
+        router = self.read_router
+        if router is None or not isinstance(command, str) or not router.is_read(command):
+            return self._execute_on(self._engine, command, *args, **kwargs)
+        
+        for _ in range(len(router.replicas) + 1):
+            replica = router.choose()
+            if replica is None:
+                return self._execute_on(self._engine, command, *args, **kwargs)
+            try:
+                return self._execute_on(replica["engine"], command, *args, **kwargs)
+            except OperationalError as e:
+                if getattr(e.orig, "args", (None,))[0] not in CONNECTION_ERROR_CODES:
+                    raise
+                router.mark_failed(replica)
+        if not router.fallback_to_primary:
+            raise ReplicaUnavailableError("No read replica could be reached. Try again shortly.")
+        return self._execute_on(self._engine, command, *args, **kwargs)
+    
+    def _execute_on(self, engine, command, fetch: str = "all", **kwargs):
+        """
+        Execute a statement on an engine (the primary's or a replica's).
+        
+        With a row limit, a full fetch streams the result through a server-side cursor
+        and reads at most one row past the limit, so a missing LIMIT can't pull a huge
+        result into memory; the extra row only tells that the result was truncated.
+        """
+        target = self
+        if engine is not self._engine:
+            # A shallow copy runs on another engine without touching this shared instance
+            target = copy.copy(self)
+            target._engine = engine
+        
+        limiter = self.row_limiter
+        if limiter is None or fetch != "all" or not isinstance(command, str) or self._schema is not None:
+            return SQLDatabase._execute(target, command, fetch, **kwargs)
+        
+        execution_options = {**(kwargs.get("execution_options") or {}), "stream_results": True}
+        with engine.begin() as connection:
+            result = connection.execute(text(command), kwargs.get("parameters") or {},
+                                        execution_options=execution_options)
+            if not result.returns_rows:
+                return []
+            rows = result.fetchmany(limiter.fetch_rows)
+            # Rows past the fetch are discarded; the injected LIMIT keeps there from being many
+            result.close()
+        
+        truncated = len(rows) > limiter.max_rows
+        self._fetch_state.truncated = truncated
+        if truncated:
+            limiter.record_truncation()
+        return [row._asdict() for row in rows[:limiter.max_rows]]
 
 
 class SQLAgent:
     """A LangChain-powered SQL agent for querying databases."""
     
-    def __init__(self, database_url: Optional[str] = None):
+    def __init__(self, database_url: Optional[str] = None, schema_snapshot_path: Optional[str] = None,
+                 pool_options: Optional[Dict[str, Any]] = None, read_replicas: Optional[list] = None):
         """
         Initialize the SQL Agent.
         
         Args:
             database_url: Database connection string. Defaults to MySQL ot_cdc database.
+            schema_snapshot_path: Where the schema snapshot is cached.
+                Defaults to schema_snapshot.json next to milvus_demo.db.
+            pool_options: Connection pool settings overriding the MYSQL_POOL_* environment
+                variables (see db_engine.POOL_ENV), e.g. {"pool_size": 20}
+            read_replicas: Replica URLs or host[:port] entries that agent reads run on.
+                Defaults to the comma-separated MYSQL_READ_REPLICAS.
         """
         if database_url:
             self.database_url = database_url
@@ -74,213 +233,980 @@ class SQLAgent:
             
             self.database_url = f"mysql+pymysql://{mysql_user}:{mysql_password}@{mysql_host}/{mysql_database}"
         
-        self.db = None
-        self.agent = None
-        self.document_store = None
-        self._initialize()
+        self.pool_options = pool_options
+        if read_replicas is None:
+            read_replicas = [entry.strip() for entry in os.getenv("MYSQL_READ_REPLICAS", "").split(",") if entry.strip()]
+        self.read_replicas = read_replicas
+        
+        # Statements the agent runs are stopped after this many seconds (0 disables the limit)
+        query_timeout = float(os.getenv("MYSQL_QUERY_TIMEOUT", "30"))
+        self.query_guard = QueryTimeoutGuard(
+            timeout=query_timeout,
+            kill_grace=float(os.getenv("MYSQL_QUERY_KILL_GRACE", "2")),
+        ) if query_timeout > 0 else None
+        
+        # EXPLAIN-based check of each SELECT before it runs ("reject", "warn" or "off")
+        cost_gate_mode = os.getenv("QUERY_COST_GATE", "reject").lower()
+        self.cost_gate = CostGate(
+            max_rows_examined=int(os.getenv("QUERY_COST_MAX_ROWS", "1000000")),
+            full_scan_rows=int(os.getenv("QUERY_COST_FULL_SCAN_ROWS", "100000")),
+            max_query_cost=float(os.getenv("QUERY_COST_MAX", "0")),
+            mode=cost_gate_mode,
+            key_columns=self._indexed_columns,
+        ) if cost_gate_mode != "off" else None
+        
+        # Most rows a query returns to the agent; LIMITs are added or clamped to match (0 disables)
+        query_max_rows = int(os.getenv("QUERY_MAX_ROWS", "100"))
+        self.row_limiter = RowLimiter(query_max_rows) if query_max_rows > 0 else None
+        
+        self.schema_snapshot_path = schema_snapshot_path or os.getenv("SCHEMA_SNAPSHOT_PATH", "schema_snapshot.json")
+        self.schema_snapshot = None
+        
+        # Schema, examples and notes sent with each question are capped at this many tokens
+        self.context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+        self.context_max_examples = int(os.getenv("CONTEXT_MAX_EXAMPLES", "3"))
+        self.token_counter = TokenCounter()
+        
+        # Pick the tables the agent sees per question from the table schema index
+        self.table_selection_enabled = os.getenv("TABLE_SELECTION_ENABLED", "true").lower() == "true"
+        self.table_selection_limit = int(os.getenv("TABLE_SELECTION_LIMIT", "6"))
+        self.table_selection_max = int(os.getenv("TABLE_SELECTION_MAX", "12"))
+        self._table_agents: "OrderedDict[tuple, Any]" = OrderedDict()
+        self.column_search_limit = int(os.getenv("COLUMN_SEARCH_LIMIT", "8"))
+        self.column_sample_values = int(os.getenv("COLUMN_SAMPLE_VALUES", "5"))
+        self.column_sample_max_queries = int(os.getenv("COLUMN_SAMPLE_MAX_QUERIES", "200"))
+        self._join_graph = None
+        self._schema_indexer = None
+        self._index_lock = threading.Lock()
+        
+        # Agent mode and per-mode run metrics, to compare the modes on real questions
+        self.agent_mode = os.getenv("AGENT_MODE", "standard").lower()
+        if self.agent_mode not in AGENT_MODES:
+            print(f"⚠️  Unknown AGENT_MODE '{self.agent_mode}', using 'standard'")
+            self.agent_mode = "standard"
+        self._mode_stats = {mode: {"questions": 0, "errors": 0, "model_calls": 0, "tool_calls": 0, "seconds": 0.0}
+                            for mode in AGENT_MODES}
+        self._stats_lock = threading.Lock()
+        
+        # Dependencies are created on first use (see the properties below), so
+        # commands that only need the document store never touch MySQL or the LLM
+        self._engine = None
+        self._read_router = None
+        self._db = None
+        self._model = None
+        self._agent = None
+        self._document_store = None
+        self._history_writer = None
+        self._answer_cache = None
+        self._answer_cache_ready = False
+        self._init_lock = threading.RLock()
+    
+    @property
+    def db(self) -> "LoggingSQLDatabase":
+        """Database connection, created on first use."""
+        if self._db is None:
+            with self._init_lock:
+                if self._db is None:
+                    try:
+                        self._initialize_database()
+                    except Exception as e:
+                        raise Exception(f"Failed to connect to database: {str(e)}")
+        return self._db
+    
+    @property
+    def engine(self):
+        """Pooled engine shared by every database view, snapshot build and sampling query."""
+        if self._engine is None:
+            with self._init_lock:
+                if self._engine is None:
+                    engine = create_pooled_engine(self.database_url, self.pool_options)
+                    if self.query_guard:
+                        self.query_guard.install(engine)
+                    self._engine = engine
+        return self._engine
+    
+    @property
+    def read_router(self) -> Optional[ReplicaRouter]:
+        """Router sending agent reads to the read replicas, or None if none are configured."""
+        if self._read_router is None and self.read_replicas:
+            with self._init_lock:
+                if self._read_router is None:
+                    print(f"🔀 Routing reads to {len(self.read_replicas)} read replica(s)")
+                    self._read_router = ReplicaRouter(
+                        self.database_url,
+                        self.read_replicas,
+                        max_lag=float(os.getenv("MYSQL_REPLICA_MAX_LAG", "30")),
+                        check_interval=float(os.getenv("MYSQL_REPLICA_CHECK_INTERVAL", "5")),
+                        fallback_to_primary=os.getenv("MYSQL_REPLICA_FALLBACK", "false").lower() == "true",
+                        pool_options=self.pool_options,
+                    )
+                    if self.query_guard:
+                        for replica in self._read_router.replicas:
+                            self.query_guard.install(replica["engine"])
+        return self._read_router
     
-    def _initialize(self):
-        """Initialize the database connection and agent."""
+    @property
+    def model(self):
+        """Chat model, created on first use."""
+        if self._model is None:
+            with self._init_lock:
+                if self._model is None:
+                    print("🤖 Initializing language model...")
+                    self._model = init_chat_model("openai:gpt-4")
+        return self._model
+    
+    @property
+    def agent(self):
+        """Agent graph, created on first use."""
+        if self._agent is None:
+            with self._init_lock:
+                if self._agent is None:
+                    try:
+                        self._initialize_agent()
+                    except Exception as e:
+                        raise Exception(f"Failed to initialize SQL Agent: {str(e)}")
+        return self._agent
+    
+    @property
+    def document_store(self) -> DocumentStore:
+        """Document store for query history and semantic search, created on first use."""
+        if self._document_store is None:
+            with self._init_lock:
+                if self._document_store is None:
+                    print("🧠 Initializing document store...")
+                    self._document_store = DocumentStore()
+        return self._document_store
+    
+    @property
+    def history_writer(self) -> HistoryWriter:
+        """Background query-history writer, started on first use."""
+        if self._history_writer is None:
+            with self._init_lock:
+                if self._history_writer is None:
+                    # Persist query history in the background so answers return immediately
+                    self._history_writer = HistoryWriter(
+                        self.document_store,
+                        max_queue_size=int(os.getenv("HISTORY_QUEUE_SIZE", "1000")),
+                        batch_size=int(os.getenv("HISTORY_BATCH_SIZE", "32")),
+                        flush_interval=float(os.getenv("HISTORY_FLUSH_INTERVAL", "2.0")),
+                    )
+                    atexit.register(self.close)
+        return self._history_writer
+    
+    @property
+    def answer_cache(self) -> Optional[AnswerCache]:
+        """Semantic answer cache, or None when disabled; created on first use."""
+        if not self._answer_cache_ready:
+            with self._init_lock:
+                if not self._answer_cache_ready:
+                    # Reuse SQL from near-duplicate past questions without calling the LLM
+                    if os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true":
+                        self._answer_cache = AnswerCache(
+                            self.document_store,
+                            similarity_threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97")),
+                            ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "86400")),
+                        )
+                    self._answer_cache_ready = True
+        return self._answer_cache
+    
+    def warmup(self):
+        """Create every dependency up front, e.g. before a server starts taking requests."""
+        _ = self.db, self.document_store, self.history_writer, self.answer_cache, self.agent
+        if self._schema_indexer is not None:
+            self._schema_indexer.join()
+        print("✅ SQL Agent initialized successfully!")
+    
+    def _initialize_database(self, refresh_snapshot: bool = False):
+        """
+        Connect to the database, loading table metadata from the schema snapshot.
+        
+        Args:
+            refresh_snapshot: Rebuild the schema snapshot even if it is current
+        """
+        # Initialize the database connection with limited schema info to save tokens
+        print(f"🔗 Connecting to database: {self.database_url}")
+        
+        # One pooled engine serves table listing, metadata and query execution, and outlives refreshes
+        engine = self.engine
+        
         try:
-            # Initialize the database connection with limited schema info to save tokens
-            print(f"🔗 Connecting to database: {self.database_url}")
-            
-            # Try to limit to commonly used tables to reduce context size
-            # Start with ordhdr (order header) which is the primary table
-            common_tables = ["ordhdr"]  # Add more tables here if needed
+            # The snapshot replaces SQLAlchemy reflection; validating it is one checksum query
+            snapshot = SchemaSnapshot.load_or_build(engine, self.schema_snapshot_path, refresh=refresh_snapshot)
+        except Exception as e:
+            print(f"⚠️  Schema snapshot unavailable, reflecting tables instead: {e}")
+            snapshot = None
+        
+        try:
+            if snapshot and self.table_selection_enabled:
+                # Every table is usable; each question gets a view of just its relevant tables
+                include_tables = None
+            else:
+                # List tables from the snapshot, or with a cheap SHOW TABLES instead of reflecting the whole schema
+                all_tables = snapshot.table_names() if snapshot else inspect(engine).get_table_names()
+                include_tables = self._select_tables(all_tables)
+        except Exception:
+            # Fallback: include all tables if limiting fails
+            include_tables = None
+        
+        if snapshot:
+            # Table info comes from the snapshot, so nothing is reflected up front
+            self._db = LoggingSQLDatabase(
+                engine,
+                include_tables=include_tables,
+                sample_rows_in_table_info=0,
+                custom_table_info=snapshot.table_info_map(),
+                lazy_table_reflection=True,
+            )
+        else:
+            # Reflect only the included tables, once; LoggingSQLDatabase logs every query
+            self._db = LoggingSQLDatabase(
+                engine,
+                include_tables=include_tables,
+                sample_rows_in_table_info=0,
+            )
+        self._db.read_router = self.read_router
+        self._db.query_guard = self.query_guard
+        self._db.cost_gate = self.cost_gate
+        self._db.row_limiter = self.row_limiter
+        self.schema_snapshot = snapshot
+        self._table_agents.clear()
+        self._join_graph = None
+        if include_tables is not None:
+            print(f"⚠️  Limited to {len(include_tables)} tables to reduce context size")
+        if self._table_selection_active():
+            # Indexing embeds every table and samples column values, so it runs in the background
+            # instead of holding the init lock; until it finishes, tables are ranked without it
+            self._schema_indexer = threading.Thread(target=self._index_table_schemas, args=(snapshot,),
+                                                    name="schema-indexer", daemon=True)
+            self._schema_indexer.start()
+    
+    def _indexed_columns(self, table_name: str) -> list:
+        """Indexed columns of a table from the schema snapshot, for the cost check's suggestions."""
+        return self.schema_snapshot.indexed_columns(table_name) if self.schema_snapshot else []
+    
+    def _table_selection_active(self) -> bool:
+        """Whether questions get per-question table views (needs the schema snapshot)."""
+        return self.table_selection_enabled and self.schema_snapshot is not None
+    
+    def _index_table_schemas(self, snapshot: SchemaSnapshot):
+        """Embed a description of every table and column so they can be retrieved per question."""
+        # Runs are serialized, so a refresh can't interleave with an indexing pass still running
+        with self._index_lock:
+            try:
+                descriptions = {name: snapshot.describe_table(name) for name in snapshot.table_names()}
+                self.document_store.sync_table_schemas(descriptions, snapshot.fingerprint)
+            except Exception as e:
+                print(f"⚠️  Could not index table schemas: {e}")
             
             try:
-                # First, get all available tables
-                temp_db = SQLDatabase.from_uri(self.database_url)
-                all_tables = temp_db.get_usable_table_names()
+                n_columns = sum(len(snapshot.tables[name]["columns"]) for name in snapshot.table_names())
+                if self.document_store.schema_index_is_current(self.document_store.columns_collection, snapshot.fingerprint, n_columns):
+                    return
+                columns = []
+                queries = 0
+                for table_name in snapshot.table_names():
+                    for column in snapshot.tables[table_name]["columns"]:
+                        samples = []
+                        if self._is_sampled_column(column):
+                            if queries < self.column_sample_max_queries:
+                                samples = self._sample_column_values(table_name, column)
+                            elif queries == self.column_sample_max_queries:
+                                print(f"⚠️  Column value sampling stopped after {queries} queries "
+                                      f"(COLUMN_SAMPLE_MAX_QUERIES); remaining columns are indexed without values")
+                            queries += 1
+                        columns.append({
+                            "table_name": table_name,
+                            "column_name": column["name"],
+                            "column_type": column["type"],
+                            "schema_text": snapshot.describe_column(table_name, column, samples),
+                        })
+                self.document_store.sync_column_schemas(columns, snapshot.fingerprint)
+            except Exception as e:
+                print(f"⚠️  Could not index column schemas: {e}")
+    
+    def _is_sampled_column(self, column: Dict[str, Any]) -> bool:
+        """Whether a column is categorical (enum/set or short char/varchar) and sampling is on."""
+        if self.column_sample_values <= 0:
+            return False
+        column_type = column["type"].lower()
+        length = re.match(r"(?:var)?char\((\d+)\)", column_type)
+        return column_type.startswith(("enum", "set")) or bool(length and int(length.group(1)) <= 64)
+    
+    def _sample_column_values(self, table_name: str, column: Dict[str, Any]) -> list:
+        """
+        Read a few distinct values of a categorical column, so questions phrased in terms
+        of its values find the column. Runs like agent reads: on a replica when configured.
+        """
+        quoted_table = "`" + table_name.replace("`", "``") + "`"
+        quoted_column = "`" + column["name"].replace("`", "``") + "`"
+        sql = (f"SELECT /*+ MAX_EXECUTION_TIME(500) */ DISTINCT {quoted_column} FROM {quoted_table} "
+               f"WHERE {quoted_column} IS NOT NULL LIMIT {int(self.column_sample_values)}")
+        try:
+            return [next(iter(row.values())) for row in self.db._execute(sql, "all")]
+        except Exception:
+            return []
+    
+    @property
+    def join_graph(self) -> Optional[JoinGraph]:
+        """Join graph from the snapshot's foreign keys and the documented example queries (built on first use)."""
+        if self._join_graph is None and self.schema_snapshot is not None:
+            graph = JoinGraph.from_snapshot(self.schema_snapshot)
+            if self.document_store:
+                for example in self.document_store.list_sql_examples():
+                    graph.add_sql_joins(example.get("sql_query", ""))
+            print(f"🔗 Join graph: {len(graph.tables)} tables, {graph.edge_count()} joinable pairs")
+            self._join_graph = graph
+        return self._join_graph
+    
+    def _initialize_agent(self):
+        """Create the agent over every usable table."""
+        self._agent = self._create_agent(self.db)
+    
+    def _agent_for_tables(self, tables: Dict[str, float], mode: str = "standard"):
+        """
+        Get an agent that sees only the given tables, reusing one built for the same set and mode.
+        
+        Args:
+            tables: Selected tables (see _select_tables_for_question)
+            mode: "standard" or "fast" (see AGENT_MODES)
+            
+        Returns:
+            The per-table-set agent, or the whole-database agent when selection is off or empty
+        """
+        selected = tuple(sorted(tables)) if tables and self._table_selection_active() else ()
+        if mode == "standard" and not selected:
+            return self.agent
+        
+        key = (mode, selected)
+        with self._init_lock:
+            agent = self._table_agents.get(key)
+            if agent is not None:
+                self._table_agents.move_to_end(key)
+                return agent
+        
+        agent = self._create_agent(self.db.with_tables(list(selected)) if selected else self.db, mode)
+        with self._init_lock:
+            self._table_agents[key] = agent
+            while len(self._table_agents) > 32:
+                self._table_agents.popitem(last=False)
+        return agent
+    
+    def _create_agent(self, db: "LoggingSQLDatabase", mode: str = "standard"):
+        """
+        Create the SQL toolkit and agent graph for a database (or a view of it).
+        
+        Args:
+            db: Database or per-question table view the tools run against
+            mode: "standard" or "fast" (see AGENT_MODES)
+        """
+        # Create the SQL toolkit
+        toolkit = SQLDatabaseToolkit(db=db, llm=self.model)
+        tools = toolkit.get_tools()
+        if mode == "fast":
+            # Schemas come with the question, so the list-tables/schema round trips are skipped
+            tools = [tool for tool in tools if tool.name in FAST_MODE_TOOLS]
+        
+        # Sanitize tool names to match OpenAI's function name pattern (^[a-zA-Z0-9_-]+$)
+        # OpenAI requires function names to only contain alphanumeric, underscore, and hyphen
+        def sanitize_function_name(name: str) -> str:
+            """Sanitize function name to match OpenAI's pattern."""
+            if not name:
+                return "unnamed_tool"
+            # Replace any characters that aren't alphanumeric, underscore, or hyphen
+            sanitized = re.sub(r'[^a-zA-Z0-9_-]', '_', name)
+            # Remove consecutive underscores
+            sanitized = re.sub(r'_+', '_', sanitized)
+            # Ensure it doesn't start with a number or hyphen
+            if sanitized and (sanitized[0].isdigit() or sanitized[0] == '-'):
+                sanitized = 'tool_' + sanitized
+            # Ensure it doesn't end with underscore or hyphen
+            sanitized = sanitized.rstrip('_-')
+            # Ensure it's not empty
+            if not sanitized:
+                sanitized = "unnamed_tool"
+            return sanitized
+        
+        for tool in tools:
+            if hasattr(tool, 'name'):
+                original_name = tool.name
+                sanitized_name = sanitize_function_name(original_name)
                 
-                # If we have many tables, try to limit to common ones plus a few others
-                # This helps reduce the schema size in the context
-                if len(all_tables) > 10:
-                    # Use include_tables to limit schema to most common tables
-                    # This significantly reduces token usage
-                    include_tables = common_tables + [t for t in all_tables if t.startswith("ord")][:5]
-                    # Use LoggingSQLDatabase to log queries - create base DB then wrap it
-                    base_db = SQLDatabase.from_uri(
-                        self.database_url,
-                        include_tables=include_tables,
-                        sample_rows_in_table_info=0,
-                    )
-                    # Create logging wrapper by copying attributes
-                    self.db = LoggingSQLDatabase.from_uri(
-                        self.database_url,
-                        include_tables=include_tables,
-                        sample_rows_in_table_info=0,
-                    )
-                    print(f"⚠️  Limited to {len(include_tables)} tables to reduce context size")
-                else:
-                    # If we have few tables, include all of them
-                    # Use LoggingSQLDatabase to log queries
-                    self.db = LoggingSQLDatabase.from_uri(
-                        self.database_url,
-                        sample_rows_in_table_info=0,
-                    )
-            except Exception:
-                # Fallback: include all tables if limiting fails
-                self.db = LoggingSQLDatabase.from_uri(
-                    self.database_url,
-                    sample_rows_in_table_info=0,
-                )
-            
-            # Initialize the document store for query history and semantic search
-            print("🧠 Initializing document store...")
-            self.document_store = DocumentStore()
-            
-            # Initialize the LLM
-            print("🤖 Initializing language model...")
-            self.model = init_chat_model("openai:gpt-4")
-            
-            # Create the SQL toolkit
-            toolkit = SQLDatabaseToolkit(db=self.db, llm=self.model)
-            tools = toolkit.get_tools()
-            
-            # Sanitize tool names to match OpenAI's function name pattern (^[a-zA-Z0-9_-]+$)
-            # OpenAI requires function names to only contain alphanumeric, underscore, and hyphen
-            def sanitize_function_name(name: str) -> str:
-                """Sanitize function name to match OpenAI's pattern."""
-                if not name:
-                    return "unnamed_tool"
-                # Replace any characters that aren't alphanumeric, underscore, or hyphen
-                sanitized = re.sub(r'[^a-zA-Z0-9_-]', '_', name)
-                # Remove consecutive underscores
-                sanitized = re.sub(r'_+', '_', sanitized)
-                # Ensure it doesn't start with a number or hyphen
-                if sanitized and (sanitized[0].isdigit() or sanitized[0] == '-'):
-                    sanitized = 'tool_' + sanitized
-                # Ensure it doesn't end with underscore or hyphen
-                sanitized = sanitized.rstrip('_-')
-                # Ensure it's not empty
-                if not sanitized:
-                    sanitized = "unnamed_tool"
-                return sanitized
-            
-            for tool in tools:
-                if hasattr(tool, 'name'):
-                    original_name = tool.name
-                    sanitized_name = sanitize_function_name(original_name)
-                    
-                    if sanitized_name != original_name:
-                        tool.name = sanitized_name
-                        # Update function name if it exists
-                        if hasattr(tool, 'func') and hasattr(tool.func, '__name__'):
-                            tool.func.__name__ = sanitized_name
-                        # Update any internal references
-                        if hasattr(tool, '_name'):
-                            tool._name = sanitized_name
-                        # Update binding if it exists (for structured tools)
-                        if hasattr(tool, 'binding') and hasattr(tool.binding, 'function'):
-                            if hasattr(tool.binding.function, 'name'):
-                                tool.binding.function.name = sanitized_name
-                        # Update args_schema title if it exists
-                        try:
-                            if hasattr(tool, 'args_schema') and tool.args_schema:
-                                if hasattr(tool.args_schema, 'schema'):
-                                    schema = tool.args_schema.schema()
-                                    if isinstance(schema, dict) and 'title' in schema:
-                                        schema['title'] = sanitized_name
-                        except Exception:
-                            pass  # Ignore errors when accessing schema
-            
-            # Create minimal system prompt to save tokens
+                if sanitized_name != original_name:
+                    tool.name = sanitized_name
+                    # Update function name if it exists
+                    if hasattr(tool, 'func') and hasattr(tool.func, '__name__'):
+                        tool.func.__name__ = sanitized_name
+                    # Update any internal references
+                    if hasattr(tool, '_name'):
+                        tool._name = sanitized_name
+                    # Update binding if it exists (for structured tools)
+                    if hasattr(tool, 'binding') and hasattr(tool.binding, 'function'):
+                        if hasattr(tool.binding.function, 'name'):
+                            tool.binding.function.name = sanitized_name
+                    # Update args_schema title if it exists
+                    try:
+                        if hasattr(tool, 'args_schema') and tool.args_schema:
+                            if hasattr(tool.args_schema, 'schema'):
+                                schema = tool.args_schema.schema()
+                                if isinstance(schema, dict) and 'title' in schema:
+                                    schema['title'] = sanitized_name
+                    except Exception:
+                        pass  # Ignore errors when accessing schema
+        
+        # Create minimal system prompt to save tokens
+        if mode == "fast":
             system_prompt = """You are a MySQL agent for 'ot_cdc' database. Create correct queries, execute them, return answers.
 
-Rules: Limit to {top_k} results. Query only relevant columns. Check tables/schemas first. Verify queries before execution. NO DML (INSERT/UPDATE/DELETE/DROP).""".format(
+Rules: Limit to {top_k} results. Query only relevant columns. The schemas of the tables you may use are given with the question; write the query from them directly and run it. Check a query first only if unsure of it. NO DML (INSERT/UPDATE/DELETE/DROP).""".format(
                 top_k=10,
             )
-            
-            # Create the agent
-            self.agent = create_agent(
-                self.model,
-                tools,
-                system_prompt=system_prompt,
+        else:
+            system_prompt = """You are a MySQL agent for 'ot_cdc' database. Create correct queries, execute them, return answers.
+
+Rules: Limit to {top_k} results. Query only relevant columns. Use the table schemas given with the question; check other tables/schemas only if needed. Verify queries before execution. NO DML (INSERT/UPDATE/DELETE/DROP).""".format(
+                top_k=10,
             )
+        
+        # Create the agent
+        return create_agent(
+            self.model,
+            tools,
+            system_prompt=system_prompt,
+        )
+    
+    def refresh_schema_snapshot(self):
+        """Rebuild the schema snapshot from the live database and reconnect the agent to it."""
+        with self._init_lock:
+            old_snapshot = self.schema_snapshot
+            self._initialize_database(refresh_snapshot=True)
+            self._agent = None  # Rebuilt against the new database on next use (table views are cleared)
+        
+        # Cached SQL against tables whose schema changed may no longer be valid
+        if old_snapshot and self.schema_snapshot:
+            old_info = old_snapshot.table_info_map()
+            for table_name, info in self.schema_snapshot.table_info_map().items():
+                if old_info.get(table_name) != info:
+                    self.invalidate_cached_answers(table_name)
+    
+    def _select_tables(self, all_tables: list) -> Optional[list]:
+        """
+        Pick the tables the agent may see, to keep the schema context small.
+        Only used without a schema snapshot or with TABLE_SELECTION_ENABLED=false;
+        otherwise tables are chosen per question (see _select_tables_for_question).
+        
+        Args:
+            all_tables: Every table name in the database
             
-            print("✅ SQL Agent initialized successfully!")
-            
-        except Exception as e:
-            raise Exception(f"Failed to initialize SQL Agent: {str(e)}")
+        Returns:
+            Tables to include, or None to include all of them
+        """
+        # If we have few tables, include all of them
+        if len(all_tables) <= 10:
+            return None
+        
+        # Start with ordhdr (order header) which is the primary table
+        common_tables = [t for t in ["ordhdr"] if t in all_tables]  # Add more tables here if needed
+        ord_tables = [t for t in all_tables if t.startswith("ord") and t not in common_tables][:5]
+        return common_tables + ord_tables
     
-    def query(self, question: str) -> str:
+    def query(self, question: str, mode: Optional[str] = None) -> str:
         """
         Query the database with a natural language question.
         
         Args:
             question: Natural language question about the data
+            mode: "standard" or "fast" to override AGENT_MODE for this question
             
         Returns:
             Formatted response with the query results
         """
+        mode = self._resolve_mode(mode)
+        started = None
         try:
-            # Search for relevant documentation to guide query generation
+            # Answer near-duplicate questions by re-running their stored SQL
+            cached_answer = self._answer_from_cache(question)
+            if cached_answer is not None:
+                return cached_answer
+            
+            # Retrieve SQL examples and notes close to the question to guide query generation
             # This helps the agent use proper SQL patterns from the documentation
-            enhanced_question = question
-            doc_context = ""
+            started = time.perf_counter()
+            retrieved = self._retrieve_context(question)
             
-            if self.document_store:
-                # Search for relevant documentation (not query history)
-                relevant_docs = self.document_store.search_documentation(question, limit=1)
-                
-                if relevant_docs:
-                    doc = relevant_docs[0]
-                    # Extract SQL examples from the documentation content
-                    import re
-                    content = doc.get("content", "")
-                    
-                    # Try to find SQL in code blocks first
-                    sql_examples = re.findall(r'```sql\s*\n(.*?)\n```', content, re.DOTALL)
-                    if not sql_examples:
-                        # Try without language tag
-                        sql_examples = re.findall(r'```\s*\n(.*?)\n```', content, re.DOTALL)
-                    if not sql_examples:
-                        # Try to find SQL queries without code blocks (multi-line SELECT)
-                        sql_examples = re.findall(r'(SELECT[\s\S]*?;)', content, re.IGNORECASE)
-                    
-                    if sql_examples:
-                        # Use the most relevant SQL example (prefer shorter, more focused ones)
-                        # Sort by length and take a medium-sized one (not too short, not too long)
-                        sql_examples.sort(key=len)
-                        best_example = None
-                        for example in sql_examples:
-                            # Prefer examples that are 100-400 chars (good balance)
-                            if 100 <= len(example) <= 400:
-                                best_example = example
-                                break
-                        if not best_example:
-                            # Fall back to first example, truncated
-                            best_example = sql_examples[0][:400]
-                        
-                        doc_title = doc.get("title", "Documentation")
-                        doc_context = f"\n\nUse this SQL pattern from {doc_title} as a guide:\n```sql\n{best_example.strip()}\n```"
-                        enhanced_question = question + doc_context
+            enhanced_question, agent = self._prepare_question(question, retrieved, mode)
             
             # Run the agent with the enhanced question
-            response = self.agent.invoke({"messages": [{"role": "user", "content": enhanced_question}]})
+            response = agent.invoke({"messages": [{"role": "user", "content": enhanced_question}]})
+            self._record_run(mode, response, time.perf_counter() - started)
+            
+            result = self._extract_answer(response)
+            if result is None:
+                return "I couldn't process your question. Please try rephrasing it."
             
-            # Extract the final message content
-            if "messages" in response and response["messages"]:
-                result = response["messages"][-1].content
+            # Store this query in the document store for future learning
+            self._record_answer(question, response, result)
+            
+            return result
                 
-                # Store this query in the document store for future learning
-                if self.document_store:
-                    # Extract SQL query from the response (this is a simple approach)
-                    sql_query = self._extract_sql_from_response(result)
-                    self.document_store.store_query_history(question, sql_query, result, success=True)
+        except Exception as e:
+            if started is not None:
+                self._record_run(mode, None, time.perf_counter() - started)
+            error_msg = self._format_error(e)
+            
+            # Store failed query for learning
+            self._record_history(question, "", error_msg, success=False)
+            
+            return error_msg
+    
+    def stream(self, question: str, mode: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Answer a question incrementally, yielding events as the agent works.
+        
+        Events are dicts with a "type" key:
+            - "tool_call": the agent is calling a tool ("name", "args")
+            - "tool_result": a tool returned ("name", "content")
+            - "token": a piece of model output as it is generated ("content")
+            - "final": the complete answer ("content")
+            - "error": the question failed ("content")
+        
+        Args:
+            question: Natural language question about the data
+            mode: "standard" or "fast" to override AGENT_MODE for this question
+            
+        Yields:
+            Event dicts in the order they happen
+        """
+        mode = self._resolve_mode(mode)
+        started = None
+        try:
+            cached_answer = self._answer_from_cache(question)
+            if cached_answer is not None:
+                yield {"type": "final", "content": cached_answer}
+                return
+            
+            started = time.perf_counter()
+            retrieved = self._retrieve_context(question)
+            
+            enhanced_question, agent = self._prepare_question(question, retrieved, mode)
+            
+            messages = []
+            for stream_mode, chunk in agent.stream(
+                {"messages": [{"role": "user", "content": enhanced_question}]},
+                stream_mode=["updates", "messages"],
+            ):
+                if stream_mode == "messages":
+                    # Token-level output from the agent's model; LLM calls inside tools
+                    # (e.g. sql_db_query_checker) stream from the tools node and are skipped
+                    message_chunk, metadata = chunk
+                    if (metadata or {}).get("langgraph_node") != "model":
+                        continue
+                    if getattr(message_chunk, "type", "") == "AIMessageChunk" and isinstance(message_chunk.content, str) \
+                            and message_chunk.content:
+                        yield {"type": "token", "content": message_chunk.content}
+                    continue
                 
-                return result
-            else:
+                # Completed node updates: tool calls requested by the model and tool results
+                for update in chunk.values():
+                    for message in (update or {}).get("messages", []):
+                        messages.append(message)
+                        for tool_call in getattr(message, "tool_calls", None) or []:
+                            yield {"type": "tool_call", "name": tool_call.get("name", ""), "args": tool_call.get("args", {})}
+                        if getattr(message, "type", "") == "tool":
+                            yield {"type": "tool_result", "name": getattr(message, "name", ""), "content": str(message.content)}
+            
+            response = {"messages": messages}
+            self._record_run(mode, response, time.perf_counter() - started)
+            result = self._extract_answer(response)
+            if result is None:
+                yield {"type": "error", "content": "I couldn't process your question. Please try rephrasing it."}
+                return
+            
+            self._record_answer(question, response, result)
+            yield {"type": "final", "content": result}
+            
+        except Exception as e:
+            if started is not None:
+                self._record_run(mode, None, time.perf_counter() - started)
+            error_msg = self._format_error(e)
+            self._record_history(question, "", error_msg, success=False)
+            yield {"type": "error", "content": error_msg}
+    
+    async def aquery(self, question: str, mode: Optional[str] = None) -> str:
+        """
+        Async variant of query for serving many in-flight questions from one process.
+        
+        Documentation retrieval awaits the async embeddings client and the agent runs
+        through ainvoke; blocking Milvus and MySQL calls are moved to worker threads
+        and query history is handed to the background writer.
+        
+        Args:
+            question: Natural language question about the data
+            mode: "standard" or "fast" to override AGENT_MODE for this question
+            
+        Returns:
+            Formatted response with the query results
+        """
+        mode = self._resolve_mode(mode)
+        started = None
+        try:
+            cached_answer = await asyncio.to_thread(self._answer_from_cache, question)
+            if cached_answer is not None:
+                return cached_answer
+            
+            started = time.perf_counter()
+            retrieved = await self._aretrieve_context(question)
+            
+            enhanced_question, agent = await asyncio.to_thread(self._prepare_question, question, retrieved, mode)
+            
+            response = await agent.ainvoke({"messages": [{"role": "user", "content": enhanced_question}]})
+            self._record_run(mode, response, time.perf_counter() - started)
+            
+            result = self._extract_answer(response)
+            if result is None:
                 return "I couldn't process your question. Please try rephrasing it."
-                
+            
+            self._record_answer(question, response, result)
+            
+            return result
+            
         except Exception as e:
-            error_str = str(e)
+            if started is not None:
+                self._record_run(mode, None, time.perf_counter() - started)
+            error_msg = self._format_error(e)
+            
+            self._record_history(question, "", error_msg, success=False)
+            
+            return error_msg
+    
+    def _answer_from_cache(self, question: str) -> Optional[str]:
+        """
+        Answer a question from the answer cache without calling the LLM.
+        
+        Args:
+            question: Natural language question about the data
             
-            # Handle context length errors with helpful message
-            if "context_length_exceeded" in error_str or "maximum context length" in error_str.lower():
-                error_msg = """The database schema is too large for the current model context. 
+        Returns:
+            Formatted response, or None if the question must go to the agent
+        """
+        if not self.answer_cache:
+            return None
+        
+        match = self.answer_cache.lookup(question)
+        if not match:
+            return None
+        
+        try:
+            rows = self.db.run(match["sql_query"])
+        except Exception as e:
+            print(f"⚠️  Cached query failed, falling back to the agent: {e}")
+            self.answer_cache.record_miss()
+            return None
+        
+        self.answer_cache.record_hit()
+        return (
+            f"Answer reused from a similar previous question (\"{match['question']}\", "
+            f"similarity {match['similarity_score']:.2f}).\n\n"
+            f"SQL:\n```sql\n{match['sql_query']}\n```\n\n"
+            f"Result: {rows if rows else 'No rows returned.'}"
+        )
+    
+    def invalidate_cached_answers(self, table_name: str):
+        """
+        Stop answering from cached SQL that reads the given table.
+        
+        Args:
+            table_name: Table whose cached queries should be ignored
+        """
+        if self.answer_cache:
+            self.answer_cache.invalidate_table(table_name)
+    
+    def _record_answer(self, question: str, response: dict, result: str):
+        """
+        Record an answered question. Only an answer backed by SQL the query tool ran without
+        error counts as successful, so the answer cache never reuses SQL that was merely
+        quoted in an answer (kept for reference) or a refusal.
+        """
+        executed = self._extract_executed_sql(response)
+        sql_query = executed or self._extract_sql_from_response(result)
+        self._record_history(question, sql_query, result, success=bool(executed))
+    
+    def _record_history(self, question: str, sql_query: str, result: str, success: bool):
+        """Queue a query-history record, writing it directly if there is no background writer."""
+        if self.history_writer:
+            self.history_writer.submit(question, sql_query, result, success=success)
+        elif self.document_store:
+            self.document_store.store_query_history(question, sql_query, result, success=success)
+    
+    def close(self):
+        """Flush pending query history, stop background workers and close pooled connections."""
+        if self._history_writer:
+            self._history_writer.close()
+        if self._engine is not None:
+            self._engine.dispose()
+        if self._read_router is not None:
+            self._read_router.close()
+    
+    def _retrieve_context(self, question: str) -> Dict[str, list]:
+        """
+        Search the document store for SQL examples, documentation, tables and columns close to a question.
+        
+        Returns:
+            Dict with "examples", "docs", "tables" and "columns" search results, each best match first
+        """
+        retrieved = {"examples": [], "docs": [], "tables": [], "columns": []}
+        if not self.document_store:
+            return retrieved
+        retrieved["examples"] = self.document_store.search_sql_examples(question, limit=self.context_max_examples)
+        # The question's embedding is cached, so the other searches cost no API call
+        retrieved["docs"] = self.document_store.search_documentation(question, limit=1)
+        if self.table_selection_enabled:
+            retrieved["tables"] = self.document_store.search_table_schemas(question, limit=self.table_selection_limit)
+            retrieved["columns"] = self.document_store.search_column_schemas(question, limit=self.column_search_limit)
+        return retrieved
+    
+    async def _aretrieve_context(self, question: str) -> Dict[str, list]:
+        """Async variant of _retrieve_context."""
+        retrieved = {"examples": [], "docs": [], "tables": [], "columns": []}
+        if not self.document_store:
+            return retrieved
+        store = self.document_store
+        try:
+            # One embedding request serves every search; the Milvus searches run in worker threads
+            query_embedding = await store.aget_embedding(question)
+        except Exception as e:
+            print(f"❌ Error embedding question: {e}")
+            return retrieved
+        searches = {
+            "examples": asyncio.to_thread(store._search_sql_examples_by_vector, query_embedding, self.context_max_examples),
+            "docs": asyncio.to_thread(store._search_documentation_by_vector, query_embedding, 1),
+        }
+        if self.table_selection_enabled:
+            searches["tables"] = asyncio.to_thread(store._search_table_schemas_by_vector, query_embedding,
+                                                   self.table_selection_limit)
+            searches["columns"] = asyncio.to_thread(store._search_column_schemas_by_vector, query_embedding,
+                                                    self.column_search_limit)
+        results = await asyncio.gather(*searches.values(), return_exceptions=True)
+        for name, result in zip(searches, results):
+            if isinstance(result, Exception):
+                print(f"❌ Error searching {name}: {result}")
+            else:
+                retrieved[name] = result
+        return retrieved
+    
+    def _prepare_question(self, question: str, retrieved: Dict[str, list], mode: str = "standard") -> tuple:
+        """
+        Select the tables for a question, plan their joins, and build its prompt and agent.
+        
+        Returns:
+            (enhanced_question, agent)
+        """
+        tables, join_edges = self._select_tables_for_question(question, retrieved)
+        if tables and self._table_selection_active():
+            print(f"📋 Tables for this question: {', '.join(sorted(tables))}")
+        agent = self._agent_for_tables(tables, mode)
+        if mode == "fast" and not self._table_selection_active():
+            # The fast agent can't look schemas up, so offer every table it can query (ranked ones first)
+            tables = {**{name: 0.0 for name in self.db.get_usable_table_names()}, **tables}
+        if mode == "fast":
+            # Schemas are the one context the fast agent can't do without, so they go in first
+            tables = {name: score + 1.0 for name, score in tables.items()}
+        enhanced_question = self._build_enhanced_question(question, retrieved, tables, join_edges)
+        return enhanced_question, agent
+    
+    def _resolve_mode(self, mode: Optional[str]) -> str:
+        """Get the agent mode for a question: the given override or AGENT_MODE."""
+        if mode is None:
+            return self.agent_mode
+        mode = mode.lower()
+        if mode not in AGENT_MODES:
+            raise ValueError(f"Unknown agent mode '{mode}' (expected one of {', '.join(AGENT_MODES)})")
+        return mode
+    
+    def _record_run(self, mode: str, response: Optional[dict], seconds: float):
+        """
+        Count the model and tool calls and the latency of one agent run.
+        
+        Args:
+            mode: Agent mode the question ran in
+            response: Agent state with its messages, or None if the run failed
+            seconds: Time from retrieval to the agent's final message
+        """
+        messages = (response or {}).get("messages", [])
+        ai_messages = [message for message in messages if getattr(message, "type", "") == "ai"]
+        with self._stats_lock:
+            stats = self._mode_stats[mode]
+            stats["questions"] += 1
+            stats["errors"] += 0 if response else 1
+            stats["model_calls"] += len(ai_messages)
+            stats["tool_calls"] += sum(len(getattr(message, "tool_calls", None) or []) for message in ai_messages)
+            stats["seconds"] += seconds
+    
+    def get_mode_stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get per-mode agent metrics, averaged over the questions answered by the agent.
+        
+        Returns:
+            Dict keyed by mode with questions, errors, avg_model_calls, avg_tool_calls and avg_seconds
+        """
+        with self._stats_lock:
+            snapshot = {mode: dict(stats) for mode, stats in self._mode_stats.items()}
+        result = {}
+        for mode, stats in snapshot.items():
+            questions = stats["questions"] or 1
+            result[mode] = {
+                "questions": stats["questions"],
+                "errors": stats["errors"],
+                "avg_model_calls": stats["model_calls"] / questions,
+                "avg_tool_calls": stats["tool_calls"] / questions,
+                "avg_seconds": stats["seconds"] / questions,
+            }
+        return result
+    
+    def _select_tables_for_question(self, question: str, retrieved: Dict[str, list]) -> tuple:
+        """
+        Choose the tables relevant to a question and the joins connecting them.
+        
+        Tables and columns retrieved from the schema indexes are combined with the
+        evidence from _rank_tables and the best TABLE_SELECTION_LIMIT are kept. The
+        join graph then connects them, adding any intermediate tables, and joinable
+        neighbours are added (at half their score) up to TABLE_SELECTION_MAX.
+        
+        Returns:
+            (scores keyed by table name, join path edges from JoinGraph.join_path)
+        """
+        scores = self._rank_tables(question, retrieved["examples"])
+        usable = set(self.db.get_usable_table_names())
+        for hit in retrieved["tables"] + retrieved["columns"]:
+            table_name = hit.get("table_name")
+            if table_name in usable:
+                scores[table_name] = max(scores.get(table_name, 0.0), hit.get("similarity_score", 0.0))
+        
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:self.table_selection_limit]
+        selected = dict(ranked)
+        graph = self.join_graph
+        if graph is None:
+            return selected, []
+        
+        # Tables the join path passes through are needed even if nothing pointed at them
+        join_edges = graph.join_path([table_name for table_name, _ in ranked])
+        lowest = min(selected.values()) if selected else 0.0
+        for table_name in graph.tables_in(join_edges):
+            if table_name in usable and table_name not in selected:
+                selected[table_name] = lowest
+        
+        neighbours = {}
+        for table_name, score in ranked:
+            for neighbour in graph.neighbours(table_name):
+                if neighbour in usable and neighbour not in selected:
+                    neighbours[neighbour] = max(neighbours.get(neighbour, 0.0), score / 2)
+        room = max(0, self.table_selection_max - len(selected))
+        selected.update(sorted(neighbours.items(), key=lambda item: item[1], reverse=True)[:room])
+        return selected, join_edges
+    
+    def _build_enhanced_question(self, question: str, retrieved: Dict[str, list], tables: Dict[str, float],
+                                 join_edges: Optional[list] = None) -> str:
+        """
+        Append token-budgeted context to the question: the join path, the most
+        relevant columns and table schemas, the closest SQL examples and
+        documentation notes.
+        
+        Args:
+            question: Natural language question about the data
+            retrieved: Search results from _retrieve_context
+            tables: Relevance scores of the tables to describe
+            join_edges: Planned joins between the tables
+            
+        Returns:
+            The question, followed by as much context as fits CONTEXT_TOKEN_BUDGET
+        """
+        builder = ContextBuilder(self.context_token_budget, self.token_counter)
+        examples, docs = retrieved["examples"], retrieved["docs"]
+        
+        if join_edges:
+            # One precomputed lookup instead of the agent exploring schemas to find joins
+            builder.add("joins", "path", JoinGraph.render(join_edges), 2.0)
+        
+        for column in retrieved["columns"]:
+            if column.get("table_name") in tables:
+                builder.add("columns", f"{column['table_name']}.{column['column_name']}",
+                            column.get("description", ""), column.get("similarity_score", 0.0))
+        
+        for i, example in enumerate(examples):
+            if not example.get("sql_query"):
+                continue
+            description = example.get("description") or example.get("section", "")
+            builder.add("example", str(i), f"-- {description}\n{example['sql_query'].strip()}",
+                        example.get("similarity_score", 0.0))
+        
+        for table_name, score in tables.items():
+            try:
+                if self.schema_snapshot and table_name in self.schema_snapshot.tables:
+                    builder.add("schema", table_name, self.schema_snapshot.tables[table_name]["table_info"], score,
+                                compact=self.schema_snapshot.compact_table_info(table_name))
+                else:
+                    builder.add("schema", table_name, self.db.get_table_info([table_name]), score)
+            except Exception as e:
+                print(f"⚠️  Could not describe table {table_name}: {e}")
+        
+        example_sql = [example.get("sql_query", "") for example in examples]
+        for i, doc in enumerate(docs or []):
+            content = doc.get("content", "")
+            # A chunk that is just one of the examples adds nothing
+            if any(sql and sql.strip() in content for sql in example_sql):
+                continue
+            section = doc.get("section") or doc.get("title", "")
+            builder.add("documentation", str(i), f"[{section}]\n{content}", doc.get("similarity_score", 0.0))
+        
+        context = builder.build()
+        if not context:
+            return question
+        return f"{question}\n\n{context}"
+    
+    def _rank_tables(self, question: str, examples: list) -> Dict[str, float]:
+        """
+        Score the usable tables by relevance to a question.
+        
+        A table named in the question scores 1.0, one with a column named in the
+        question 0.6, and one used by a retrieved SQL example that example's score.
+        
+        Returns:
+            Scores keyed by table name, only for tables with some evidence
+        """
+        usable = set(self.db.get_usable_table_names())
+        words = {word.lower() for word in re.findall(r"\w+", question)}
+        scores: Dict[str, float] = {}
+        
+        def bump(table_name: str, score: float):
+            if table_name in usable:
+                scores[table_name] = max(scores.get(table_name, 0.0), score)
+        
+        for example in examples:
+            for table_name in example.get("tables") or []:
+                bump(table_name, example.get("similarity_score", 0.0))
+        
+        for table_name in usable:
+            if table_name.lower() in words:
+                bump(table_name, 1.0)
+            elif self.schema_snapshot and table_name in self.schema_snapshot.tables:
+                columns = self.schema_snapshot.tables[table_name]["columns"]
+                # Short names like "id" would match everything
+                if any(len(column["name"]) > 3 and column["name"].lower() in words for column in columns):
+                    bump(table_name, 0.6)
+        return scores
+    
+    def _extract_answer(self, response: dict) -> Optional[str]:
+        """Get the final message content from an agent response, or None if there is none."""
+        if "messages" in response and response["messages"]:
+            return response["messages"][-1].content
+        return None
+    
+    def _format_error(self, error: Exception) -> str:
+        """Turn an agent failure into a user-facing message."""
+        error_str = str(error)
+        
+        # Handle context length errors with helpful message
+        if "context_length_exceeded" in error_str or "maximum context length" in error_str.lower():
+            return """The database schema is too large for the current model context. 
 
 Try:
 1. Ask about a specific table (e.g., 'Show orders from ordhdr table')
@@ -288,14 +1214,36 @@ Try:
 3. Ask more specific questions about fewer tables at once
 
 The database has many tables with detailed schemas that exceed the token limit."""
-            else:
-                error_msg = f"Error processing your question: {error_str}"
-            
-            # Store failed query for learning
-            if self.document_store:
-                self.document_store.store_query_history(question, "", error_msg, success=False)
+        return f"Error processing your question: {error_str}"
+    
+    def _extract_executed_sql(self, response: dict) -> str:
+        """
+        Get the last SQL query the agent ran successfully through the query tool.
+        
+        Args:
+            response: Agent response containing the full message list
             
-            return error_msg
+        Returns:
+            Executed SQL query or empty string
+        """
+        messages = response.get("messages", [])
+        tool_outputs = {
+            getattr(message, "tool_call_id", None): str(message.content)
+            for message in messages
+            if getattr(message, "type", "") == "tool"
+        }
+        
+        sql_query = ""
+        for message in messages:
+            for tool_call in getattr(message, "tool_calls", None) or []:
+                if tool_call.get("name") != "sql_db_query":
+                    continue
+                output = tool_outputs.get(tool_call.get("id"))
+                if output is None or output.startswith("Error"):
+                    continue  # Never ran, or failed
+                sql_query = tool_call.get("args", {}).get("query", sql_query)
+        
+        return sql_query
     
     def _extract_sql_from_response(self, response: str) -> str:
         """
@@ -360,6 +1308,24 @@ The database has many tables with detailed schemas that exceed the token limit."
             print(f"Error adding document: {e}")
             return False
     
+    def add_documents(self, documents: list) -> int:
+        """
+        Add many documents to the document store in one batched operation.
+        
+        Args:
+            documents: List of dicts with "title", "content" and optional "doc_type"
+            
+        Returns:
+            Number of documents stored
+        """
+        try:
+            if self.document_store:
+                return self.document_store.store_documents(documents)
+            return 0
+        except Exception as e:
+            print(f"Error adding documents: {e}")
+            return 0
+    
     def get_query_suggestions(self, partial_query: str) -> list:
         """
         Get query suggestions based on partial input.
@@ -386,9 +1352,27 @@ The database has many tables with detailed schemas that exceed the token limit."
             Dictionary with document store statistics
         """
         try:
+            stats = {}
             if self.document_store:
-                return self.document_store.get_stats()
-            return {}
+                stats.update(self.document_store.get_stats())
+            # Report the background components only if they have been started
+            if self._history_writer:
+                stats.update({f"history_{key}": value for key, value in self._history_writer.get_stats().items()})
+            if self._answer_cache:
+                stats.update({f"answer_cache_{key}": value for key, value in self._answer_cache.get_stats().items()})
+            if self._engine is not None:
+                stats.update({f"pool_{key}": value for key, value in self._engine.pool.get_stats().items()})
+            if self._read_router is not None:
+                stats.update({f"replicas_{key}": value for key, value in self._read_router.get_stats().items()})
+            if self.query_guard:
+                stats.update({f"query_{key}": value for key, value in self.query_guard.get_stats().items()})
+            if self.cost_gate:
+                stats.update({f"cost_gate_{key}": value for key, value in self.cost_gate.get_stats().items()})
+            if self.row_limiter:
+                stats.update({f"row_limit_{key}": value for key, value in self.row_limiter.get_stats().items()})
+            for mode, mode_stats in self.get_mode_stats().items():
+                stats.update({f"agent_{mode}_{key}": value for key, value in mode_stats.items()})
+            return stats
         except Exception as e:
             print(f"Error getting document stats: {e}")
             return {}
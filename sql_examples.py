@@ -0,0 +1,162 @@
+"""
+Extraction of SQL examples from documentation at ingestion time.
+Each SELECT/WITH statement is stored with the comment or text that describes
+it and the tables it reads, so the agent can retrieve the best example for a
+question by vector similarity instead of regex-scanning documents per request.
+"""
+
+import re
+from typing import Dict, List
+
+
+_FENCE_RE = re.compile(r"^\s*(```|~~~)\s*(\w*)")
+_HEADER_RE = re.compile(r"^#{1,6}\s+(.+?)\s*#*\s*$")
+_BANNER_RULE_RE = re.compile(r"^\s*--\s*[=\-#*]{8,}\s*$")
+_SQL_COMMENT_RE = re.compile(r"^\s*--\s?(.*)$")
+_STATEMENT_START_RE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_TABLE_RE = re.compile(r"\b(?:FROM|JOIN)\s+`?(\w+)`?", re.IGNORECASE)
+_CTE_RE = re.compile(r"(?:\bWITH|,)\s*`?(\w+)`?\s+AS\s*\(", re.IGNORECASE)
+_PATTERN_LABEL_RE = re.compile(r"^PATTERN\s+\d+\s*:\s*", re.IGNORECASE)
+
+SQL_FENCE_LANGUAGES = ("", "sql", "mysql")
+
+
+class SQLExampleExtractor:
+    """Finds SQL example statements and their descriptions in a document."""
+
+    def __init__(self, max_description_chars: int = 500):
+        """
+        Initialize the extractor.
+
+        Args:
+            max_description_chars: Longest description kept for an example
+        """
+        self.max_description_chars = max_description_chars
+
+    def extract(self, content: str, title: str = "") -> List[Dict[str, object]]:
+        """
+        Extract SQL examples from a document.
+
+        Fenced ```sql blocks and bare statements (e.g. under "-- PATTERN n" banners)
+        are both recognised; a statement is described by the comment lines directly
+        above it, else the preceding paragraph, else the nearest header or the title.
+
+        Args:
+            content: Document text
+            title: Document title, the description of last resort
+
+        Returns:
+            List of {"description", "sql_query", "tables"} dicts in document order
+        """
+        examples: List[Dict[str, object]] = []
+        comments: List[str] = []
+        paragraph: List[str] = []
+        header = title
+        lines = content.splitlines()
+        i = 0
+
+        while i < len(lines):
+            line = lines[i]
+
+            fence = _FENCE_RE.match(line)
+            if fence:
+                # Collect the fenced block; only SQL-looking blocks become examples
+                body = []
+                i += 1
+                while i < len(lines) and not _FENCE_RE.match(lines[i]):
+                    body.append(lines[i])
+                    i += 1
+                if fence.group(2).lower() in SQL_FENCE_LANGUAGES:
+                    context = self._join(comments) or self._join(paragraph) or header
+                    for statement_comments, statement in self._split_statements(body):
+                        self._add(examples, self._join(statement_comments) or context, statement)
+                comments, paragraph = [], []
+                i += 1
+                continue
+
+            if _STATEMENT_START_RE.match(line):
+                statement = []
+                while i < len(lines):
+                    statement.append(lines[i])
+                    if self._ends_statement(lines[i]) or not lines[i].strip():
+                        break
+                    i += 1
+                self._add(examples, self._join(comments) or self._join(paragraph) or header, "\n".join(statement))
+                comments, paragraph = [], []
+                i += 1
+                continue
+
+            if _BANNER_RULE_RE.match(line):
+                pass  # Banner rules frame comments without ending them
+            elif _SQL_COMMENT_RE.match(line):
+                text = _SQL_COMMENT_RE.match(line).group(1).strip()
+                if text:
+                    comments.append(text)
+            elif _HEADER_RE.match(line):
+                header = _HEADER_RE.match(line).group(1)
+                comments, paragraph = [], []
+            elif line.strip():
+                if comments:
+                    comments = []
+                paragraph.append(line.strip())
+            elif paragraph:
+                # A blank line ends the paragraph, but it still describes a block right below it
+                paragraph = paragraph[-3:]
+            i += 1
+
+        return examples
+
+    @staticmethod
+    def referenced_tables(sql_query: str) -> List[str]:
+        """Get the tables a statement reads from, in order, without CTE names."""
+        cte_names = {name.lower() for name in _CTE_RE.findall(sql_query)}
+        tables = []
+        for table in _TABLE_RE.findall(sql_query):
+            if table.lower() not in cte_names and table not in tables:
+                tables.append(table)
+        return tables
+
+    def _add(self, examples: List[Dict[str, object]], description: str, sql_query: str):
+        """Append an example if the text is a SELECT or WITH statement."""
+        sql_query = sql_query.strip()
+        if not _STATEMENT_START_RE.match(sql_query):
+            return
+        description = _PATTERN_LABEL_RE.sub("", description.strip())[:self.max_description_chars]
+        examples.append({
+            "description": description,
+            "sql_query": sql_query,
+            "tables": self.referenced_tables(sql_query),
+        })
+
+    @classmethod
+    def _split_statements(cls, body: List[str]) -> List[tuple]:
+        """Split a fenced block into (leading comments, statement) pairs."""
+        statements = []
+        comments: List[str] = []
+        current: List[str] = []
+        for line in body:
+            if not current:
+                match = _SQL_COMMENT_RE.match(line)
+                if match and not _BANNER_RULE_RE.match(line):
+                    if match.group(1).strip():
+                        comments.append(match.group(1).strip())
+                    continue
+                if not line.strip() or _BANNER_RULE_RE.match(line):
+                    continue
+            current.append(line)
+            if cls._ends_statement(line):
+                statements.append((comments, "\n".join(current)))
+                comments, current = [], []
+        if current:
+            statements.append((comments, "\n".join(current)))
+        return statements
+
+    @staticmethod
+    def _join(lines: List[str]) -> str:
+        """Join description lines into sentences."""
+        return ". ".join(line.rstrip(".:;") for line in lines if line.rstrip(".:;"))
+
+    @staticmethod
+    def _ends_statement(line: str) -> bool:
+        """Check whether a line ends a statement, ignoring a trailing -- comment."""
+        return line.split("--", 1)[0].rstrip().endswith(";")
@@ -0,0 +1,127 @@
+"""
+Row limit enforcement for the SQL the agent runs.
+SELECTs without a LIMIT get one and larger LIMITs are clamped, one row past
+the limit so the caller can tell a result was cut off. Statements are parsed
+with sqlglot when it is installed, else a trailing LIMIT clause is handled
+with a regular expression.
+"""
+
+import re
+import threading
+from typing import Any, Dict, Optional
+
+
+_LIMITED_RE = re.compile(r"^\s*(?:\(\s*)*(SELECT|WITH)\b", re.IGNORECASE)
+_TRAILING_LIMIT_RE = re.compile(r"\bLIMIT\s+(?:\d+\s*,\s*)?(\d+)(?:\s+OFFSET\s+\d+)?\s*$", re.IGNORECASE)
+# A locking clause has to stay after the LIMIT
+_LOCKING_RE = re.compile(r"\s+(FOR\s+(?:UPDATE|SHARE)\b.*|LOCK\s+IN\s+SHARE\s+MODE)$", re.IGNORECASE | re.DOTALL)
+
+
+class RowLimiter:
+    """Rewrites SELECTs so they return at most max_rows + 1 rows."""
+
+    def __init__(self, max_rows: int = 100):
+        """
+        Initialize the limiter.
+
+        Args:
+            max_rows: Most rows a query result may give the agent
+        """
+        self.max_rows = max_rows
+        self._sqlglot = None
+        self._lock = threading.Lock()
+        self.injected = 0
+        self.clamped = 0
+        self.truncated = 0
+
+    @property
+    def fetch_rows(self) -> int:
+        """Rows to fetch: one more than max_rows, to detect truncation."""
+        return self.max_rows + 1
+
+    def limit_sql(self, command: str) -> str:
+        """
+        Add or clamp the LIMIT of a SELECT (or WITH ... SELECT).
+
+        Args:
+            command: SQL about to run
+
+        Returns:
+            The statement with a LIMIT of at most fetch_rows; other statements unchanged
+        """
+        if not _LIMITED_RE.match(command):
+            return command
+
+        result = self._limit_with_sqlglot(command)
+        if result is None:
+            result = self._limit_with_regex(command)
+        limited, action = result
+
+        if action:
+            with self._lock:
+                if action == "injected":
+                    self.injected += 1
+                else:
+                    self.clamped += 1
+        return limited
+
+    def record_truncation(self):
+        """Count a result that was cut off at max_rows."""
+        with self._lock:
+            self.truncated += 1
+
+    def _limit_with_sqlglot(self, command: str) -> Optional[tuple]:
+        """Limit the outermost query using sqlglot, or None if it isn't installed or can't parse the statement."""
+        if self._sqlglot is None:
+            try:
+                import sqlglot
+                self._sqlglot = sqlglot
+            except ImportError:
+                self._sqlglot = False
+        if not self._sqlglot:
+            return None
+
+        exp = self._sqlglot.exp
+        try:
+            statements = self._sqlglot.parse(command, read="mysql")
+        except Exception:
+            return None
+        if len(statements) != 1 or not isinstance(statements[0], (exp.Select, exp.Union)):
+            return None
+        tree = statements[0]
+
+        limit = tree.args.get("limit")
+        if limit is None:
+            return tree.limit(self.fetch_rows).sql(dialect="mysql"), "injected"
+
+        value = limit.args.get("expression")
+        if isinstance(value, exp.Literal) and value.is_int and int(value.name) > self.fetch_rows:
+            limit.set("expression", exp.Literal.number(self.fetch_rows))
+            return tree.sql(dialect="mysql"), "clamped"
+        # Already within the limit, or not a literal; the fetch still stops at fetch_rows
+        return command, None
+
+    def _limit_with_regex(self, command: str) -> tuple:
+        """Limit a statement by its trailing LIMIT clause (before any locking clause), appending one if it has none."""
+        statement = command.strip().rstrip(";").rstrip()
+        locking = _LOCKING_RE.search(statement)
+        tail = ""
+        if locking:
+            statement, tail = statement[:locking.start()], " " + locking.group(1)
+        match = _TRAILING_LIMIT_RE.search(statement)
+        if match is None:
+            # On its own line, so a trailing -- comment can't swallow it
+            return f"{statement}\nLIMIT {self.fetch_rows}{tail}", "injected"
+        if int(match.group(1)) > self.fetch_rows:
+            return f"{statement[:match.start(1)]}{self.fetch_rows}{statement[match.end(1):]}{tail}", "clamped"
+        return command, None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the row limit and how many statements were limited or results truncated."""
+        with self._lock:
+            return {
+                "max_rows": self.max_rows,
+                "injected": self.injected,
+                "clamped": self.clamped,
+                "truncated": self.truncated,
+            }
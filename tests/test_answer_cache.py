@@ -0,0 +1,88 @@
+"""
+Tests for AnswerCache.substitute_literals, with sqlglot and with the regex fallback.
+"""
+
+import importlib.util
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import answer_cache
+from answer_cache import AnswerCache
+
+
+class SubstituteLiteralsCases:
+    """Cases run once with sqlglot and once with the regex fallback."""
+
+    def substitute(self, cached_question, question, sql_query):
+        return AnswerCache.substitute_literals(cached_question, question, sql_query)
+
+    def test_replaces_predicate_literal(self):
+        self.assertEqual(
+            self.substitute("Show order 416328", "Show order 416329",
+                            "SELECT * FROM ordhdr WHERE ordNo = 416328 LIMIT 10"),
+            "SELECT * FROM ordhdr WHERE ordNo = 416329 LIMIT 10")
+
+    def test_keeps_quoted_number_quoted(self):
+        self.assertEqual(
+            self.substitute("Show order 416328", "Show order 416329",
+                            "SELECT * FROM ordhdr WHERE ordNo = '416328'"),
+            "SELECT * FROM ordhdr WHERE ordNo = '416329'")
+
+    def test_does_not_touch_limit(self):
+        self.assertIsNone(self.substitute(
+            "Top 10 orders for customer 5", "Top 11 orders for customer 5",
+            "SELECT * FROM ordhdr WHERE custNo = 5 ORDER BY ordDate DESC LIMIT 10"))
+
+    def test_refuses_repeated_value(self):
+        self.assertIsNone(self.substitute(
+            "Orders for customer 5", "Orders for customer 6",
+            "SELECT * FROM ordhdr WHERE custNo = 5 OR billToNo = 5"))
+
+    def test_refuses_select_list_literal(self):
+        self.assertIsNone(self.substitute(
+            "Count 7", "Count 8", "SELECT 7 AS n FROM ordhdr WHERE custNo = 1"))
+
+    def test_refuses_unquoted_entity(self):
+        self.assertIsNone(self.substitute(
+            "Orders for customer Acme", "Orders for customer Globex",
+            "SELECT * FROM ordhdr WHERE custName = 'Acme'"))
+        self.assertIsNone(self.substitute(
+            "Top customers in California", "Top customers in Texas",
+            "SELECT * FROM customers WHERE state = 'CA' LIMIT 10"))
+
+    def test_ignores_case_and_punctuation(self):
+        self.assertEqual(
+            self.substitute("Show order 416328?", "show  order 416329",
+                            "SELECT * FROM ordhdr WHERE ordNo = 416328"),
+            "SELECT * FROM ordhdr WHERE ordNo = 416329")
+
+    def test_swaps_values(self):
+        self.assertEqual(
+            self.substitute("Between 5 and 6", "Between 6 and 5",
+                            "SELECT * FROM ordhdr WHERE a = 5 AND b = 6"),
+            "SELECT * FROM ordhdr WHERE a = 6 AND b = 5")
+
+
+@unittest.skipIf(importlib.util.find_spec("sqlglot") is None, "sqlglot is not installed")
+class SubstituteLiteralsSqlglotTest(SubstituteLiteralsCases, unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(answer_cache, "_sqlglot", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        AnswerCache._parse_sql("SELECT 1")
+        self.assertTrue(answer_cache._sqlglot)
+
+
+class SubstituteLiteralsRegexTest(SubstituteLiteralsCases, unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(answer_cache, "_sqlglot", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+"""
+Tests for CostGate.judge against hand-written EXPLAIN FORMAT=JSON plans.
+"""
+
+import importlib.util
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FULL_SCAN_PLAN = {
+    "query_block": {
+        "cost_info": {"query_cost": "50000.00"},
+        "table": {"table_name": "ordhdr", "access_type": "ALL", "rows_examined_per_scan": 500000},
+    }
+}
+
+
+@unittest.skipIf(importlib.util.find_spec("sqlalchemy") is None, "missing dependencies: sqlalchemy")
+class JudgeTest(unittest.TestCase):
+    def setUp(self):
+        from query_cost import CostGate
+        self.gate = CostGate(full_scan_rows=100000)
+
+    def test_limited_scan_stops_early(self):
+        verdict = self.gate.judge("SELECT * FROM ordhdr LIMIT 101", FULL_SCAN_PLAN)
+        self.assertEqual(verdict["verdict"], "ok")
+
+    def test_aggregate_reads_every_row(self):
+        verdict = self.gate.judge("SELECT SUM(ordTotal) FROM ordhdr LIMIT 101", FULL_SCAN_PLAN)
+        self.assertEqual(verdict["verdict"], "rejected")
+        self.assertEqual(verdict["problems"][0]["issue"], "full table scan")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+"""
+Tests for ReplicaRouter.is_read, which decides whether a statement may run on a replica.
+"""
+
+import importlib.util
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@unittest.skipIf(importlib.util.find_spec("sqlalchemy") is None, "missing dependencies: sqlalchemy")
+class IsReadTest(unittest.TestCase):
+    def setUp(self):
+        from replica_router import ReplicaRouter
+        self.is_read = ReplicaRouter.is_read
+
+    def test_reads(self):
+        self.assertTrue(self.is_read("SELECT 1"))
+        self.assertTrue(self.is_read("-- latest\nSHOW TABLES"))
+        self.assertTrue(self.is_read("WITH a AS (SELECT 1) SELECT * FROM a"))
+        self.assertTrue(self.is_read(
+            "WITH RECURSIVE a (n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM a WHERE n < 5) SELECT * FROM a"))
+
+    def test_cte_writes_go_to_the_primary(self):
+        self.assertFalse(self.is_read("WITH a AS (SELECT id FROM t) UPDATE t JOIN a USING (id) SET x = 1"))
+        self.assertFalse(self.is_read(
+            "WITH a AS (SELECT ')select(' AS s), b AS (SELECT 2) DELETE FROM t WHERE id IN (SELECT * FROM b)"))
+        self.assertFalse(self.is_read("UPDATE t SET a = 1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
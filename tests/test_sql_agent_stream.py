@@ -0,0 +1,90 @@
+"""
+Tests for SQLAgent.stream against a stubbed agent graph (no database, model or Milvus).
+"""
+
+import importlib.util
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEPENDENCIES = ("langchain", "langchain_community", "sqlalchemy", "pymilvus", "openai")
+MISSING = [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+
+
+class StubAgent:
+    """Agent graph stand-in that replays a fixed (stream_mode, chunk) sequence."""
+
+    def __init__(self, events):
+        self.events = events
+
+    def stream(self, _input, stream_mode=None):
+        yield from self.events
+
+
+@unittest.skipIf(MISSING, f"missing dependencies: {', '.join(MISSING)}")
+class StreamTest(unittest.TestCase):
+    def make_agent(self, events, mode="standard"):
+        from sql_agent import SQLAgent
+
+        agent = SQLAgent(database_url="sqlite://")
+        agent.agent_mode = mode
+        agent.history = []
+        agent._answer_from_cache = lambda question: None
+        agent._retrieve_context = lambda question: {"examples": [], "docs": [], "tables": [], "columns": []}
+        agent._prepare_question = lambda question, retrieved, mode: (question, StubAgent(events))
+        agent._record_history = lambda *args, **kwargs: agent.history.append((args, kwargs))
+        return agent
+
+    def test_stream_yields_final_and_records_the_run(self):
+        tool_call = {"name": "sql_db_query", "args": {"query": "SELECT 1"}, "id": "call-1"}
+        ai_call = SimpleNamespace(type="ai", content="", tool_calls=[tool_call])
+        tool_result = SimpleNamespace(type="tool", name="sql_db_query", content="[(1,)]", tool_call_id="call-1")
+        answer = SimpleNamespace(type="ai", content="The answer is 1.", tool_calls=[])
+        events = [
+            ("messages", (SimpleNamespace(type="AIMessageChunk", content="The answer"), {"langgraph_node": "model"})),
+            ("updates", {"model": {"messages": [ai_call]}}),
+            ("messages", (SimpleNamespace(type="AIMessageChunk", content="SELECT 1"), {"langgraph_node": "tools"})),
+            ("updates", {"tools": {"messages": [tool_result]}}),
+            ("updates", {"model": {"messages": [answer]}}),
+        ]
+        agent = self.make_agent(events, mode="fast")
+
+        results = list(agent.stream("What is one?"))
+
+        self.assertEqual(results[-1], {"type": "final", "content": "The answer is 1."})
+        tokens = [event["content"] for event in results if event["type"] == "token"]
+        self.assertEqual(tokens, ["The answer"])  # The query checker's output inside the tool isn't streamed
+        self.assertIn({"type": "tool_call", "name": "sql_db_query", "args": {"query": "SELECT 1"}}, results)
+        self.assertEqual(len(agent.history), 1)
+        self.assertTrue(agent.history[0][1]["success"])
+        stats = agent.get_mode_stats()
+        self.assertEqual(stats["fast"]["questions"], 1)
+        self.assertEqual(stats["fast"]["avg_model_calls"], 2)
+        self.assertEqual(stats["standard"]["questions"], 0)
+
+    def test_unexecuted_sql_is_not_recorded_as_success(self):
+        answer = SimpleNamespace(type="ai", content="You could run `SELECT * FROM ordhdr`.", tool_calls=[])
+        agent = self.make_agent([("updates", {"model": {"messages": [answer]}})])
+
+        list(agent.stream("What orders are there?"))
+
+        (question, sql_query, result), kwargs = agent.history[0]
+        self.assertEqual(sql_query, "SELECT * FROM ordhdr")
+        self.assertFalse(kwargs["success"])
+
+    def test_stream_reports_agent_errors(self):
+        agent = self.make_agent([])
+        agent._prepare_question = lambda question, retrieved, mode: (_ for _ in ()).throw(RuntimeError("boom"))
+
+        results = list(agent.stream("What is one?"))
+
+        self.assertEqual(results[-1]["type"], "error")
+        self.assertIn("boom", results[-1]["content"])
+        self.assertEqual(agent.get_mode_stats()["standard"]["errors"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
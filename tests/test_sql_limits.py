@@ -0,0 +1,54 @@
+"""
+Tests for RowLimiter.limit_sql, with sqlglot and with the regex fallback.
+"""
+
+import importlib.util
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sql_limits import RowLimiter
+
+
+class LimitSqlCases:
+    """Cases run once with sqlglot and once with the regex fallback."""
+
+    def limit(self, command):
+        return " ".join(self.limiter.limit_sql(command).split())
+
+    def test_injects_limit(self):
+        self.assertEqual(self.limit("SELECT * FROM ordhdr"), "SELECT * FROM ordhdr LIMIT 101")
+
+    def test_clamps_large_limit(self):
+        self.assertEqual(self.limit("SELECT * FROM ordhdr LIMIT 5000"), "SELECT * FROM ordhdr LIMIT 101")
+
+    def test_keeps_small_limit(self):
+        self.assertEqual(self.limit("SELECT * FROM ordhdr LIMIT 10"), "SELECT * FROM ordhdr LIMIT 10")
+
+    def test_limit_goes_before_locking_clause(self):
+        self.assertEqual(self.limit("SELECT * FROM ordhdr WHERE ordNo = 1 FOR UPDATE"),
+                         "SELECT * FROM ordhdr WHERE ordNo = 1 LIMIT 101 FOR UPDATE")
+        # sqlglot writes the MySQL 8 spelling of the same lock
+        self.assertIn(self.limit("SELECT * FROM ordhdr LIMIT 5000 LOCK IN SHARE MODE;"),
+                      ("SELECT * FROM ordhdr LIMIT 101 LOCK IN SHARE MODE", "SELECT * FROM ordhdr LIMIT 101 FOR SHARE"))
+
+    def test_leaves_other_statements(self):
+        self.assertEqual(self.limit("UPDATE ordhdr SET status = 'x'"), "UPDATE ordhdr SET status = 'x'")
+
+
+@unittest.skipIf(importlib.util.find_spec("sqlglot") is None, "sqlglot is not installed")
+class LimitSqlSqlglotTest(LimitSqlCases, unittest.TestCase):
+    def setUp(self):
+        self.limiter = RowLimiter(max_rows=100)
+
+
+class LimitSqlRegexTest(LimitSqlCases, unittest.TestCase):
+    def setUp(self):
+        self.limiter = RowLimiter(max_rows=100)
+        self.limiter._sqlglot = False
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+"""
+Tests for TokenCounter's offline loading of tiktoken encodings.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import token_counter
+from token_counter import TokenCounter
+
+
+class OfflineEncodingTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(token_counter._encodings, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_estimates_without_download_when_not_cached(self):
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch.dict(os.environ, {"TIKTOKEN_CACHE_DIR": cache_dir, "TIKTOKEN_DOWNLOAD": "false"}), \
+                mock.patch.dict(sys.modules, {"tiktoken": None}):
+            # Importing tiktoken would raise here, so the estimate must come without trying
+            self.assertEqual(TokenCounter().count("x" * 30), 11)
+            self.assertIs(token_counter._encodings["cl100k_base"], False)
+
+    def test_loads_once_for_every_counter(self):
+        with mock.patch.object(token_counter, "_load_encoding", return_value=False) as load:
+            TokenCounter().count("a")
+            TokenCounter().count("b")
+        load.assert_called_once_with("cl100k_base")
+
+
+if __name__ == "__main__":
+    unittest.main()
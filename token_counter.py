@@ -0,0 +1,73 @@
+"""
+Token counting shared by embedding batching and prompt context budgeting.
+tiktoken downloads an encoding file on first use, with no timeout, so an
+encoding is only loaded when it is already in tiktoken's cache, unless
+TIKTOKEN_DOWNLOAD=true; otherwise tokens are estimated straight away.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+
+# Where tiktoken downloads the BPE file of the cl100k_base / o200k_base family of encodings from
+_ENCODING_URL = "https://openaipublic.blob.core.windows.net/encodings/{}.tiktoken"
+
+# Loaded encodings by name (False if unavailable), shared by every counter
+_encodings: Dict[str, Any] = {}
+_encodings_lock = threading.Lock()
+
+
+def cached_encoding_path(encoding_name: str) -> Optional[str]:
+    """Path tiktoken caches an encoding's BPE file at, or None if its cache is disabled."""
+    cache_dir = os.environ.get("TIKTOKEN_CACHE_DIR", os.environ.get(
+        "DATA_GYM_CACHE_DIR", os.path.join(tempfile.gettempdir(), "data-gym-cache")))
+    if not cache_dir:
+        return None
+    return os.path.join(cache_dir, hashlib.sha1(_ENCODING_URL.format(encoding_name).encode()).hexdigest())
+
+
+def load_encoding(encoding_name: str):
+    """Get a tiktoken encoding if it can be loaded without a download (or downloads are allowed), else False."""
+    with _encodings_lock:
+        if encoding_name not in _encodings:
+            _encodings[encoding_name] = _load_encoding(encoding_name)
+        return _encodings[encoding_name]
+
+
+def _load_encoding(encoding_name: str):
+    path = cached_encoding_path(encoding_name)
+    if not (path and os.path.exists(path)) and os.getenv("TIKTOKEN_DOWNLOAD", "false").lower() != "true":
+        return False
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(encoding_name)
+    except Exception:
+        # tiktoken missing, or its encoding file can't be downloaded
+        return False
+
+
+class TokenCounter:
+    """Counts tokens with tiktoken when its encoding is available offline, else estimates."""
+
+    def __init__(self, encoding_name: str = "cl100k_base"):
+        """
+        Initialize the counter.
+
+        Args:
+            encoding_name: tiktoken encoding used by the chat and embedding models
+        """
+        self.encoding_name = encoding_name
+        self._encoding = None
+
+    def count(self, text: str) -> int:
+        """Count the tokens in a piece of text."""
+        if self._encoding is None:
+            self._encoding = load_encoding(self.encoding_name)
+
+        if self._encoding:
+            return len(self._encoding.encode(text))
+        # Schema and SQL text run denser than prose; overestimate rather than overflow
+        return len(text) // 3 + 1